@@ -6,61 +6,1169 @@ import platform
 import re
 import time
 import shutil
+import stat
 import getpass
 import pwd
-from pathlib import Path
-import ipaddress
-from datetime import datetime
+from datetime import datetime, timezone
+from collections import deque
 import threading
 import signal
 import atexit
+import contextlib
+import fcntl
+import struct
+import json
+import shlex
+import tempfile
+import argparse
+import socket
+import hashlib
+import base64
+import glob
+import socketserver
+
+RICH_AVAILABLE = False
+
+LETSENCRYPT_DIR = "/etc/letsencrypt"
+LOG_DIR = "/var/log/docesetup"
+LOG_FILES_KEPT = 20
+OUTPUT_BUFFER_LINES = 200
+COMMAND_HISTORY_KEPT = 200
+PACKAGE_STALL_SECONDS = 15
+SIZE_UNITS = {
+    "b": 1, "kb": 1000, "mb": 1000 ** 2, "gb": 1000 ** 3,
+    "k": 1024, "kib": 1024, "m": 1024 ** 2, "mib": 1024 ** 2, "g": 1024 ** 3, "gib": 1024 ** 3,
+}
+PACKAGE_SETS = {
+    "basic": {
+        "apt-get": ["wget", "curl", "ca-certificates", "openssl"],
+        "dnf": ["wget", "curl", "ca-certificates", "openssl"],
+        "yum": ["wget", "curl", "ca-certificates", "openssl"],
+        "pacman": ["wget", "curl", "ca-certificates", "openssl"],
+        "zypper": ["wget", "curl", "ca-certificates", "openssl"],
+    },
+    "arch32": {
+        "apt-get": ["libc6:i386", "libncurses5:i386", "libstdc++6:i386"],
+        "dnf": ["glibc.i686", "ncurses-libs.i686", "libstdc++.i686"],
+        "yum": ["glibc.i686", "ncurses-libs.i686", "libstdc++.i686"],
+        "pacman": ["lib32-glibc", "lib32-ncurses", "lib32-gcc-libs"],
+        "zypper": ["glibc-32bit", "libncurses6-32bit", "libstdc++6-32bit"],
+    },
+    "apache": {
+        "apt-get": ["apache2"],
+        "dnf": ["httpd", "mod_ssl"],
+        "yum": ["httpd", "mod_ssl"],
+        "pacman": ["apache"],
+        "zypper": ["apache2"],
+    },
+    "nginx": {
+        "apt-get": ["nginx"],
+        "dnf": ["nginx"],
+        "yum": ["nginx"],
+        "pacman": ["nginx"],
+        "zypper": ["nginx"],
+    },
+    "certbot-apache": {
+        "apt-get": ["certbot", "python3-certbot-apache"],
+        "dnf": ["certbot", "python3-certbot-apache"],
+        "yum": ["certbot", "python3-certbot-apache"],
+        "pacman": ["certbot", "certbot-apache"],
+        "zypper": ["python3-certbot", "python3-certbot-apache"],
+    },
+    "certbot-nginx": {
+        "apt-get": ["certbot", "python3-certbot-nginx"],
+        "dnf": ["certbot", "python3-certbot-nginx"],
+        "yum": ["certbot", "python3-certbot-nginx"],
+        "pacman": ["certbot", "certbot-nginx"],
+        "zypper": ["python3-certbot", "python3-certbot-nginx"],
+    },
+    "locale": {
+        "apt-get": ["locales"],
+        "ubuntu": ["locales", "language-pack-pt", "language-pack-pt-base"],
+        "dnf": ["glibc-langpack-pt"],
+        "yum": ["glibc-langpack-pt"],
+        "pacman": ["glibc", "lib32-glibc"],
+        "zypper": ["glibc-locale"],
+    },
+    "locale-minimal": {
+        "apt-get": ["locales"],
+        "dnf": ["glibc-langpack-pt"],
+        "yum": ["glibc-langpack-pt"],
+        "pacman": ["glibc"],
+        "zypper": ["glibc-locale"],
+    },
+    "locale-desktop": {
+        "apt-get": ["task-brazilian-portuguese"],
+        "ubuntu": ["language-pack-gnome-pt"],
+        "dnf": ["langpacks-pt_BR"],
+        "yum": ["langpacks-pt_BR"],
+    },
+}
+APT_DOWNLOADS_CONF = "/etc/apt/apt.conf.d/90docesetup-downloads"
+PARALLEL_DOWNLOADS = 10
+PACKAGE_LOCKS = {
+    "apt-get": ["/var/lib/dpkg/lock-frontend", "/var/lib/dpkg/lock", "/var/lib/apt/lists/lock", "/var/cache/apt/archives/lock"],
+    "dnf": ["/var/lib/rpm/.rpm.lock", "/var/lib/dnf/rpmdb_lock.pid", "/var/cache/dnf/metadata_lock.pid", "/var/cache/dnf/download_lock.pid"],
+    "yum": ["/var/lib/rpm/.rpm.lock", "/var/run/yum.pid"],
+    "pacman": ["/var/lib/pacman/db.lck"],
+    "zypper": ["/var/lib/rpm/.rpm.lock", "/run/zypp.pid"],
+}
+PACKAGE_LOCK_ERRORS = re.compile(r"Could not get lock|Unable to acquire the dpkg frontend lock|unable to lock database|holding the yum lock|System management is locked")
+PACKAGE_LOCK_TIMEOUT = int(os.environ.get("DOCESETUP_LOCK_TIMEOUT", "1800"))
+BUNDLE_GROUPS = {
+    "basico": ["basic"],
+    "arch32": ["arch32"],
+    "apache": ["apache", "certbot-apache"],
+    "nginx": ["nginx", "certbot-nginx"],
+    "idioma": ["locale", "locale-desktop"],
+}
+BUNDLE_EXTENSIONS = (".deb", ".rpm", ".pkg.tar.zst", ".pkg.tar.xz")
+SHELL_SYNTAX = re.compile(r"[|&;<>()$`*?~]")
+CACHE_DIR = "/var/cache/docesetup"
+INSTALL_DIR = "/usr/local/lib/docesetup"
+LAUNCHER_FILE = "/usr/local/bin/docesetup"
+SYSTEMD_DIR = "/etc/systemd/system"
+RENEWAL_WINDOW_DAYS = 30
+RENEWAL_MARKER = "/run/docesetup-renewed"
+STATE_DIR = "/var/lib/docesetup"
+JOURNAL_FILE = os.path.join(STATE_DIR, "journal.json")
+REPOSITORY_REFRESH_MAX_AGE = 6 * 3600
+FIRST_BOOT_PLAN = os.path.join(STATE_DIR, "firstboot.json")
+ISSUANCE_FILE = os.path.join(STATE_DIR, "issuance.json")
+DEFERRED_CERTS_FILE = os.path.join(STATE_DIR, "deferred-certs.json")
+FIRST_BOOT_UNIT = "docesetup-firstboot.service"
+LAST_RUN_FILE = os.path.join(STATE_DIR, "last-run.json")
+TRACE_SUMMARY_ROWS = 10
+DAEMON_SOCKET = "/run/docesetup.sock"
+DAEMON_POLL_SECONDS = 5
+DAEMON_MAX_REQUEST = 1024 * 1024
+DAEMON_CHANGES_KEPT = 50
+DAEMON_WATCHES = [
+    ("ssh", "/etc/ssh", None),
+    ("fstab", "/etc", "fstab"),
+    ("web", "/etc/nginx", None),
+    ("web", "/etc/apache2", None),
+    ("web", "/etc/httpd", None),
+    ("certs", "/etc/letsencrypt", None),
+    ("packages", "/var/lib/dpkg", "status"),
+    ("packages", "/var/lib/rpm", None),
+    ("packages", "/var/lib/pacman/local", None),
+]
+DAEMON_WATCH_DEPTH = 2
+IN_MODIFY, IN_ATTRIB, IN_CLOSE_WRITE, IN_MOVED_FROM, IN_MOVED_TO = 0x2, 0x4, 0x8, 0x40, 0x80
+IN_CREATE, IN_DELETE, IN_DELETE_SELF, IN_MOVE_SELF, IN_ISDIR = 0x100, 0x200, 0x400, 0x800, 0x40000000
+METRICS_FILE = "/var/lib/node_exporter/textfile_collector/docesetup.prom"
+METRICS_INTERVAL = "1min"
+METRICS_SYSCTLS = ["vm.swappiness", "vm.vfs_cache_pressure", "vm.overcommit_memory", "fs.file-max", "net.core.somaxconn",
+                   "net.ipv4.tcp_max_syn_backlog", "net.ipv4.ip_local_port_range"]
+LIMITS_FILES = ["/etc/security/limits.conf", "/etc/security/limits.d/*.conf"]
+USER_LIMITS_FILE = "/etc/security/limits.d/90-docesetup.conf"
+REGULAR_UIDS = range(1000, 65534)
+WEB_TUNING_FILES = {
+    "nginx": (["/etc/nginx/nginx.conf", "/etc/nginx/conf.d/*.conf"],
+              ["worker_processes", "worker_connections", "worker_rlimit_nofile", "keepalive_timeout", "client_max_body_size"]),
+    "apache": (["/etc/apache2/apache2.conf", "/etc/apache2/mods-enabled/mpm_*.conf", "/etc/httpd/conf/httpd.conf",
+                "/etc/httpd/conf.modules.d/*.conf"],
+               ["MaxRequestWorkers", "ServerLimit", "ThreadsPerChild", "KeepAliveTimeout", "MaxKeepAliveRequests"]),
+}
+MAX_SAN_NAMES = 100
+CERTS_PER_DOMAIN_PER_WEEK = 50
+ORDERS_PER_THREE_HOURS = 300
+PUBLIC_SUFFIX_LISTS = ["/usr/share/publicsuffix/public_suffix_list.dat", "/usr/share/publicsuffix/effective_tld_names.dat"]
+SELF_SIGNED_DIR = "/etc/ssl/docesetup"
+LOCAL_CA_DIR = "/etc/docesetup/ca"
+SELF_SIGNED_DAYS = 825
+HOSTNAME_PATTERN = re.compile(r"^[a-z0-9]([a-z0-9-]{0,61}[a-z0-9])?(\.[a-z0-9]([a-z0-9-]{0,61}[a-z0-9])?)*$")
+EMAIL_PATTERN = re.compile(r"^[\w.+-]+@[\w-]+(\.[\w-]+)+$")
+PROXY_PATTERN = re.compile(r"^https?://[\w.:@%-]+/?$")
+DOMAIN_PATTERN = re.compile(r"^([a-z0-9]([a-z0-9-]{0,61}[a-z0-9])?\.)+[a-z][a-z0-9-]{1,62}$")
+SSH_CONFIG = "/etc/ssh/sshd_config"
+ROOT_SSH_SETTINGS = [("PermitRootLogin", "yes"), ("PasswordAuthentication", "yes")]
+SSH_TIMEOUT_SETTINGS = [("ClientAliveInterval", "290"), ("ClientAliveCountMax", "63")]
+SWAP_FILE = "/swapfile"
+SWAP_SIZES = ["2G", "4G", "8G", "16G", "32G"]
+UNNEEDED_SERVICES = [
+    ("cups-browsed", "Descoberta de impressoras na rede"),
+    ("avahi-daemon", "Descoberta de serviços na rede local"),
+    ("bluetooth", "Suporte a dispositivos Bluetooth"),
+    ("ModemManager", "Gerenciamento de modems e conexões móveis"),
+    ("wpa_supplicant", "Cliente para redes Wi-Fi"),
+]
+SYSTEMD_UNIT_DIRS = ["/etc/systemd/system", "/run/systemd/system", "/lib/systemd/system", "/usr/lib/systemd/system"]
+LOCALE_SETTINGS = [("LANG", "pt_BR.UTF-8"), ("LANGUAGE", "pt_BR:pt:en"), ("LC_ALL", "pt_BR.UTF-8")]
+LOCALE_SHELL_MARKER = "# Configuração de idioma"
+LOCALE_PROFILE = "/etc/profile.d/docesetup-locale.sh"
+MANAGED_BLOCK_BEGIN = "# >>> docesetup {} >>>"
+MANAGED_BLOCK_END = "# <<< docesetup {} <<<"
+USER_FILE_WORKERS = 16
+X11_KEYBOARD_CONF = "/etc/X11/xorg.conf.d/00-keyboard.conf"
+LOCALE_GEN_FILE = "/etc/locale.gen"
+LOCALE_GEN_ENTRY = "pt_BR.UTF-8 UTF-8"
+DISPLAY_STACK_PATHS = ["/usr/bin/Xorg", "/usr/lib/xorg/Xorg", "/usr/libexec/Xorg", "/usr/bin/Xwayland",
+                       "/etc/systemd/system/display-manager.service"]
+STEP_ORDER = ["downloads", "ssh-root", "ssh-timeout", "swap", "arch32", "ssl", "services", "locale"]
+PROFILES = {
+    "base": {
+        "downloads": {},
+        "ssh-timeout": {},
+        "swap": {"size": "2G"},
+        "services": {},
+    },
+    "web": {
+        "downloads": {},
+        "ssh-timeout": {},
+        "swap": {"size": "2G"},
+        "ssl": {"web_server": "nginx"},
+        "services": {},
+    },
+    "completo": {
+        "downloads": {},
+        "ssh-root": {},
+        "ssh-timeout": {},
+        "swap": {"size": "4G"},
+        "arch32": {},
+        "services": {},
+        "locale": {},
+    },
+}
+STEP_DEPENDENCIES = {
+    "arch32": ["downloads"],
+    "ssl": ["downloads"],
+    "locale": ["downloads"],
+}
+FIRST_BOOT_STEPS = ["swap", "ssl"]
+STEP_RESOURCES = {
+    "ssh-root": ["sshd"],
+    "ssh-timeout": ["sshd"],
+}
+STEP_REQUIREMENTS = {
+    "swap": ["swap"],
+    "services": ["systemd"],
+    "arch32": ["ia32"],
+}
+MENU_STEPS = {
+    "configure_root_ssh": "ssh-root",
+    "disable_ssh_timeout": "ssh-timeout",
+    "create_swap": "swap",
+    "enable_32bit_arch": "arch32",
+    "configure_ssl_certificate": "ssl",
+    "disable_services": "services",
+    "translate_to_portuguese": "locale",
+    "optimize_package_downloads": "downloads",
+}
+PACKAGE_STEPS = {"arch32", "ssl", "locale"}
+STEP_PARTIAL_FILES = {
+    "ssh-root": [SSH_CONFIG],
+    "ssh-timeout": [SSH_CONFIG],
+    "swap": ["/etc/fstab"],
+    "locale": [LOCALE_PROFILE, LOCALE_GEN_FILE, "/etc/vconsole.conf"],
+    "downloads": ["/etc/dnf/dnf.conf", "/etc/yum.conf", "/etc/pacman.conf", "/etc/zypp/zypp.conf", "/etc/sysconfig/proxy"],
+}
+REQUIREMENT_LABELS = {
+    "swap": "swapon não é permitido em contêineres",
+    "systemd": "o systemd não é o PID 1",
+    "ia32": "o processador não executa binários de 32 bits x86",
+}
+CONTAINER_VIRTS = {"docker", "podman", "lxc", "lxc-libvirt", "systemd-nspawn", "openvz", "rkt", "wsl", "proot", "pouch", "container-other"}
+CONTAINER_CGROUP_PATTERN = re.compile(r"docker|kubepods|containerd|libpod|lxc")
+CGROUP_MEMORY_LIMITS = ["/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory/memory.limit_in_bytes"]
+IA32_MACHINES = {"x86_64", "amd64", "i386", "i686"}
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_USAGE = 2
+EXIT_DRIFT = 3
+EXIT_NOT_ROOT = 4
+BENCH_DISTROS = {
+    "debian": 'ID=debian\nVERSION_ID="12"\n',
+    "ubuntu": 'ID=ubuntu\nVERSION_ID="24.04"\n',
+    "fedora": 'ID=fedora\nVERSION_ID="40"\n',
+    "arch": 'ID=arch\n',
+    "opensuse": 'ID=opensuse\nVERSION_ID="15.6"\n',
+}
+BENCH_LATENCIES = [
+    (r"\b(apt-get|dnf|yum|zypper) (install|update|check-update|refresh)\b|pacman -S", 0.05),
+    (r"^(fallocate|mkswap|swapon|locale-gen)\b", 0.02),
+]
+BENCH_DEFAULT_LATENCY = 0.002
+BENCH_ROUNDS = 3
+BENCH_WALL_TOLERANCE = 0.25
+BENCH_WALL_SLACK = 0.01
+BENCH_STARTUP_BUDGET = 0.1
+BENCH_PREFLIGHT_DOMAINS = 1000
+BENCH_RESOLVER_LATENCY = 0.02
+BENCH_HOST_ADDRESS = "203.0.113.10"
+
+OID_SUBJECT_ALT_NAME = bytes.fromhex("551d11")
+OID_RSA_ENCRYPTION = bytes.fromhex("2a864886f70d010101")
+OID_EC_PUBLIC_KEY = bytes.fromhex("2a8648ce3d0201")
+OID_ED25519 = bytes.fromhex("2b6570")
+EC_CURVES = {
+    bytes.fromhex("2a8648ce3d030107"): "ecdsa-p256",
+    bytes.fromhex("2b81040022"): "ecdsa-p384",
+    bytes.fromhex("2b81040023"): "ecdsa-p521",
+}
+
+
+def _load_rich():
+    global RICH_AVAILABLE, Console, Panel, Progress, ProgressColumn, SpinnerColumn, TextColumn, BarColumn
+    global TimeElapsedColumn, TimeRemainingColumn, Text, Prompt, Confirm, Table, OutputTailColumn, PackagePhaseColumn
+    if RICH_AVAILABLE:
+        return True
+    try:
+        from rich.console import Console
+        from rich.panel import Panel
+        from rich.progress import Progress, ProgressColumn, SpinnerColumn, TextColumn, BarColumn, TimeElapsedColumn, TimeRemainingColumn
+        from rich.text import Text
+        from rich.prompt import Prompt, Confirm
+        from rich.table import Table
+    except ImportError:
+        return False
+
+    class OutputTailColumn(ProgressColumn):
+        def __init__(self, tail, width=70):
+            super().__init__()
+            self.tail = tail
+            self.width = width
+
+        def render(self, task):
+            return Text(self.tail()[-self.width:], style="dim", no_wrap=True)
+
+    class PackagePhaseColumn(ProgressColumn):
+        def __init__(self, state, width=50):
+            super().__init__()
+            self.state = state
+            self.width = width
+
+        def render(self, task):
+            idle = time.monotonic() - self.state['updated']
+            text = self.state['message'][:self.width]
+            if idle >= PACKAGE_STALL_SECONDS:
+                return Text(f"{text} (sem progresso há {int(idle)}s)", style="bold yellow", no_wrap=True)
+            return Text(text, style="dim", no_wrap=True)
 
-try:
-    import tqdm
-    from rich.console import Console
-    from rich.panel import Panel
-    from rich.progress import Progress, SpinnerColumn, TextColumn, BarColumn, TimeElapsedColumn
-    from rich.prompt import Prompt, Confirm
-    from rich.table import Table
-    from rich.markdown import Markdown
-    from rich import print as rprint
     RICH_AVAILABLE = True
-except ImportError:
-    RICH_AVAILABLE = False
+    return True
+
+
+_public_suffix_lookup = None
+
+
+def _load_public_suffix_lookup():
+    global _public_suffix_lookup
+    if _public_suffix_lookup is not None:
+        return _public_suffix_lookup
+    try:
+        from publicsuffix2 import get_sld
+        _public_suffix_lookup = get_sld
+        return _public_suffix_lookup
+    except ImportError:
+        pass
+    
+    rules = set()
+    for path in PUBLIC_SUFFIX_LISTS:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                rules = {line.split()[0].lower() for line in f if line.strip() and not line.startswith("//")}
+            break
+        except OSError:
+            continue
+    
+    def lookup(domain):
+        labels = domain.split('.')
+        if not rules:
+            if len(labels) >= 3 and len(labels[-1]) == 2 and len(labels[-2]) <= 3:
+                return '.'.join(labels[-3:])
+            return '.'.join(labels[-2:])
+        
+        suffix = 1
+        for i in range(len(labels)):
+            candidate = '.'.join(labels[i:])
+            if f"!{candidate}" in rules:
+                suffix = len(labels) - i - 1
+                break
+            if candidate in rules or (i + 1 < len(labels) and f"*.{'.'.join(labels[i + 1:])}" in rules):
+                suffix = len(labels) - i
+                break
+        return '.'.join(labels[-(suffix + 1):])
+    
+    _public_suffix_lookup = lookup
+    return _public_suffix_lookup
+
+
+def _der_read(data, pos):
+    tag = data[pos]
+    length = data[pos + 1]
+    pos += 2
+    if length & 0x80:
+        count = length & 0x7f
+        length = int.from_bytes(data[pos:pos + count], "big")
+        pos += count
+    return tag, pos, pos + length
+
+
+def _der_children(data, start, end):
+    children = []
+    pos = start
+    while pos < end:
+        tag, child_start, child_end = _der_read(data, pos)
+        children.append((tag, child_start, child_end))
+        pos = child_end
+    return children
+
+
+def _der_time(data, tag, start, end):
+    value = data[start:end].decode("ascii").rstrip("Z")
+    fmt = "%y%m%d%H%M%S" if tag == 0x17 else "%Y%m%d%H%M%S"
+    return datetime.strptime(value, fmt).replace(tzinfo=timezone.utc).timestamp()
+
+
+def _pem_to_der(text):
+    match = re.search(r"-----BEGIN CERTIFICATE-----(.+?)-----END CERTIFICATE-----", text, re.DOTALL)
+    if not match:
+        return None
+    return base64.b64decode("".join(match.group(1).split()))
+
+
+def parse_certificate(data):
+    import ipaddress
+    _, cert_start, cert_end = _der_read(data, 0)
+    _, tbs_start, tbs_end = _der_children(data, cert_start, cert_end)[0]
+    fields = _der_children(data, tbs_start, tbs_end)
+    if fields[0][0] == 0xa0:
+        fields = fields[1:]
+
+    validity = _der_children(data, fields[3][1], fields[3][2])
+    not_before = _der_time(data, *validity[0])
+    not_after = _der_time(data, *validity[1])
+
+    spki = _der_children(data, fields[5][1], fields[5][2])
+    algorithm = _der_children(data, spki[0][1], spki[0][2])
+    key_oid = data[algorithm[0][1]:algorithm[0][2]]
+    key_type = "desconhecido"
+    if key_oid == OID_RSA_ENCRYPTION:
+        _, bits_start, bits_end = spki[1]
+        _, seq_start, seq_end = _der_read(data, bits_start + 1)
+        _, mod_start, mod_end = _der_children(data, seq_start, seq_end)[0]
+        modulus = data[mod_start:mod_end].lstrip(b"\x00")
+        key_type = f"rsa-{len(modulus) * 8}"
+    elif key_oid == OID_EC_PUBLIC_KEY and len(algorithm) > 1:
+        key_type = EC_CURVES.get(data[algorithm[1][1]:algorithm[1][2]], "ecdsa")
+    elif key_oid == OID_ED25519:
+        key_type = "ed25519"
+
+    domains = []
+    for tag, start, end in fields[6:]:
+        if tag != 0xa3:
+            continue
+        _, ext_start, ext_end = _der_read(data, start)
+        for _, e_start, e_end in _der_children(data, ext_start, ext_end):
+            parts = _der_children(data, e_start, e_end)
+            if data[parts[0][1]:parts[0][2]] != OID_SUBJECT_ALT_NAME:
+                continue
+            _, value_start, value_end = parts[-1]
+            _, names_start, names_end = _der_read(data, value_start)
+            for name_tag, n_start, n_end in _der_children(data, names_start, names_end):
+                if name_tag == 0x82:
+                    domains.append(data[n_start:n_end].decode("ascii"))
+                elif name_tag == 0x87:
+                    domains.append(str(ipaddress.ip_address(data[n_start:n_end])))
+
+    return {
+        "self_signed": data[fields[2][1]:fields[2][2]] == data[fields[4][1]:fields[4][2]],
+        "domains": domains,
+        "not_before": not_before,
+        "not_after": not_after,
+        "key_type": key_type,
+    }
+
+
+def parse_certificate_file(path):
+    with open(path, "r") as f:
+        der = _pem_to_der(f.read())
+    if der is None:
+        raise ValueError(f"Nenhum certificado PEM encontrado em {path}")
+    return parse_certificate(der)
+
+
+class CommandResult:
+    def __init__(self, command):
+        self.command = command
+        self.started = time.time()
+        self.duration = 0.0
+        self.returncode = None
+        self.cpu_time = 0.0
+        self.output_bytes = 0
+        self.output = deque(maxlen=OUTPUT_BUFFER_LINES)
+        self.stdout = ""
+        self.stderr = ""
+
+
+_confined_roots = []
+_write_guard_installed = False
+_WRITE_EVENTS = {"os.rename": (0, 1), "os.remove": (0,), "os.rmdir": (0,), "os.mkdir": (0,), "os.chmod": (0,),
+                 "os.chown": (0,), "os.symlink": (1,), "os.link": (1,), "os.truncate": (0,), "os.utime": (0,)}
+_OPEN_WRITE_FLAGS = os.O_WRONLY | os.O_RDWR | os.O_CREAT | os.O_APPEND | os.O_TRUNC
+
+
+def _outside_confined_roots(path):
+    if not isinstance(path, (str, bytes)):
+        return False
+    path = os.path.abspath(os.fsdecode(path))
+    return not any(path == root or path.startswith(root + os.sep) for root in _confined_roots)
+
+
+def _write_guard(event, args):
+    if not _confined_roots:
+        return
+    if event == "open":
+        path, mode, flags = args
+        if not (flags & _OPEN_WRITE_FLAGS or (mode and set(mode) & set("wax+"))):
+            return
+        paths = [path]
+    elif event in _WRITE_EVENTS:
+        paths = [args[i] for i in _WRITE_EVENTS[event]]
+    else:
+        return
+    for path in paths:
+        if _outside_confined_roots(path):
+            raise PermissionError(f"escrita fora da raiz simulada: {os.fsdecode(path)}")
+
+
+@contextlib.contextmanager
+def confine_writes(root):
+    global _write_guard_installed
+    if not _write_guard_installed and hasattr(sys, "addaudithook"):
+        sys.addaudithook(_write_guard)
+        _write_guard_installed = True
+    root = os.path.realpath(root)
+    _confined_roots.append(root)
+    try:
+        yield
+    finally:
+        _confined_roots.remove(root)
+
+
+class CommandRecorder:
+    def __init__(self, root, latencies=None, default_latency=BENCH_DEFAULT_LATENCY, responses=None):
+        self.root = root
+        self.latencies = [(re.compile(pattern), delay) for pattern, delay in (BENCH_LATENCIES if latencies is None else latencies)]
+        self.default_latency = default_latency
+        self.responses = [(re.compile(pattern), code, output) for pattern, code, output in (responses or [])]
+        self.commands = []
+        self._lock = threading.Lock()
+
+    def run(self, command, env=None, input=None):
+        with self._lock:
+            self.commands.append(command)
+        delay = next((delay for pattern, delay in self.latencies if pattern.search(command)), self.default_latency)
+        if delay:
+            time.sleep(delay)
+        for pattern, code, output in self.responses:
+            if pattern.search(command):
+                return code, output.splitlines()
+        return 0, []
+
+
+class PlainProgress:
+    def __init__(self, reporter, title, total=None):
+        self.reporter = reporter
+        self.title = title
+        self.total = total
+        self.completed = 0
+        self.text = None
+
+    def update(self, text=None, advance=0):
+        self.completed += advance
+        if text is not None and text != self.text:
+            self.text = text
+            self.reporter._emit(f"  {text}")
+
+
+class PlainPackageProgress:
+    def __init__(self, reporter, label, state):
+        self.reporter = reporter
+        self.state = state
+        self.printed = (None, -1)
+
+    def update(self, detail=""):
+        state = self.state
+        fraction = state['download_fraction'] if state['phase'] == "download" else state['install_fraction']
+        step = int(fraction * 10)
+        if state['phase'] != self.printed[0] or step > self.printed[1]:
+            phase = "Baixando" if state['phase'] == "download" else "Instalando"
+            self.reporter._emit(f"  {phase}: {int(fraction * 100)}% - {state['message']}")
+            self.printed = (state['phase'], step)
+
+    def complete(self):
+        pass
+
+
+class PlainReporter:
+    serial = False
+    prefixes = {'success': "✓ ", 'error': "✗ ", 'info': "ℹ ", 'warning': "⚠ ", 'detail': "    ", 'note': ""}
+
+    def __init__(self, stream=None):
+        self.stream = stream
+
+    def _emit(self, text):
+        print(text, file=self.stream or sys.stdout, flush=True)
+
+    def clear(self):
+        pass
+
+    def banner(self, title, subtitle):
+        self._emit(f"\n==== {title} ====")
+        self._emit(f"{subtitle}\n")
+
+    def header(self, text):
+        self._emit(f"\n==== {text} ====\n")
+
+    def message(self, level, text):
+        self._emit(f"{self.prefixes[level]}{text}")
+
+    def output(self, line):
+        self._emit(line)
+
+    def result(self, status, label, text, details=()):
+        self._emit(f"[{label}] {text}")
+        for line in details:
+            self._emit(f"    {line}")
+
+    def table(self, title, columns, rows):
+        rows = [[str(cell) for cell in row] for row in rows]
+        widths = [max(len(cell) for cell in column) for column in zip(columns, *rows)]
+        self._emit(f"\n{title}:")
+        for row in [columns] + rows:
+            self._emit("  " + "  ".join(cell.ljust(width) for cell, width in zip(row, widths)).rstrip())
+        self._emit("")
+
+    def menu(self, title, options):
+        for key, label in options:
+            self._emit(f"{key} - {label}")
+
+    def confirm(self, question):
+        while True:
+            response = input(f"{question} (s/n): ").lower()
+            if response in ['s', 'sim', 'y', 'yes']:
+                return True
+            elif response in ['n', 'nao', 'não', 'no']:
+                return False
+            else:
+                self._emit("Por favor, responda com s ou n.")
+
+    def select(self, question, options):
+        self._emit(question)
+        for i, option in enumerate(options, 1):
+            self._emit(f"{i}. {option}")
+        
+        while True:
+            try:
+                choice = int(input("Escolha uma opção: "))
+                if 1 <= choice <= len(options):
+                    return options[choice-1]
+                else:
+                    self._emit("Opção inválida.")
+            except ValueError:
+                self._emit("Por favor, digite um número.")
+
+    def prompt(self, question, choices):
+        while True:
+            choice = input(f"{question}: ").strip()
+            if choice in choices:
+                return choice
+            self._emit("Opção inválida.")
+
+    @contextlib.contextmanager
+    def progress(self, title, total=None, elapsed=False, tail=None):
+        self._emit(title)
+        yield PlainProgress(self, title, total)
+
+    @contextlib.contextmanager
+    def package_progress(self, label, state):
+        self._emit(f"Instalando {label}...")
+        yield PlainPackageProgress(self, label, state)
+
+
+class JsonProgress(PlainProgress):
+    def update(self, text=None, advance=0):
+        step = int(self.completed * 10 / self.total) if self.total else 0
+        self.completed += advance
+        changed = text is not None and text != self.text
+        if changed or (self.total and int(self.completed * 10 / self.total) > step):
+            self.text = text if text is not None else self.text
+            self.reporter._event("progress", title=self.title, text=self.text, completed=self.completed, total=self.total)
+
+
+class JsonPackageProgress(PlainPackageProgress):
+    def update(self, detail=""):
+        state = self.state
+        fraction = state['download_fraction'] if state['phase'] == "download" else state['install_fraction']
+        if state['phase'] != self.printed[0] or int(fraction * 10) > self.printed[1]:
+            self.reporter._event("packages", phase=state['phase'], fraction=round(fraction, 3), message=state['message'])
+            self.printed = (state['phase'], int(fraction * 10))
+
+
+class JsonReporter(PlainReporter):
+    def _event(self, event, **fields):
+        self._emit(json.dumps(dict(ts=round(time.time(), 3), event=event, **fields), ensure_ascii=False))
+
+    def banner(self, title, subtitle):
+        self._event("banner", title=title, subtitle=subtitle)
+
+    def header(self, text):
+        self._event("header", text=text)
+
+    def message(self, level, text):
+        self._event("message", level=level, text=text)
+
+    def output(self, line):
+        self._event("output", text=line)
+
+    def result(self, status, label, text, details=()):
+        self._event("result", status=status, text=text, details=list(details))
+
+    def table(self, title, columns, rows):
+        self._event("table", title=title, columns=list(columns), rows=[[str(cell) for cell in row] for row in rows])
+
+    def menu(self, title, options):
+        self._event("menu", title=title, options=[{'key': key, 'label': label} for key, label in options])
+
+    @contextlib.contextmanager
+    def progress(self, title, total=None, elapsed=False, tail=None):
+        started = time.monotonic()
+        self._event("progress", title=title, total=total)
+        handle = JsonProgress(self, title, total)
+        yield handle
+        self._event("progress_end", title=title, completed=handle.completed, duration=round(time.monotonic() - started, 3))
+
+    @contextlib.contextmanager
+    def package_progress(self, label, state):
+        self._event("packages", label=label, phase="start")
+        yield JsonPackageProgress(self, label, state)
+
+
+class RichProgress:
+    def __init__(self, progress, task):
+        self.progress = progress
+        self.task = task
+
+    def update(self, text=None, advance=0):
+        if text is not None:
+            self.progress.update(self.task, description=text, advance=advance)
+        elif advance:
+            self.progress.update(self.task, advance=advance)
+
+
+class RichPackageProgress:
+    def __init__(self, progress, state, tasks):
+        self.progress = progress
+        self.state = state
+        self.tasks = tasks
+
+    def update(self, detail=""):
+        self.progress.update(self.tasks[0], completed=self.state['download_fraction'] * 1000, detail=detail)
+        self.progress.update(self.tasks[1], completed=self.state['install_fraction'] * 1000)
+
+    def complete(self):
+        for task in self.tasks:
+            self.progress.update(task, completed=1000)
+
+
+class RichReporter(PlainReporter):
+    serial = True
+    styles = {'success': "[bold green]✓ ", 'error': "[bold red]✗ ", 'info': "[blue]ℹ ", 'warning': "[bold yellow]⚠ ",
+              'detail': "[dim]    ", 'note': "[green]"}
+    column_styles = ["cyan", "green", "yellow", "magenta", "white"]
 
-class LinuxSetup:
     def __init__(self):
+        super().__init__()
+        self.console = Console()
+
+    def clear(self):
+        self.console.clear()
+
+    def banner(self, title, subtitle):
+        self.console.print(Panel.fit(
+            f"[bold yellow]{title}[/]\n"
+            f"[cyan]{subtitle}[/]",
+            padding=(1, 15),
+            title="[bold blue]Bem-vindo ao Setup![/]",
+            subtitle="[italic]Configuração simplificada para servidores Linux[/]",
+            border_style="blue"
+        ))
+
+    def header(self, text):
+        self.console.print(Panel(f"[bold cyan]{text}[/]", 
+                                 expand=False, 
+                                 border_style="blue", 
+                                 padding=(1, 2)))
+
+    def message(self, level, text):
+        self.console.print(f"{self.styles[level]}{text}[/]")
+
+    def output(self, line):
+        self.console.print(line, markup=False, highlight=False)
+
+    def table(self, title, columns, rows):
+        table = Table(title=title)
+        for column, style in zip(columns, self.column_styles * len(columns)):
+            table.add_column(column, style=style, overflow="fold")
+        for row in rows:
+            table.add_row(*[str(cell) for cell in row])
+        self.console.print(table)
+
+    def menu(self, title, options):
+        self.console.print(Panel(
+            "\n".join(f"[cyan]{key}[/] - {label}" for key, label in options),
+            title=title,
+            border_style="blue",
+            padding=(1, 2)
+        ))
+
+    def confirm(self, question):
+        return Confirm.ask(question)
+
+    def select(self, question, options):
+        return Prompt.ask(question, choices=options)
+
+    def prompt(self, question, choices):
+        return Prompt.ask(f"\n{question}", choices=choices)
+
+    @contextlib.contextmanager
+    def progress(self, title, total=None, elapsed=False, tail=None):
+        columns = [SpinnerColumn(), TextColumn(f"[bold blue]{title}")]
+        if total:
+            columns += [BarColumn(), TextColumn("[bold]{task.completed}/{task.total}")]
+        columns.append(TextColumn("[bold]{task.description}"))
+        if elapsed:
+            columns.append(TimeElapsedColumn())
+        if tail:
+            columns.append(OutputTailColumn(tail))
+        with Progress(*columns, console=self.console) as progress:
+            yield RichProgress(progress, progress.add_task("", total=total))
+
+    @contextlib.contextmanager
+    def package_progress(self, label, state):
+        with Progress(
+            TextColumn("[bold blue]{task.description}"),
+            BarColumn(),
+            TextColumn("[bold]{task.percentage:>3.0f}%"),
+            TextColumn("{task.fields[detail]}"),
+            TimeRemainingColumn(),
+            PackagePhaseColumn(state),
+            console=self.console,
+        ) as progress:
+            tasks = [progress.add_task(f"Baixando {label}", total=1000, detail=""),
+                     progress.add_task(f"Instalando {label}", total=1000, detail="")]
+            yield RichPackageProgress(progress, state, tasks)
+
+
+def make_reporter(kind=None, stream=None):
+    kind = os.environ.get("DOCESETUP_OUTPUT") or kind or ("rich" if sys.stdin.isatty() and sys.stdout.isatty() else "plain")
+    if kind == "json":
+        return JsonReporter(stream)
+    if kind == "rich" and _load_rich():
+        return RichReporter()
+    return PlainReporter(stream)
+
+
+class LinuxSetup:
+    def __init__(self, interactive=True, run_log=True, root=None, backend=None, reporter=None):
+        self.interactive = interactive
+        self.reporter = reporter or make_reporter(None if interactive else "plain")
+        self.root = os.path.abspath(root) if root else None
+        self.backend = backend
+        self.fs_root = self.root or (backend.root if backend is not None else None)
+        self._first_boot_plan = []
+        self.command_history = deque(maxlen=COMMAND_HISTORY_KEPT)
+        self._step_state = threading.local()
+        self._step_locks = {"sshd": threading.Lock()}
+        self._repositories_refreshed = False
+        self._fact_cache = None
+        self._fact_lock = threading.Lock()
+        self._environment = None
+        self.journal = None
+        self._journal_lock = threading.Lock()
+        self.trace_spans = []
+        self.trace_path = None
+        self._trace_lock = threading.Lock()
+        self.last_output_line = ""
+        self.run_log_path = None
+        self.last_download_rate = None
+        self._package_lock = threading.Lock()
+        self._foreground_waiting = threading.Event()
+        self._prefetch_thread = None
+        self._prefetched = set()
+        self._log_lock = threading.Lock()
+        self._log_handle = None if run_log else False
         self.distro, self.version = self._detect_distro()
         self.pkg_manager, self.pkg_update, self.pkg_install = self._setup_package_manager()
-        self.console = Console() if RICH_AVAILABLE else None
+        if self.root:
+            self.pkg_update, self.pkg_install = self._root_package_commands()
         self.ssh_port = self._detect_ssh_port()
         self.script_version = "1.2"
+        self._cert_index_cache = None
+        self.acme_server = os.environ.get("DOCESETUP_ACME_SERVER", "")
         self.register_signal_handlers()
         
+    def _open_run_log(self):
+        if self._log_handle is not None:
+            return self._log_handle
+        
+        self._log_handle = False
+        try:
+            os.makedirs(LOG_DIR, exist_ok=True)
+            logs = sorted(name for name in os.listdir(LOG_DIR) if name.startswith("run-"))
+            for name in logs[:max(0, len(logs) - LOG_FILES_KEPT + 1)]:
+                os.remove(os.path.join(LOG_DIR, name))
+            self.run_log_path = os.path.join(LOG_DIR, f"run-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.log")
+            self._log_handle = open(self.run_log_path, 'a', buffering=1)
+        except OSError:
+            self.run_log_path = None
+        return self._log_handle
+
+    def _log_write(self, text):
+        log = self._open_run_log()
+        if log:
+            with self._log_lock:
+                log.write(text)
+
+    def _begin_span(self, name, category, **args):
+        with self._trace_lock:
+            span_id = len(self.trace_spans) + 1
+            span = {
+                'id': span_id,
+                'parent': getattr(self._step_state, 'span', None),
+                'name': name,
+                'cat': category,
+                'start': time.time(),
+                'tid': threading.get_ident(),
+                'duration': None,
+                'cpu': 0.0,
+                'child_cpu': 0.0,
+                'args': args,
+            }
+            self.trace_spans.append(span)
+        return span
+
+    def _end_span(self, span, started, cpu=0.0):
+        span['duration'] = time.monotonic() - started
+        span['cpu'] = cpu
+        parent = span['parent']
+        with self._trace_lock:
+            while parent is not None:
+                ancestor = self.trace_spans[parent - 1]
+                ancestor['child_cpu'] += cpu if span['cat'] == "comando" else 0.0
+                parent = ancestor['parent']
+
+    @contextlib.contextmanager
+    def _span(self, name, category, **args):
+        span = self._begin_span(name, category, **args)
+        previous = getattr(self._step_state, 'span', None)
+        self._step_state.span = span['id']
+        started = time.monotonic()
+        cpu = time.thread_time()
+        try:
+            yield span
+        finally:
+            self._step_state.span = previous
+            self._end_span(span, started, time.thread_time() - cpu)
+
+    def _run_command(self, command, echo=False, capture=False, on_line=None, env=None, tail=True, input=None):
+        result = CommandResult(command)
+        span = self._begin_span(command[:80], "comando", command=command)
+        self.command_history.append(result)
+        if tail:
+            self.last_output_line = ""
+        
+        use_shell = SHELL_SYNTAX.search(command) is not None
+        args = command if use_shell else shlex.split(command)
+        env = dict(os.environ, DEBIAN_FRONTEND="noninteractive", **(env or {}))
+        self._log_write(f"$ {command}\n")
+        
+        start = time.monotonic()
+        if self.backend is not None:
+            result.returncode, lines = self.backend.run(command, env, input)
+            for line in lines:
+                result.output_bytes += len(line) + 1
+                result.output.append(line)
+                if tail and line.strip():
+                    self.last_output_line = line.strip()
+                self._log_write(f"{line}\n")
+                if echo:
+                    self.reporter.output(line)
+                if on_line:
+                    on_line(line)
+            result.duration = time.monotonic() - start
+            result.stdout = "\n".join(lines) if capture else ""
+            span['args'].update(returncode=result.returncode, output_bytes=result.output_bytes)
+            self._end_span(span, start)
+            self._log_write(f"[saída {result.returncode} em {result.duration:.2f}s]\n")
+            return result
+        
+        try:
+            process = subprocess.Popen(args, shell=use_shell, stdin=subprocess.DEVNULL if input is None else subprocess.PIPE, stdout=subprocess.PIPE,
+                                       stderr=subprocess.PIPE, text=True, errors='replace', env=env)
+        except (FileNotFoundError, PermissionError) as e:
+            result.returncode = 127
+            result.stderr = str(e)
+            self._log_write(f"[erro: {str(e)}]\n")
+            span['args'].update(returncode=127, output_bytes=0)
+            self._end_span(span, start)
+            return result
+        
+        captured = {'stdout': [], 'stderr': []}
+        
+        def pump(stream, name):
+            for line in stream:
+                result.output_bytes += len(line)
+                line = line.rstrip('\n')
+                result.output.append(line)
+                if tail and line.strip():
+                    self.last_output_line = line.strip()
+                self._log_write(f"{line}\n")
+                if capture:
+                    captured[name].append(line)
+                if echo:
+                    self.reporter.output(line)
+                if on_line:
+                    on_line(line)
+            stream.close()
+        
+        def feed():
+            try:
+                process.stdin.write(input)
+                process.stdin.close()
+            except (BrokenPipeError, OSError):
+                pass
+        
+        readers = [threading.Thread(target=pump, args=(process.stdout, 'stdout'), daemon=True),
+                   threading.Thread(target=pump, args=(process.stderr, 'stderr'), daemon=True)]
+        if input is not None:
+            readers.append(threading.Thread(target=feed, daemon=True))
+        for reader in readers:
+            reader.start()
+        for reader in readers:
+            reader.join()
+        
+        try:
+            _, status, usage = os.wait4(process.pid, 0)
+            process.returncode = -os.WTERMSIG(status) if os.WIFSIGNALED(status) else os.WEXITSTATUS(status)
+            result.cpu_time = usage.ru_utime + usage.ru_stime
+        except ChildProcessError:
+            process.wait()
+        result.returncode = process.returncode
+        result.duration = time.monotonic() - start
+        span['args'].update(returncode=result.returncode, output_bytes=result.output_bytes)
+        self._end_span(span, start, result.cpu_time)
+        result.stdout = "\n".join(captured['stdout'])
+        result.stderr = "\n".join(captured['stderr'])
+        self._log_write(f"[saída {result.returncode} em {result.duration:.2f}s]\n")
+        return result
+
     def _execute_command(self, command, silent=True, check_output=False):
         try:
-            if check_output:
-                return subprocess.run(command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-            elif silent:
-                with open(os.devnull, 'w') as DEVNULL:
-                    return subprocess.run(command, shell=True, stdout=DEVNULL, stderr=DEVNULL).returncode
-            else:
-                return subprocess.run(command, shell=True).returncode
+            result = self._run_command(command, echo=not silent and not check_output, capture=check_output)
+            return result if check_output else result.returncode
         except Exception as e:
             self._print_error(f"Erro ao executar comando: {command} - {str(e)}")
             return -1 if not check_output else None
 
     def _get_command_output(self, command):
         try:
-            result = subprocess.run(command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-            return result.stdout.strip()
+            return self._run_command(command, capture=True).stdout.strip()
         except Exception as e:
             self._print_error(f"Erro ao obter saída do comando: {command} - {str(e)}")
             return ""
 
+    def _print_command_failure(self, result, lines=10):
+        self._print_error(f"O comando falhou (código {result.returncode}): {result.command}")
+        for line in list(result.output)[-lines:]:
+            self.reporter.message("detail", line)
+        if self.run_log_path:
+            self._print_info(f"Registro completo em: {self.run_log_path}")
+
+    def _output_tail(self):
+        return self.last_output_line
+
+    def _progress(self, title, total=None, elapsed=False):
+        return self.reporter.progress(title, total, elapsed, tail=self._output_tail)
+
+    def _path(self, path):
+        return os.path.join(self.fs_root, path.lstrip('/')) if self.fs_root else path
+
+    def _in_root(self, command):
+        return f"chroot {shlex.quote(self.root)} {command}" if self.root else command
+
+    def _root_package_commands(self):
+        root = shlex.quote(self.root)
+        if self.pkg_manager == "apt-get":
+            return f"chroot {root} apt-get update", f"chroot {root} apt-get install -y"
+        elif self.pkg_manager == "dnf":
+            return f"dnf --installroot={root} check-update", f"dnf --installroot={root} install -y"
+        elif self.pkg_manager == "yum":
+            return f"yum --installroot={root} check-update", f"yum --installroot={root} install -y"
+        elif self.pkg_manager == "pacman":
+            return f"pacman --sysroot {root} -Sy", f"pacman --sysroot {root} -S --noconfirm"
+        elif self.pkg_manager == "zypper":
+            return f"zypper --root {root} refresh", f"zypper --root {root} install -y"
+        return self.pkg_update, self.pkg_install
+
+    def _local_users(self):
+        if not self.fs_root:
+            return pwd.getpwall()
+        users = []
+        try:
+            with open(self._path("/etc/passwd"), 'r') as f:
+                for line in f:
+                    fields = line.rstrip('\n').split(':')
+                    if len(fields) == 7 and fields[2].isdigit() and fields[3].isdigit():
+                        fields[2], fields[3] = int(fields[2]), int(fields[3])
+                        users.append(pwd.struct_passwd(fields))
+        except OSError:
+            pass
+        return users
+
+    def _regular_users(self):
+        return [user for user in self._local_users() if user.pw_uid in REGULAR_UIDS]
+
+    def _bulk_chpasswd(self, pairs):
+        data = "".join(f"{name}:{password}\n" for name, password in pairs)
+        if not data:
+            return True
+        result = self._run_command(self._in_root("chpasswd"), input=data, tail=False)
+        if result.returncode != 0:
+            self._print_command_failure(result)
+        return result.returncode == 0
+
+    def _bulk_set_shell(self, names, shell):
+        names = set(names)
+        changed = sorted(user.pw_name for user in self._local_users() if user.pw_name in names and user.pw_shell != shell)
+        if not changed:
+            return []
+        command = " && ".join(self._in_root(f"usermod -s {shlex.quote(shell)} {shlex.quote(name)}") for name in changed)
+        result = self._run_command(command, tail=False)
+        if result.returncode != 0:
+            self._print_command_failure(result)
+            return None
+        return changed
+
+    def _bulk_limits(self, names, nofile):
+        path = self._path(USER_LIMITS_FILE)
+        content = "".join(f"{name} {kind} nofile {nofile}\n" for name in sorted(names) for kind in ("soft", "hard"))
+        try:
+            with open(path, 'r') as f:
+                if f.read() == content:
+                    return False
+        except OSError:
+            pass
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._rewrite_file(path, content)
+        return True
+
     def _detect_distro(self):
-        if os.path.exists('/etc/os-release'):
-            with open('/etc/os-release', 'r') as f:
+        if os.path.exists(self._path('/etc/os-release')):
+            with open(self._path('/etc/os-release'), 'r') as f:
                 lines = f.readlines()
                 info = {}
                 for line in lines:
@@ -77,8 +1185,8 @@ class LinuxSetup:
             version = self._get_command_output("lsb_release -sr")
             return distro, version
         
-        if os.path.exists('/etc/debian_version'):
-            with open('/etc/debian_version', 'r') as f:
+        if os.path.exists(self._path('/etc/debian_version')):
+            with open(self._path('/etc/debian_version'), 'r') as f:
                 version = f.read().strip()
             return 'debian', version
         
@@ -113,8 +1221,8 @@ class LinuxSetup:
                 return "", "echo 'Atualização não disponível'", "echo 'Instalação não disponível'"
 
     def _detect_ssh_port(self):
-        if os.path.exists('/etc/ssh/sshd_config'):
-            with open('/etc/ssh/sshd_config', 'r') as f:
+        if os.path.exists(self._path(SSH_CONFIG)):
+            with open(self._path(SSH_CONFIG), 'r') as f:
                 for line in f:
                     if line.strip().startswith('Port '):
                         port = line.strip().split()[1]
@@ -128,158 +1236,656 @@ class LinuxSetup:
             sys.exit(1)
 
     def _install_deps(self, packages):
-        if RICH_AVAILABLE:
-            with Progress(
-                SpinnerColumn(),
-                TextColumn("[bold blue]Instalando dependências..."),
-                BarColumn(),
-                TextColumn("[bold]{task.percentage:.0f}%"),
-                TimeElapsedColumn(),
-            ) as progress:
-                task = progress.add_task("[green]Instalando...", total=len(packages))
-                
-                for pkg in packages:
-                    if not shutil.which(pkg):
-                        self._execute_command(f"{self.pkg_install} {pkg}")
-                    progress.update(task, advance=1)
-        else:
-            for pkg in packages:
-                if not shutil.which(pkg):
-                    print(f"Instalando {pkg}...")
-                    self._execute_command(f"{self.pkg_install} {pkg}")
+        missing = [pkg for pkg in packages if not shutil.which(pkg)]
+        if missing:
+            self.install_packages(missing, "dependências")
 
-    def _update_config(self, filename, param, value):
-        if not os.path.exists(filename):
-            return False
-            
-        with open(filename, 'r') as f:
-            content = f.read()
-        
-        if re.search(rf'^[#\s]*{param}\s', content, re.MULTILINE):
-            content = re.sub(rf'^[#\s]*{param}.*', f'{param} {value}', content, flags=re.MULTILINE)
-        else:
-            content += f'\n{param} {value}'
+    def _detect_virtualization(self):
+        if shutil.which("systemd-detect-virt"):
+            virt = self._get_command_output("systemd-detect-virt")
+            if virt:
+                return virt
+        if os.path.exists("/.dockerenv"):
+            return "docker"
+        if os.path.exists("/run/.containerenv"):
+            return "podman"
+        try:
+            with open("/proc/1/cgroup", 'r') as f:
+                if CONTAINER_CGROUP_PATTERN.search(f.read()):
+                    return "container-other"
+        except OSError:
+            pass
+        return "none"
+
+    def _memory_limit(self):
+        for path in CGROUP_MEMORY_LIMITS:
+            try:
+                with open(path, 'r') as f:
+                    value = f.read().strip()
+            except OSError:
+                continue
+            if value.isdigit():
+                return int(value)
+        return None
+
+    def environment(self):
+        if self._environment is not None:
+            return self._environment
+        host_memory = os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+        if self.fs_root:
+            self._environment = {'virt': "none", 'container': False, 'memory': host_memory,
+                                 'capabilities': {"swap", "systemd", "ia32"}}
+            return self._environment
         
-        with open(filename, 'w') as f:
-            f.write(content)
-        return True
+        virt = self._detect_virtualization()
+        container = virt in CONTAINER_VIRTS
+        limit = self._memory_limit()
+        capabilities = set()
+        if not container:
+            capabilities.add("swap")
+        if os.path.isdir("/run/systemd/system"):
+            capabilities.add("systemd")
+        if platform.machine().lower() in IA32_MACHINES:
+            capabilities.add("ia32")
+        self._environment = {'virt': virt, 'container': container,
+                             'memory': min(host_memory, limit) if limit else host_memory,
+                             'capabilities': capabilities}
+        return self._environment
 
-    def _print_header(self, text):
-        if RICH_AVAILABLE:
-            self.console.print(Panel(f"[bold cyan]{text}[/]", 
-                                     expand=False, 
-                                     border_style="blue", 
-                                     padding=(1, 2)))
-        else:
-            print(f"\n==== {text} ====\n")
+    def step_unavailable(self, key):
+        capabilities = self.environment()['capabilities']
+        missing = [need for need in STEP_REQUIREMENTS.get(key, []) if need not in capabilities]
+        return "; ".join(REQUIREMENT_LABELS[need] for need in missing) if missing else None
 
-    def _print_success(self, text):
-        if RICH_AVAILABLE:
-            self.console.print(f"[bold green]✓ {text}[/]")
-        else:
-            print(f"✓ {text}")
+    def _default_swap_size(self):
+        memory = self.environment()['memory']
+        for size in SWAP_SIZES:
+            if self._parse_size(size[:-1], size[-1]) >= memory:
+                return size
+        return SWAP_SIZES[-1]
 
-    def _print_error(self, text):
-        if RICH_AVAILABLE:
-            self.console.print(f"[bold red]✗ {text}[/]")
-        else:
-            print(f"✗ {text}")
+    def _package_set(self, name):
+        packages = PACKAGE_SETS.get(name, {})
+        return packages.get(self.distro, packages.get(self.pkg_manager, []))
 
-    def _print_info(self, text):
-        if RICH_AVAILABLE:
-            self.console.print(f"[blue]ℹ {text}[/]")
-        else:
-            print(f"ℹ {text}")
+    def _cached_fact(self, key, compute):
+        if self._fact_cache is None:
+            return compute()
+        with self._fact_lock:
+            if key in self._fact_cache:
+                return self._fact_cache[key]
+        value = compute()
+        with self._fact_lock:
+            self._fact_cache[key] = value
+        return value
 
-    def _print_warning(self, text):
-        if RICH_AVAILABLE:
-            self.console.print(f"[bold yellow]⚠ {text}[/]")
-        else:
-            print(f"⚠ {text}")
+    def forget_facts(self, match=None):
+        with self._fact_lock:
+            if self._fact_cache is None:
+                return
+            for key in [key for key in self._fact_cache if match is None or match(key)]:
+                del self._fact_cache[key]
 
-    def _ask(self, question):
-        if RICH_AVAILABLE:
-            return Confirm.ask(question)
-        else:
-            while True:
-                response = input(f"{question} (s/n): ").lower()
-                if response in ['s', 'sim', 'y', 'yes']:
-                    return True
-                elif response in ['n', 'nao', 'não', 'no']:
-                    return False
+    def _missing_packages(self, packages):
+        if not packages:
+            return []
+        cache = self._fact_cache
+        if cache is None:
+            return self._query_missing_packages(packages)
+        with self._fact_lock:
+            known = {pkg: cache[('installed', pkg)] for pkg in packages if ('installed', pkg) in cache}
+        unknown = [pkg for pkg in packages if pkg not in known]
+        if unknown:
+            missing = set(self._query_missing_packages(unknown))
+            fresh = {pkg: pkg not in missing for pkg in unknown}
+            known.update(fresh)
+            with self._fact_lock:
+                cache.update((('installed', pkg), installed) for pkg, installed in fresh.items())
+        return [pkg for pkg in packages if not known[pkg]]
+
+    def _query_missing_packages(self, packages):
+        names = " ".join(shlex.quote(pkg) for pkg in packages)
+        installed = set()
+        if self.pkg_manager == "apt-get":
+            output = self._run_command(self._in_root(f"dpkg-query -W -f='${{Package}} ${{Package}}:${{Architecture}} ${{db:Status-Status}}\\n' {names}"), capture=True, tail=False).stdout
+            for line in output.splitlines():
+                parts = line.split()
+                if len(parts) == 3 and parts[2] == "installed":
+                    installed.update(parts[:2])
+        elif self.pkg_manager in ("dnf", "yum", "zypper"):
+            output = self._run_command(self._in_root(f"rpm -q --qf '%{{NAME}} %{{NAME}}.%{{ARCH}}\\n' {names}"), capture=True, tail=False).stdout
+            for line in output.splitlines():
+                parts = line.split()
+                if len(parts) == 2:
+                    installed.update(parts)
+        elif self.pkg_manager == "pacman":
+            output = self._run_command(self._in_root(f"pacman -Q {names}"), capture=True, tail=False).stdout
+            installed.update(line.split()[0] for line in output.splitlines() if line.strip())
+
+        return [pkg for pkg in packages if pkg not in installed]
+
+    def _parse_size(self, number, unit):
+        number = float(number.replace(',', ''))
+        return int(number * SIZE_UNITS.get(unit.lower(), 1))
+
+    def _parse_package_line(self, line, state):
+        manager = self.pkg_manager
+        stripped = line.strip()
+        changed = False
+        
+        size = re.search(r'(?:Need to get|Total download size:|Total Download Size:|Overall download size:)\s*([\d.,]+)\s*([kMG]?i?B?)', stripped)
+        if size:
+            state['download_total'] = self._parse_size(size.group(1), size.group(2) or "B")
+            return True
+        
+        if manager == "apt-get":
+            match = re.match(r'^(dlstatus|pmstatus):.*?:(\d+(?:\.\d+)?):(.*)$', stripped)
+            if match:
+                percent = float(match.group(2))
+                state['message'] = match.group(3)
+                if match.group(1) == "dlstatus":
+                    state['phase'] = "download"
+                    state['download_fraction'] = percent / 100
                 else:
-                    print("Por favor, responda com s ou n.")
+                    state['phase'] = "install"
+                    state['download_fraction'] = 1.0
+                    state['install_fraction'] = percent / 100
+                changed = True
+        elif manager in ("dnf", "yum"):
+            download = re.match(r'^\((\d+)/(\d+)\):\s*(\S+).*\|\s*([\d.]+)\s*([kMG]?i?B)', stripped)
+            transaction = re.match(r'^(Installing|Upgrading|Reinstalling|Downgrading|Running scriptlet|Verifying)\s*:\s*(\S+).*?(\d+)/(\d+)$', stripped)
+            if download:
+                state['phase'] = "download"
+                state['download_done'] += self._parse_size(download.group(4), download.group(5))
+                state['download_fraction'] = int(download.group(1)) / int(download.group(2))
+                state['message'] = download.group(3)
+                changed = True
+            elif transaction:
+                state['phase'] = "install"
+                state['download_fraction'] = 1.0
+                if transaction.group(1) != "Verifying":
+                    state['install_fraction'] = int(transaction.group(3)) / int(transaction.group(4))
+                state['message'] = f"{transaction.group(1)} {transaction.group(2)}"
+                changed = True
+        elif manager == "pacman":
+            packages = re.match(r'^Packages \((\d+)\)', stripped)
+            transaction = re.match(r'^\((\s*\d+)/(\d+)\) (installing|upgrading|reinstalling) (\S+)', stripped)
+            if packages:
+                state['files_total'] = int(packages.group(1))
+            elif stripped.endswith("downloading..."):
+                state['phase'] = "download"
+                state['files_done'] += 1
+                state['download_fraction'] = state['files_done'] / max(state['files_total'], state['files_done'])
+                state['message'] = stripped
+                changed = True
+            elif transaction:
+                state['phase'] = "install"
+                state['download_fraction'] = 1.0
+                state['install_fraction'] = int(transaction.group(1)) / int(transaction.group(2))
+                state['message'] = f"{transaction.group(3)} {transaction.group(4)}"
+                changed = True
+        elif manager == "zypper":
+            download = re.match(r'^Retrieving:? (?:package )?(\S+).*\((\d+)/(\d+)\)', stripped)
+            transaction = re.match(r'^\((\d+)/(\d+)\) Installing:\s*(\S+)', stripped)
+            if download:
+                state['phase'] = "download"
+                state['download_fraction'] = int(download.group(2)) / int(download.group(3))
+                state['message'] = download.group(1)
+                changed = True
+            elif transaction:
+                state['phase'] = "install"
+                state['download_fraction'] = 1.0
+                state['install_fraction'] = int(transaction.group(1)) / int(transaction.group(2))
+                state['message'] = f"Installing {transaction.group(3)}"
+                changed = True
+        
+        if changed:
+            state['updated'] = time.monotonic()
+            if state['phase'] == "install" and state['download_seconds'] is None:
+                state['download_seconds'] = state['updated'] - state['started']
+        return changed
 
-    def _select_option(self, question, options):
-        if RICH_AVAILABLE:
-            return Prompt.ask(question, choices=options)
-        else:
-            print(question)
-            for i, option in enumerate(options, 1):
-                print(f"{i}. {option}")
-            
-            while True:
-                try:
-                    choice = int(input("Escolha uma opção: "))
-                    if 1 <= choice <= len(options):
-                        return options[choice-1]
-                    else:
-                        print("Opção inválida.")
-                except ValueError:
-                    print("Por favor, digite um número.")
+    def _package_install_command(self, packages):
+        names = " ".join(packages)
+        if self.pkg_manager == "apt-get":
+            return self._in_root(f"apt-get install -y -o APT::Status-Fd=1 -o Dpkg::Use-Pty=0 {names}")
+        return f"{self.pkg_install} {names}"
 
-    def register_signal_handlers(self):
-        def handle_exit(signum=None, frame=None):
-            if signum is not None:
-                if signum == signal.SIGINT:
-                    print("\n\nOperação cancelada pelo usuário.")
-                elif signum == signal.SIGTERM:
-                    print("\n\nPrograma terminado.")
-            print("\nFinalizando o script Doce Setup.")
-            sys.exit(0)
+    def _format_bytes(self, count):
+        for unit in ["B", "kB", "MB", "GB"]:
+            if count < 1000 or unit == "GB":
+                return f"{count:.1f} {unit}" if unit != "B" else f"{count} B"
+            count /= 1000
+
+    def _download_estimate_command(self, packages):
+        names = " ".join(packages)
+        if self.pkg_manager == "apt-get":
+            return f"{self.pkg_install.replace(' install -y', ' install --assume-no')} {names}"
+        elif self.pkg_manager in ("dnf", "yum"):
+            return f"{self.pkg_install.replace(' install -y', ' install --assumeno')} {names}"
+        elif self.pkg_manager == "zypper":
+            return f"{self.pkg_install.replace(' install -y', ' --non-interactive install --dry-run')} {names}"
+        elif self.pkg_manager == "pacman":
+            return f"{self.pkg_install.replace(' -S --noconfirm', ' -Sp --print-format %s')} {names}"
+        return None
+
+    def _download_size(self, packages):
+        command = self._download_estimate_command(packages) if packages else None
+        if command is None:
+            return None
+        with self._package_job():
+            output = self._run_command(command, capture=True, tail=False, env={"LC_ALL": "C"}).stdout
+        if self.pkg_manager == "pacman":
+            sizes = [int(line) for line in output.split() if line.isdigit()]
+            return sum(sizes) if sizes else None
+        state = {}
+        for line in output.splitlines():
+            if self._parse_package_line(line, state) and 'download_total' in state:
+                return state['download_total']
+        return None
+
+    def _lock_holder_from_proc(self, path):
+        for pid in os.listdir("/proc"):
+            if not pid.isdigit() or int(pid) == os.getpid():
+                continue
+            fd_dir = f"/proc/{pid}/fd"
+            try:
+                for fd in os.listdir(fd_dir):
+                    if os.readlink(os.path.join(fd_dir, fd)) == path:
+                        return int(pid)
+            except OSError:
+                continue
+        return None
+
+    def _process_name(self, pid):
+        try:
+            with open(f"/proc/{pid}/comm", 'r') as f:
+                return f.read().strip()
+        except OSError:
+            return "desconhecido"
+
+    def _probe_lock(self, path):
+        if not os.path.exists(path):
+            return None
         
-        signal.signal(signal.SIGINT, handle_exit)
-        signal.signal(signal.SIGTERM, handle_exit)
-        atexit.register(handle_exit)
+        if path.endswith(".pid"):
+            try:
+                with open(path, 'r') as f:
+                    pid = int(f.read().strip() or 0)
+            except (OSError, ValueError):
+                return None
+            return pid if pid and os.path.exists(f"/proc/{pid}") else None
+        
+        if path.endswith("db.lck"):
+            return self._lock_holder_from_proc(path) or -1
+        
+        try:
+            fd = os.open(path, os.O_RDWR)
+        except OSError:
+            try:
+                fd = os.open(path, os.O_RDONLY)
+            except OSError:
+                return None
+        try:
+            request = struct.pack("hhqqi", fcntl.F_WRLCK, 0, 0, 0, 0)
+            lock_type, _, _, _, pid = struct.unpack("hhqqi", fcntl.fcntl(fd, fcntl.F_GETLK, request))
+        except OSError:
+            return None
+        finally:
+            os.close(fd)
+        
+        if lock_type == fcntl.F_UNLCK:
+            return None
+        return pid if pid > 0 else (self._lock_holder_from_proc(path) or -1)
 
-    def show_banner(self):
-        os.system('clear')
-        if RICH_AVAILABLE:
-            self.console.print(Panel.fit(
-                f"[bold yellow]🍬 Doce Setup v{self.script_version}[/]\n"
-                f"[cyan]Sistema detectado: {self.distro.capitalize()} {self.version}[/]",
-                padding=(1, 15),
-                title="[bold blue]Bem-vindo ao Setup![/]",
-                subtitle="[italic]Configuração simplificada para servidores Linux[/]",
-                border_style="blue"
-            ))
+    def _find_package_lock_holder(self):
+        for path in PACKAGE_LOCKS.get(self.pkg_manager, []):
+            path = self._path(path)
+            pid = self._probe_lock(path)
+            if pid is not None:
+                return path, pid
+        return None, None
+
+    def _wait_for_package_manager_lock(self, quiet=False, timeout=PACKAGE_LOCK_TIMEOUT):
+        path, pid = self._find_package_lock_holder()
+        if path is None:
+            return True
+        
+        deadline = time.monotonic() + timeout
+        delay = 1.0
+        
+        def describe(path, pid):
+            if pid > 0:
+                return f"Aguardando PID {pid} ({self._process_name(pid)}) liberar {path}..."
+            return f"Aguardando a liberação de {path}..."
+        
+        if quiet:
+            while path is not None and time.monotonic() < deadline:
+                time.sleep(delay)
+                delay = min(delay * 2, 10)
+                path, pid = self._find_package_lock_holder()
+            return path is None
+        
+        with self.reporter.progress("Gerenciador de pacotes ocupado", elapsed=True) as progress:
+            while path is not None and time.monotonic() < deadline:
+                progress.update(describe(path, pid))
+                time.sleep(delay)
+                delay = min(delay * 2, 10)
+                path, pid = self._find_package_lock_holder()
+        
+        if path is not None:
+            self._print_warning(f"O gerenciador de pacotes continua travado por {path}. Tentando mesmo assim.")
+            return False
+        return True
+
+    @contextlib.contextmanager
+    def _package_job(self, foreground=True):
+        if foreground:
+            self._foreground_waiting.set()
+            if not self._package_lock.acquire(blocking=False):
+                self._print_info("Aguardando outra operação de pacotes terminar...")
+                self._package_lock.acquire()
+            self._foreground_waiting.clear()
         else:
-            print(f"\n==== 🍬 Doce Setup v{self.script_version} ====")
-            print(f"Sistema detectado: {self.distro.capitalize()} {self.version}\n")
+            while self._foreground_waiting.is_set():
+                time.sleep(0.2)
+            self._package_lock.acquire()
+        try:
+            self._wait_for_package_manager_lock(quiet=not foreground)
+            yield
+        finally:
+            self._package_lock.release()
 
-    def configure_root_ssh(self):
-        self._print_header("Configuração de Acesso SSH para Root")
+    def _prefetch_command(self, packages):
+        names = " ".join(packages)
+        if self.pkg_manager == "apt-get":
+            return f"apt-get install -y --download-only {names}"
+        elif self.pkg_manager in ("dnf", "yum"):
+            return f"{self.pkg_manager} install -y --downloadonly {names}"
+        elif self.pkg_manager == "pacman":
+            return f"pacman -Sw --noconfirm {names}"
+        elif self.pkg_manager == "zypper":
+            return f"zypper --non-interactive install --download-only {names}"
+        return None
+
+    def _prefetch_candidates(self):
+        candidates = []
+        
+        if self.pkg_manager != "apt-get" or self._foreign_architectures_include("i386"):
+            candidates.append(("arch32", self._package_set("arch32")))
+        
+        web_server = self._detect_web_server()
+        if web_server:
+            candidates.append((f"certbot-{web_server}", self._package_set(f"certbot-{web_server}")))
+        
+        candidates.append(("locale", self._package_set("locale")))
+        return [(name, packages) for name, packages in candidates if packages and name not in self._prefetched]
+
+    def _foreign_architectures_include(self, arch):
+        try:
+            with open(self._path("/var/lib/dpkg/arch"), 'r') as f:
+                return arch in f.read().split()
+        except OSError:
+            return False
+
+    def _prefetch_worker(self, candidates):
+        for name, packages in candidates:
+            command = self._prefetch_command(packages)
+            if command is None:
+                return
+            with self._package_job(foreground=False):
+                result = self._run_command(command, tail=False)
+            if result.returncode == 0:
+                self._prefetched.add(name)
+
+    def start_package_prefetch(self):
+        if os.environ.get("DOCESETUP_PREFETCH", "1") == "0" or not self.pkg_manager:
+            return
+        if self._prefetch_thread is not None and self._prefetch_thread.is_alive():
+            return
+        
+        def worker():
+            self._prefetch_worker(self._prefetch_candidates())
+        
+        self._prefetch_thread = threading.Thread(target=worker, name="docesetup-prefetch", daemon=True)
+        self._prefetch_thread.start()
+
+    def install_packages(self, packages, label=None, command=None):
+        if not packages and command is None:
+            return 0
+        
+        with self._span(f"instalar {label or ' '.join(packages)}", "subetapa", packages=list(packages)), self._package_job():
+            for attempt in range(3):
+                result = self._install_packages_now(packages, label, command)
+                if result.returncode == 0 or not PACKAGE_LOCK_ERRORS.search("\n".join(result.output)):
+                    break
+                self._wait_for_package_manager_lock()
+        
+        if result.returncode != 0:
+            self._print_command_failure(result)
+        else:
+            self._checkpoint(f"instalar {label or ' '.join(packages)}")
+        return result.returncode
+
+    def _install_packages_now(self, packages, label=None, command=None):
+        label = label or ", ".join(packages)
+        command = command or self._package_install_command(packages)
+        state = {
+            'phase': "download", 'message': "Resolvendo dependências...", 'updated': time.monotonic(),
+            'download_total': 0, 'download_done': 0, 'download_fraction': 0.0,
+            'install_fraction': 0.0, 'files_total': 0, 'files_done': 0,
+            'started': time.monotonic(), 'download_seconds': None,
+        }
+        
+        with self.reporter.package_progress(label, state) as progress:
+            def on_line(line):
+                if not self._parse_package_line(line, state):
+                    return
+                detail = ""
+                if state['download_total']:
+                    done = state['download_done'] or int(state['download_total'] * state['download_fraction'])
+                    detail = f"{self._format_bytes(min(done, state['download_total']))}/{self._format_bytes(state['download_total'])}"
+                progress.update(detail)
+            
+            result = self._run_command(command, on_line=on_line, env={"LC_ALL": "C"})
+            if result.returncode == 0:
+                progress.complete()
+        
+        if state['download_total'] and state['download_seconds']:
+            self.last_download_rate = state['download_total'] / max(state['download_seconds'], 0.001)
+        return result
+
+    def _update_config(self, filename, param, value):
+        filename = self._real_path(filename)
+        if not os.path.exists(filename):
+            return False
+            
+        with open(filename, 'r') as f:
+            content = f.read()
+        
+        if re.search(rf'^[#\s]*{param}\s', content, re.MULTILINE):
+            content = re.sub(rf'^[#\s]*{param}.*', f'{param} {value}', content, flags=re.MULTILINE)
+        else:
+            content += f'\n{param} {value}'
+        
+        self._rewrite_file(filename, content)
+        return True
+
+    def _update_ini_option(self, filename, section, param, value, separator='='):
+        filename = self._real_path(filename)
+        lines = []
+        if os.path.exists(filename):
+            with open(filename, 'r') as f:
+                lines = f.read().splitlines()
+        
+        entry = f"{param}{separator}{value}"
+        pattern = re.compile(rf'^[#\s]*{re.escape(param)}\s*=')
+        current = None
+        section_end = None
+        found = False
+        for i, line in enumerate(lines):
+            stripped = line.strip()
+            if stripped.startswith('[') and stripped.endswith(']'):
+                if current == section:
+                    section_end = i
+                    break
+                current = stripped[1:-1]
+            elif current == section and pattern.match(line):
+                lines[i] = entry
+                found = True
+                break
+        
+        if not found:
+            if current == section and section_end is None:
+                section_end = len(lines)
+            if section_end is None:
+                lines += ["", f"[{section}]", entry]
+            else:
+                while section_end > 0 and not lines[section_end - 1].strip():
+                    section_end -= 1
+                lines.insert(section_end, entry)
+        
+        self._rewrite_file(filename, "\n".join(lines) + "\n")
+        return True
+
+    def _print_header(self, text):
+        self.reporter.header(text)
+
+    def _print_success(self, text):
+        self.reporter.message("success", text)
+
+    def _print_error(self, text):
+        errors = getattr(self._step_state, 'errors', None)
+        if errors is not None:
+            errors.append(text)
+        self.reporter.message("error", text)
+
+    def _print_info(self, text):
+        self.reporter.message("info", text)
+
+    def _print_warning(self, text):
+        self.reporter.message("warning", text)
+
+    def _ask(self, question):
+        return self.reporter.confirm(question)
+
+    def _select_option(self, question, options):
+        return self.reporter.select(question, options)
+
+    def register_signal_handlers(self):
+        def handle_exit(signum=None, frame=None):
+            stream = sys.stdout if self.interactive else sys.stderr
+            if signum is not None:
+                if signum == signal.SIGINT:
+                    print("\n\nOperação cancelada pelo usuário.", file=stream)
+                elif signum == signal.SIGTERM:
+                    print("\n\nPrograma terminado.", file=stream)
+                elif signum == signal.SIGHUP:
+                    print("\n\nConexão encerrada.", file=stream)
+            if self.journal is not None and not self.journal.get('finished'):
+                if self.journal.get('source') == "menu":
+                    print("Há etapas pendentes. Escolha novamente a opção 9 para retomar de onde parou.", file=stream)
+                else:
+                    print("Há etapas pendentes. Para retomar de onde parou: python3 docesetup.py --resume", file=stream)
+            if self.interactive:
+                print("\nFinalizando o script Doce Setup.")
+            if signum is not None:
+                sys.exit(0)
+        
+        signal.signal(signal.SIGINT, handle_exit)
+        signal.signal(signal.SIGTERM, handle_exit)
+        signal.signal(signal.SIGHUP, handle_exit)
+        atexit.register(handle_exit)
+
+    def show_banner(self):
+        self.reporter.clear()
+        self.reporter.banner(f"🍬 Doce Setup v{self.script_version}", f"Sistema detectado: {self.distro.capitalize()} {self.version}")
+
+    def _read_sshd_settings(self, path=None, settings=None):
+        if settings is None:
+            settings = {}
+        with open(path or self._path(SSH_CONFIG), 'r') as f:
+            for line in f:
+                parts = line.split(None, 1)
+                if len(parts) < 2 or parts[0].startswith('#'):
+                    continue
+                key = parts[0].lower()
+                if key == 'match':
+                    break
+                if key == 'include':
+                    for pattern in parts[1].split():
+                        if not os.path.isabs(pattern):
+                            pattern = os.path.join(os.path.dirname(SSH_CONFIG), pattern)
+                        for included in sorted(glob.glob(self._path(pattern))):
+                            self._read_sshd_settings(included, settings)
+                    continue
+                settings.setdefault(key, (parts[1].strip(), path or self._path(SSH_CONFIG)))
+        return settings
+
+    def _sshd_drift(self, wanted):
+        if not os.path.exists(self._path(SSH_CONFIG)):
+            return [f"{self._path(SSH_CONFIG)} não encontrado"]
+        current = self._read_sshd_settings()
+        drift = []
+        for key, value in wanted:
+            actual = current.get(key.lower(), ("não definido", self._path(SSH_CONFIG)))
+            if actual[0] != value:
+                drift.append(f"{key} = {actual[0]} em {actual[1]} (esperado {value})")
+        return drift
+
+    def _apply_sshd_settings(self, wanted):
+        if not os.path.exists(self._path(SSH_CONFIG)):
+            self._print_error("Arquivo de configuração SSH não encontrado.")
+            return None
+        if not self._sshd_drift(wanted):
+            return False
+        current = self._read_sshd_settings()
+        for key, value in wanted:
+            path = current.get(key.lower(), (None, self._path(SSH_CONFIG)))[1]
+            self._update_config(path, key, value)
+        return True
+
+    def _restart_sshd(self, message="Reiniciando serviço SSH..."):
+        if self.root:
+            return
+        with self._progress(message):
+            self._execute_command("systemctl restart sshd || service sshd restart || /etc/init.d/ssh restart")
+
+    def check_root_ssh(self):
+        return self._sshd_drift(ROOT_SSH_SETTINGS)
+
+    def apply_root_ssh(self):
+        changed = self._apply_sshd_settings(ROOT_SSH_SETTINGS)
+        if changed:
+            self._restart_sshd()
+        return changed
+
+    def configure_root_ssh(self):
+        self._print_header("Configuração de Acesso SSH para Root")
         
         if self._ask("🔑 Deseja permitir acesso SSH para o usuário root com senha?"):
             self._print_info("Configurando acesso SSH para root...")
             
-            ssh_config = '/etc/ssh/sshd_config'
-            self._update_config(ssh_config, 'PermitRootLogin', 'yes')
-            self._update_config(ssh_config, 'PasswordAuthentication', 'yes')
+            if not os.path.exists(self._path(SSH_CONFIG)):
+                self._print_error("Arquivo de configuração SSH não encontrado.")
+                return
+            
+            if not self.apply_root_ssh():
+                self._print_info("O acesso SSH para root já estava configurado.")
             
             if self._ask("Deseja alterar a senha do usuário root?"):
                 self._print_info("Digite a nova senha do root:")
                 try:
                     password = getpass.getpass()
                     if password:
-                        self._execute_command(f"echo 'root:{password}' | chpasswd")
-                        
+                        names = ["root"]
                         if self._ask("Deseja aplicar a mesma senha para todos os outros usuários?"):
-                            self._print_info("Aplicando senha para outros usuários...")
-                            for user in pwd.getpwall():
-                                if user.pw_uid >= 1000 and user.pw_uid < 65534:
-                                    self._execute_command(f"echo '{user.pw_name}:{password}' | chpasswd")
+                            names += [user.pw_name for user in self._regular_users()]
+                            self._print_info(f"Aplicando senha para {len(names) - 1} outros usuários...")
                         
+                        if not self._bulk_chpasswd((name, password) for name in names):
+                            self._print_error("Não foi possível alterar a senha.")
+                            return
                         self._print_success("Senha alterada com sucesso!")
                     else:
                         self._print_error("Senha vazia não permitida.")
@@ -288,45 +1894,120 @@ class LinuxSetup:
                     self._print_error(f"Erro ao alterar a senha: {str(e)}")
                     return
             
-            if RICH_AVAILABLE:
-                with Progress(SpinnerColumn(), TextColumn("[bold blue]Reiniciando serviço SSH...")) as progress:
-                    progress.add_task("reiniciando", total=None)
-                    self._execute_command("systemctl restart sshd || service sshd restart || /etc/init.d/ssh restart")
-            else:
-                print("Reiniciando serviço SSH...")
-                self._execute_command("systemctl restart sshd || service sshd restart || /etc/init.d/ssh restart")
-            
             self._print_success("Acesso SSH para root configurado com sucesso!")
             self._print_info(f"Porta SSH atual: {self.ssh_port}")
         else:
             self._print_info("Configuração de acesso SSH para root ignorada.")
 
+    def check_ssh_timeout(self):
+        return self._sshd_drift(SSH_TIMEOUT_SETTINGS)
+
+    def apply_ssh_timeout(self):
+        changed = self._apply_sshd_settings(SSH_TIMEOUT_SETTINGS)
+        if changed:
+            self._restart_sshd("Aplicando configurações...")
+        return changed
+
     def disable_ssh_timeout(self):
         self._print_header("Desativação do Timeout do SSH")
         
         if self._ask("⏳ Deseja desativar o timeout da sessão SSH (5 horas)?"):
             self._print_info("Configurando timeout do SSH...")
             
-            ssh_config = '/etc/ssh/sshd_config'
-            if os.path.exists(ssh_config):
-                self._update_config(ssh_config, 'ClientAliveInterval', '290')
-                self._update_config(ssh_config, 'ClientAliveCountMax', '63')
-                
-                if RICH_AVAILABLE:
-                    with Progress(SpinnerColumn(), TextColumn("[bold blue]Aplicando configurações...")) as progress:
-                        progress.add_task("aplicando", total=None)
-                        self._execute_command("systemctl restart sshd || service sshd restart || /etc/init.d/ssh restart")
+            if os.path.exists(self._path(SSH_CONFIG)):
+                if self.apply_ssh_timeout():
+                    self._print_success("Timeout do SSH desativado com sucesso!")
                 else:
-                    print("Aplicando configurações...")
-                    self._execute_command("systemctl restart sshd || service sshd restart || /etc/init.d/ssh restart")
-                
-                self._print_success("Timeout do SSH desativado com sucesso!")
+                    self._print_info("O timeout do SSH já estava desativado.")
                 self._print_info("As sessões SSH agora permanecerão ativas por aproximadamente 5 horas.")
             else:
                 self._print_error("Arquivo de configuração SSH não encontrado.")
         else:
             self._print_info("Configuração de timeout do SSH ignorada.")
 
+    def _active_swaps(self):
+        swaps = []
+        if self.root:
+            return swaps
+        try:
+            with open(self._path("/proc/swaps"), 'r') as f:
+                for line in f.readlines()[1:]:
+                    parts = line.split()
+                    if len(parts) >= 3:
+                        swaps.append(parts[0])
+        except OSError:
+            pass
+        return swaps
+
+    def _fstab_has_swapfile(self):
+        try:
+            with open(self._path('/etc/fstab'), 'r') as f:
+                return any(line.split()[:1] == [SWAP_FILE] for line in f)
+        except OSError:
+            return False
+
+    def _write_swap_fstab_entry(self):
+        fstab_entry = f"{SWAP_FILE} none swap sw 0 0"
+        fstab = self._path('/etc/fstab')
+        if os.path.exists(fstab):
+            with open(fstab, 'r') as f:
+                fstab_content = f.read()
+            
+            if SWAP_FILE in fstab_content:
+                fstab_content = re.sub(r'.*swapfile.*', fstab_entry, fstab_content)
+                with open(fstab, 'w') as f:
+                    f.write(fstab_content)
+            else:
+                with open(fstab, 'a') as f:
+                    f.write(f'\n{fstab_entry}\n')
+
+    def check_swap(self, size=None):
+        if self.root:
+            if self._fstab_has_swapfile() or any(key == "swap" for key, _ in self._load_first_boot_plan()):
+                return []
+            return [f"{SWAP_FILE} não configurado no /etc/fstab nem agendado para o primeiro boot"]
+        active = self._active_swaps()
+        if size is None and not active:
+            return ["nenhuma memória swap ativa"]
+        
+        drift = []
+        if size is not None:
+            if SWAP_FILE not in active:
+                drift.append(f"{SWAP_FILE} não está ativo")
+            elif os.path.getsize(self._path(SWAP_FILE)) != self._parse_size(size[:-1], size[-1]):
+                drift.append(f"{SWAP_FILE} tem {self._format_bytes(os.path.getsize(self._path(SWAP_FILE)))} (esperado {size})")
+        if SWAP_FILE in active and not self._fstab_has_swapfile():
+            drift.append(f"{SWAP_FILE} ausente do /etc/fstab")
+        return drift
+
+    def apply_swap(self, size):
+        drift = self.check_swap(size)
+        if not drift:
+            return False
+        
+        steps = []
+        if SWAP_FILE in self._active_swaps() and os.path.getsize(self._path(SWAP_FILE)) != self._parse_size(size[:-1], size[-1]):
+            steps += [("Desativando swap atual...", f"swapoff {SWAP_FILE}"), ("Removendo arquivo swap atual...", f"rm -f {SWAP_FILE}")]
+        if SWAP_FILE not in self._active_swaps() or steps:
+            steps += [
+                ("Alocando arquivo swap...", f"fallocate -l {size} {SWAP_FILE}"),
+                ("Definindo permissões...", f"chmod 600 {SWAP_FILE}"),
+                ("Formatando swap...", f"mkswap {SWAP_FILE}"),
+                ("Ativando swap...", f"swapon {SWAP_FILE}"),
+            ]
+        
+        with self._progress("Configurando swap...") as progress:
+            for description, command in steps:
+                progress.update(description)
+                if self._execute_command(command) != 0:
+                    self._print_error(f"Falha ao configurar a swap: {command}")
+                    return None
+                self._checkpoint(command)
+            progress.update("Configurando inicialização automática...")
+            self._write_swap_fstab_entry()
+        
+        return True
+
     def create_swap(self):
         self._print_header("Configuração de Memória Swap")
         
@@ -335,10 +2016,7 @@ class LinuxSetup:
         if swap_exists:
             self._print_info("Memória swap já existe no sistema.")
             swap_info = self._get_command_output("free -h | grep Swap")
-            if RICH_AVAILABLE:
-                self.console.print(f"[green]Info de Swap: {swap_info}[/]")
-            else:
-                print(f"Info de Swap: {swap_info}")
+            self.reporter.message("note", f"Info de Swap: {swap_info}")
                 
             if '/swapfile' in swap_exists or '/swap' in swap_exists:
                 if self._ask("Deseja remover a swap existente e criar uma nova?"):
@@ -352,45 +2030,23 @@ class LinuxSetup:
                             break
                     
                     if swap_file:
-                        if RICH_AVAILABLE:
-                            with Progress(
-                                SpinnerColumn(),
-                                TextColumn("[bold blue]Removendo swap existente..."),
-                                BarColumn(),
-                                TextColumn("[bold]{task.description}"),
-                            ) as progress:
-                                task = progress.add_task("[green]Desativando swap...", total=None)
-                                self._execute_command(f"swapoff {swap_file}")
-                                
-                                progress.update(task, description="Removendo entradas do fstab...")
-                                if os.path.exists('/etc/fstab'):
-                                    with open('/etc/fstab', 'r') as f:
-                                        fstab_content = f.read()
-                                    
-                                    fstab_content = re.sub(r'.*swapfile.*\n?', '', fstab_content)
-                                    fstab_content = re.sub(r'.*swap.*\n?', '', fstab_content)
-                                    
-                                    with open('/etc/fstab', 'w') as f:
-                                        f.write(fstab_content)
-                                
-                                progress.update(task, description="Removendo arquivo swap...")
-                                self._execute_command(f"rm -f {swap_file}")
-                        else:
-                            print("Desativando swap...")
+                        with self._progress("Removendo swap existente...") as progress:
+                            progress.update("Desativando swap...")
                             self._execute_command(f"swapoff {swap_file}")
                             
-                            print("Removendo entradas do fstab...")
-                            if os.path.exists('/etc/fstab'):
-                                with open('/etc/fstab', 'r') as f:
+                            progress.update("Removendo entradas do fstab...")
+                            fstab = self._path('/etc/fstab')
+                            if os.path.exists(fstab):
+                                with open(fstab, 'r') as f:
                                     fstab_content = f.read()
                                 
                                 fstab_content = re.sub(r'.*swapfile.*\n?', '', fstab_content)
                                 fstab_content = re.sub(r'.*swap.*\n?', '', fstab_content)
                                 
-                                with open('/etc/fstab', 'w') as f:
+                                with open(fstab, 'w') as f:
                                     f.write(fstab_content)
                             
-                            print("Removendo arquivo swap...")
+                            progress.update("Removendo arquivo swap...")
                             self._execute_command(f"rm -f {swap_file}")
                         
                         self._print_success("Swap removida com sucesso!")
@@ -405,133 +2061,376 @@ class LinuxSetup:
                     return
         
         if self._ask("💾 Deseja criar uma memória swap?"):
-            sizes = ["2G", "4G", "8G", "16G", "32G"]
-            swap_size = self._select_option("Selecione o tamanho da memória swap:", sizes)
+            memory = self.environment()['memory']
+            self._print_info(f"Memória disponível: {self._format_bytes(memory)} (tamanho recomendado: {self._default_swap_size()})")
+            swap_size = self._select_option("Selecione o tamanho da memória swap:", SWAP_SIZES)
             
             self._print_info(f"Criando memória swap de {swap_size}...")
             
-            if RICH_AVAILABLE:
-                with Progress(
-                    SpinnerColumn(),
-                    TextColumn("[bold blue]Configurando swap..."),
-                    BarColumn(),
-                    TextColumn("[bold]{task.description}"),
-                ) as progress:
-                    task1 = progress.add_task("[green]Alocando arquivo swap...", total=None)
-                    self._execute_command(f"fallocate -l {swap_size} /swapfile")
-                    progress.update(task1, description="Definindo permissões...")
-                    self._execute_command("chmod 600 /swapfile")
-                    progress.update(task1, description="Formatando swap...")
-                    self._execute_command("mkswap /swapfile")
-                    progress.update(task1, description="Ativando swap...")
-                    self._execute_command("swapon /swapfile")
-                    progress.update(task1, description="Configurando inicialização automática...")
-                    
-                    fstab_entry = "/swapfile none swap sw 0 0"
-                    if os.path.exists('/etc/fstab'):
-                        with open('/etc/fstab', 'r') as f:
-                            fstab_content = f.read()
-                        
-                        if '/swapfile' in fstab_content:
-                            fstab_content = re.sub(r'.*swapfile.*', fstab_entry, fstab_content)
-                            with open('/etc/fstab', 'w') as f:
-                                f.write(fstab_content)
-                        else:
-                            with open('/etc/fstab', 'a') as f:
-                                f.write(f'\n{fstab_entry}\n')
-            else:
-                print("Alocando arquivo swap...")
-                self._execute_command(f"fallocate -l {swap_size} /swapfile")
-                print("Definindo permissões...")
-                self._execute_command("chmod 600 /swapfile")
-                print("Formatando swap...")
-                self._execute_command("mkswap /swapfile")
-                print("Ativando swap...")
-                self._execute_command("swapon /swapfile")
-                print("Configurando inicialização automática...")
-                
-                fstab_entry = "/swapfile none swap sw 0 0"
-                if os.path.exists('/etc/fstab'):
-                    with open('/etc/fstab', 'r') as f:
-                        fstab_content = f.read()
-                    
-                    if '/swapfile' in fstab_content:
-                        fstab_content = re.sub(r'.*swapfile.*', fstab_entry, fstab_content)
-                        with open('/etc/fstab', 'w') as f:
-                            f.write(fstab_content)
-                    else:
-                        with open('/etc/fstab', 'a') as f:
-                            f.write(f'\n{fstab_entry}\n')
+            changed = self.apply_swap(swap_size)
+            if changed is None:
+                return
+            if not changed:
+                self._print_info(f"A memória swap de {swap_size} já está configurada.")
+                return
             
             self._print_success(f"Memória swap de {swap_size} criada e configurada com sucesso!")
             
             new_swap_info = self._get_command_output("free -h | grep Swap")
-            if RICH_AVAILABLE:
-                self.console.print(f"[green]Nova Info de Swap: {new_swap_info}[/]")
-            else:
-                print(f"Nova Info de Swap: {new_swap_info}")
+            self.reporter.message("note", f"Nova Info de Swap: {new_swap_info}")
         else:
             self._print_info("Configuração de memória swap ignorada.")
 
+    def _proxy_reachable(self, proxy):
+        match = re.match(r'^https?://([^/:]+)(?::(\d+))?', proxy)
+        if not match:
+            return False
+        try:
+            with socket.create_connection((match.group(1), int(match.group(2) or 80)), timeout=3):
+                return True
+        except OSError:
+            return False
+
+    def _configure_package_downloads(self, proxy=None):
+        changed = []
+        
+        if self.pkg_manager == "apt-get":
+            with open(self._path(APT_DOWNLOADS_CONF), 'w') as f:
+                f.write('Acquire::Queue-Mode "host";\n')
+                f.write(f'Acquire::http::Pipeline-Depth "{PARALLEL_DOWNLOADS}";\n')
+                f.write('Acquire::Retries "3";\n')
+                if proxy:
+                    f.write(f'Acquire::http::Proxy "{proxy}";\n')
+            changed.append(self._path(APT_DOWNLOADS_CONF))
+        elif self.pkg_manager in ("dnf", "yum"):
+            conf = self._path("/etc/dnf/dnf.conf" if self.pkg_manager == "dnf" else "/etc/yum.conf")
+            if self.pkg_manager == "dnf":
+                self._update_ini_option(conf, "main", "max_parallel_downloads", str(PARALLEL_DOWNLOADS))
+            self._update_ini_option(conf, "main", "fastestmirror", "True")
+            self._update_ini_option(conf, "main", "keepcache", "True")
+            if proxy:
+                self._update_ini_option(conf, "main", "proxy", proxy)
+            changed.append(conf)
+        elif self.pkg_manager == "pacman":
+            conf = self._path("/etc/pacman.conf")
+            self._update_ini_option(conf, "options", "ParallelDownloads", f" {PARALLEL_DOWNLOADS}", separator=" =")
+            if proxy:
+                self._update_ini_option(conf, "options", "XferCommand",
+                                        f" /usr/bin/curl --proxy {proxy} -L -C - -f -o %o %u", separator=" =")
+            changed.append(conf)
+        elif self.pkg_manager == "zypper":
+            conf = self._path("/etc/zypp/zypp.conf")
+            self._update_ini_option(conf, "main", "download.max_concurrent_connections", f" {PARALLEL_DOWNLOADS}", separator=" =")
+            sysconfig_proxy = self._path("/etc/sysconfig/proxy")
+            if proxy and not os.path.exists(sysconfig_proxy):
+                os.makedirs(os.path.dirname(sysconfig_proxy), exist_ok=True)
+                with open(sysconfig_proxy, 'w') as f:
+                    f.write(f'PROXY_ENABLED="yes"\nHTTP_PROXY="{proxy}"\n')
+                changed.append(sysconfig_proxy)
+            elif proxy:
+                self._update_config_assignment(sysconfig_proxy, "PROXY_ENABLED", '"yes"')
+                self._update_config_assignment(sysconfig_proxy, "HTTP_PROXY", f'"{proxy}"')
+                changed.append(sysconfig_proxy)
+            changed.append(conf)
+        
+        return changed
+
+    def _update_config_assignment(self, filename, param, value):
+        filename = self._real_path(filename)
+        with open(filename, 'r') as f:
+            content = f.read()
+        
+        if re.search(rf'^[#\s]*{param}=', content, re.MULTILINE):
+            content = re.sub(rf'^[#\s]*{param}=.*', f'{param}={value}', content, flags=re.MULTILINE)
+        else:
+            content += f'\n{param}={value}\n'
+        
+        self._rewrite_file(filename, content)
+
+    def check_package_downloads(self):
+        expected = {
+            "apt-get": (APT_DOWNLOADS_CONF, rf'^Acquire::http::Pipeline-Depth "{PARALLEL_DOWNLOADS}";'),
+            "dnf": ("/etc/dnf/dnf.conf", rf'^max_parallel_downloads\s*=\s*{PARALLEL_DOWNLOADS}\s*$'),
+            "yum": ("/etc/yum.conf", r'^fastestmirror\s*=\s*True\s*$'),
+            "pacman": ("/etc/pacman.conf", rf'^ParallelDownloads\s*=\s*{PARALLEL_DOWNLOADS}\s*$'),
+            "zypper": ("/etc/zypp/zypp.conf", rf'^download\.max_concurrent_connections\s*=\s*{PARALLEL_DOWNLOADS}\s*$'),
+        }
+        if self.pkg_manager not in expected:
+            return ["gerenciador de pacotes não suportado"]
+        
+        conf, pattern = expected[self.pkg_manager]
+        conf = self._path(conf)
+        try:
+            with open(conf, 'r') as f:
+                if re.search(pattern, f.read(), re.MULTILINE):
+                    return []
+        except OSError:
+            pass
+        return [f"downloads paralelos não configurados em {conf}"]
+
+    def apply_package_downloads(self, proxy=None):
+        if not self.pkg_manager:
+            self._print_error("Nenhum gerenciador de pacotes suportado foi detectado.")
+            return None
+        if proxy and not self._proxy_reachable(proxy):
+            self._print_warning(f"O proxy {proxy} não está acessível. Ele não será configurado.")
+            proxy = ""
+        if not proxy and not self.check_package_downloads():
+            return False
+        self._configure_package_downloads(proxy)
+        return True
+
+    def optimize_package_downloads(self):
+        self._print_header("Otimização de Downloads de Pacotes")
+        
+        if not self.pkg_manager:
+            self._print_error("Nenhum gerenciador de pacotes suportado foi detectado.")
+            return
+        
+        if self._ask("📦 Deseja ativar downloads paralelos e otimizações do gerenciador de pacotes?"):
+            proxy = os.environ.get("DOCESETUP_PKG_PROXY", "")
+            if not proxy and self._ask("Deseja usar um proxy de cache local de pacotes (ex.: apt-cacher-ng)?"):
+                proxy = input("Endereço do proxy (ex.: http://10.0.0.2:3142): ").strip()
+            
+            if proxy and not self._proxy_reachable(proxy):
+                self._print_warning(f"O proxy {proxy} não está acessível. Ele não será configurado.")
+                proxy = ""
+            
+            changed = self._configure_package_downloads(proxy)
+            
+            self._print_success(f"Gerenciador {self.pkg_manager} otimizado para downloads paralelos!")
+            for path in changed:
+                self._print_info(f"Arquivo atualizado: {path}")
+            if proxy:
+                self._print_info(f"Os pacotes serão baixados através do cache em {proxy}.")
+                if self.pkg_manager == "pacman":
+                    self._print_warning("Com o proxy configurado via XferCommand, o pacman baixa um pacote por vez.")
+        else:
+            self._print_info("Otimização de downloads de pacotes ignorada.")
+
+    def _bundle_packages(self, groups):
+        packages = []
+        for group in groups:
+            for package_set in BUNDLE_GROUPS.get(group, []):
+                for package in self._package_set(package_set):
+                    if package not in packages:
+                        packages.append(package)
+        return packages
+
+    def _download_package_closure(self, packages, target_dir):
+        names = " ".join(packages)
+        
+        if self.pkg_manager == "apt-get":
+            os.makedirs(os.path.join(target_dir, "partial"), exist_ok=True)
+            empty_status = os.path.join(target_dir, "partial", "status")
+            open(empty_status, 'w').close()
+            return self._run_command(
+                f"apt-get install -y --download-only -o Dir::State::status={empty_status} "
+                f"-o Dir::Cache::archives={target_dir} {names}")
+        elif self.pkg_manager == "dnf":
+            return self._run_command(f"dnf download --resolve --alldeps --destdir {target_dir} {names}")
+        elif self.pkg_manager == "yum":
+            return self._run_command(f"yumdownloader --resolve --destdir {target_dir} {names}")
+        elif self.pkg_manager == "pacman":
+            db_path = os.path.join(target_dir, "partial", "db")
+            os.makedirs(os.path.join(db_path, "local"), exist_ok=True)
+            shutil.copytree("/var/lib/pacman/sync", os.path.join(db_path, "sync"))
+            return self._run_command(f"pacman -Sw --noconfirm --cachedir {target_dir} --dbpath {db_path} {names}")
+        return None
+
+    def _file_sha256(self, path):
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def export_package_bundle(self, groups, output=None):
+        import tarfile
+        packages = self._bundle_packages(groups)
+        if not packages:
+            self._print_error("Nenhum pacote corresponde aos grupos selecionados neste sistema.")
+            return None
+        
+        output = output or os.path.abspath(f"docesetup-bundle-{self.distro}{self.version}-{datetime.now().strftime('%Y%m%d')}.tar")
+        
+        with tempfile.TemporaryDirectory(prefix="docesetup-bundle-") as work_dir:
+            packages_dir = os.path.join(work_dir, "packages")
+            os.makedirs(packages_dir)
+            
+            with self._package_job():
+                with self._progress(f"Resolvendo e baixando {len(packages)} pacote(s) e dependências..."):
+                    result = self._download_package_closure(packages, packages_dir)
+            
+            if result is None:
+                self._print_error(f"Exportação de pacotes não suportada para {self.pkg_manager}.")
+                return None
+            if result.returncode != 0:
+                self._print_command_failure(result)
+                return None
+            
+            files = []
+            for name in sorted(os.listdir(packages_dir)):
+                path = os.path.join(packages_dir, name)
+                if name.endswith(BUNDLE_EXTENSIONS) and os.path.isfile(path):
+                    files.append({'name': name, 'size': os.path.getsize(path), 'sha256': self._file_sha256(path)})
+            
+            manifest = {
+                'format': 1,
+                'created': datetime.now(timezone.utc).isoformat(),
+                'distro': self.distro,
+                'version': self.version,
+                'arch': platform.machine(),
+                'pkg_manager': self.pkg_manager,
+                'groups': groups,
+                'packages': packages,
+                'files': files,
+            }
+            with open(os.path.join(work_dir, "manifest.json"), 'w') as f:
+                json.dump(manifest, f, indent=2)
+            
+            with tarfile.open(output, 'w') as archive:
+                archive.add(os.path.join(work_dir, "manifest.json"), arcname="manifest.json")
+                for entry in files:
+                    archive.add(os.path.join(packages_dir, entry['name']), arcname=f"packages/{entry['name']}")
+        
+        total = sum(entry['size'] for entry in files)
+        self._print_success(f"Pacote offline criado: {output}")
+        self._print_info(f"{len(files)} arquivo(s), {self._format_bytes(total)}.")
+        return output
+
+    def import_package_bundle(self, path):
+        import tarfile
+        with tempfile.TemporaryDirectory(prefix="docesetup-bundle-") as work_dir:
+            try:
+                with tarfile.open(path, 'r') as archive:
+                    members = [member for member in archive.getmembers()
+                               if member.isfile() and not member.name.startswith('/') and '..' not in member.name.split('/')]
+                    archive.extractall(work_dir, members=members)
+                with open(os.path.join(work_dir, "manifest.json"), 'r') as f:
+                    manifest = json.load(f)
+            except (OSError, ValueError, tarfile.TarError) as e:
+                self._print_error(f"Pacote offline inválido: {str(e)}")
+                return False
+            
+            if manifest.get('pkg_manager') != self.pkg_manager or manifest.get('arch') != platform.machine():
+                self._print_error(f"O pacote foi gerado para {manifest.get('distro')} {manifest.get('version')} "
+                                  f"({manifest.get('pkg_manager')}, {manifest.get('arch')}) e não é compatível com este sistema.")
+                return False
+            if (manifest.get('distro'), manifest.get('version')) != (self.distro, self.version):
+                self._print_warning(f"O pacote foi gerado em {manifest.get('distro')} {manifest.get('version')}; este sistema é {self.distro} {self.version}.")
+            
+            files = []
+            for entry in manifest.get('files', []):
+                file_path = os.path.join(work_dir, "packages", os.path.basename(entry['name']))
+                if not os.path.exists(file_path) or self._file_sha256(file_path) != entry['sha256']:
+                    self._print_error(f"Soma de verificação inválida para {entry['name']}. Importação cancelada.")
+                    return False
+                files.append(file_path)
+            
+            if not files:
+                self._print_error("O pacote offline não contém arquivos de pacotes.")
+                return False
+            
+            if self.pkg_manager == "apt-get" and any(name.endswith(":i386") for name in manifest.get('packages', [])):
+                self._execute_command("dpkg --add-architecture i386")
+            
+            names = " ".join(shlex.quote(file_path) for file_path in files)
+            if self.pkg_manager == "apt-get":
+                command = f"apt-get install -y --no-download -o APT::Status-Fd=1 -o Dpkg::Use-Pty=0 {names}"
+            elif self.pkg_manager in ("dnf", "yum"):
+                command = f"{self.pkg_manager} install -y --disablerepo=* {names}"
+            elif self.pkg_manager == "pacman":
+                command = f"pacman -U --noconfirm --needed {names}"
+            else:
+                self._print_error(f"Importação de pacotes não suportada para {self.pkg_manager}.")
+                return False
+            
+            if self.install_packages(manifest.get('packages', []), "pacote offline", command=command) != 0:
+                return False
+        
+        self._print_success(f"{len(files)} pacote(s) instalado(s) a partir do pacote offline.")
+        return True
+
+    def manage_offline_bundle(self):
+        self._print_header("Pacotes Offline (Ambientes Isolados)")
+        
+        action = self._select_option("O que deseja fazer?", ["exportar", "importar", "cancelar"])
+        
+        if action == "exportar":
+            self._print_info(f"Grupos disponíveis: {', '.join(BUNDLE_GROUPS)}")
+            answer = input("Grupos a incluir (separados por vírgula): ")
+            groups = [group.strip() for group in answer.split(',') if group.strip() in BUNDLE_GROUPS]
+            if not groups:
+                self._print_error("Nenhum grupo válido selecionado.")
+                return
+            self.export_package_bundle(groups)
+        elif action == "importar":
+            path = input("Caminho do arquivo do pacote offline: ").strip()
+            self.import_package_bundle(path)
+        else:
+            self._print_info("Operação com pacotes offline cancelada.")
+
+    def check_arch32(self):
+        packages = self._package_set("arch32")
+        if not packages:
+            return ["gerenciador de pacotes não suportado para a arquitetura 32 bits"]
+        
+        drift = []
+        if self.pkg_manager == "apt-get" and not self._foreign_architectures_include("i386"):
+            drift.append("arquitetura i386 não adicionada ao dpkg")
+        missing = self._missing_packages(packages)
+        if missing:
+            drift.append(f"pacotes ausentes: {', '.join(missing)}")
+        return drift
+
+    def apply_arch32(self):
+        packages = self._package_set("arch32")
+        if not packages:
+            self._print_error("Gerenciador de pacotes não suportado para a arquitetura 32 bits.")
+            return None
+        
+        changed = False
+        if self.pkg_manager == "apt-get" and not self._foreign_architectures_include("i386"):
+            with self._package_job():
+                with self._progress("Preparando a arquitetura 32 bits...") as progress:
+                    progress.update("Adicionando arquitetura i386...")
+                    self._execute_command(self._in_root("dpkg --add-architecture i386"))
+                    progress.update("Atualizando repositórios...")
+                    self._execute_command(self.pkg_update)
+            self._checkpoint("dpkg --add-architecture i386")
+            changed = True
+        
+        missing = self._missing_packages(packages)
+        if missing:
+            if self.install_packages(missing, "bibliotecas 32 bits") != 0:
+                self._print_error("Não foi possível instalar as bibliotecas de compatibilidade 32 bits.")
+                return None
+            changed = True
+        return changed
+
     def enable_32bit_arch(self):
         self._print_header("Ativação da Arquitetura 32 bits")
         
         if self._ask("🏗️ Deseja ativar a arquitetura 32 bits (para compatibilidade com aplicativos mais antigos)?"):
             self._print_info("Ativando arquitetura 32 bits...")
             
-            if RICH_AVAILABLE:
-                with Progress(
-                    SpinnerColumn(),
-                    TextColumn("[bold blue]Configurando arquitetura 32 bits..."),
-                    BarColumn(),
-                    TextColumn("[bold]{task.description}"),
-                ) as progress:
-                    task = progress.add_task("[green]Processando...", total=None)
-                    
-                    if self.distro in ['ubuntu', 'debian', 'linuxmint', 'pop', 'elementary', 'zorin']:
-                        progress.update(task, description="Adicionando arquitetura i386...")
-                        self._execute_command("dpkg --add-architecture i386")
-                        progress.update(task, description="Atualizando repositórios...")
-                        self._execute_command("apt-get update")
-                        progress.update(task, description="Instalando bibliotecas...")
-                        self._execute_command("apt-get install -y libc6:i386 libncurses5:i386 libstdc++6:i386")
-                    elif self.distro in ['fedora', 'centos', 'rhel', 'rocky', 'almalinux']:
-                        progress.update(task, description="Instalando suporte 32 bits...")
-                        self._execute_command("dnf install -y glibc.i686 ncurses-libs.i686 libstdc++.i686")
-                    elif self.distro in ['arch', 'manjaro', 'endeavouros']:
-                        progress.update(task, description="Instalando suporte 32 bits...")
-                        self._execute_command("pacman -S --noconfirm lib32-glibc lib32-ncurses lib32-gcc-libs")
-                    else:
-                        progress.update(task, description="Tentando método genérico...")
-                        self._execute_command("dpkg --add-architecture i386 || echo 'Não foi possível adicionar arquitetura i386'")
-                        self._execute_command("apt-get update || echo 'Não foi possível atualizar os repositórios'")
-                        self._execute_command("apt-get install -y libc6:i386 libncurses5:i386 libstdc++6:i386 || echo 'Não foi possível instalar bibliotecas de compatibilidade'")
-            else:
-                if self.distro in ['ubuntu', 'debian', 'linuxmint', 'pop', 'elementary', 'zorin']:
-                    print("Adicionando arquitetura i386...")
-                    self._execute_command("dpkg --add-architecture i386")
-                    print("Atualizando repositórios...")
-                    self._execute_command("apt-get update")
-                    print("Instalando bibliotecas...")
-                    self._execute_command("apt-get install -y libc6:i386 libncurses5:i386 libstdc++6:i386")
-                elif self.distro in ['fedora', 'centos', 'rhel', 'rocky', 'almalinux']:
-                    print("Instalando suporte 32 bits...")
-                    self._execute_command("dnf install -y glibc.i686 ncurses-libs.i686 libstdc++.i686")
-                elif self.distro in ['arch', 'manjaro', 'endeavouros']:
-                    print("Instalando suporte 32 bits...")
-                    self._execute_command("pacman -S --noconfirm lib32-glibc lib32-ncurses lib32-gcc-libs")
-                else:
-                    print("Tentando método genérico...")
-                    self._execute_command("dpkg --add-architecture i386 || echo 'Não foi possível adicionar arquitetura i386'")
-                    self._execute_command("apt-get update || echo 'Não foi possível atualizar os repositórios'")
-                    self._execute_command("apt-get install -y libc6:i386 libncurses5:i386 libstdc++6:i386 || echo 'Não foi possível instalar bibliotecas de compatibilidade'")
+            changed = self.apply_arch32()
+            if changed is None:
+                return
             
-            self._print_success("Arquitetura 32 bits ativada com sucesso!")
+            if changed:
+                self._print_success("Arquitetura 32 bits ativada com sucesso!")
+            else:
+                self._print_info("A arquitetura 32 bits já estava ativada.")
             self._print_info("Agora você poderá executar aplicativos 32 bits em seu sistema.")
         else:
             self._print_info("Ativação da arquitetura 32 bits ignorada.")
 
     def _detect_web_server(self):
+        return self._cached_fact('web_server', self._probe_web_server)
+
+    def _probe_web_server(self):
         apache_installed = (self._execute_command("which apache2") == 0) or (self._execute_command("which httpd") == 0)
         apache_running = (self._execute_command("systemctl is-active --quiet apache2") == 0) or (self._execute_command("systemctl is-active --quiet httpd") == 0)
         
@@ -549,7 +2448,7 @@ class LinuxSetup:
         else:
             return None
 
-    def _update_nginx_site(self, domain, ssl_cert, ssl_key):
+    def _update_nginx_site(self, domain, ssl_cert, ssl_key, reload=True):
         self._execute_command("mkdir -p /etc/nginx/sites-available")
         self._execute_command("mkdir -p /etc/nginx/sites-enabled")
         
@@ -669,6 +2568,9 @@ server {{
         
         self._execute_command("mkdir -p /var/www/html")
         
+        if not reload:
+            return True
+        
         if self._execute_command("nginx -t") == 0:
             self._execute_command("systemctl restart nginx")
             return True
@@ -676,7 +2578,7 @@ server {{
             self._print_error("Erro na configuração do Nginx. Verifique a sintaxe.")
             return False
 
-    def _update_apache_site(self, domain, ssl_cert, ssl_key):
+    def _update_apache_site(self, domain, ssl_cert, ssl_key, reload=True):
         apache_conf_dir = "/etc/apache2" if os.path.exists("/etc/apache2") else "/etc/httpd"
         sites_available = f"{apache_conf_dir}/sites-available"
         sites_enabled = f"{apache_conf_dir}/sites-enabled"
@@ -804,6 +2706,9 @@ server {{
         
         self._execute_command("mkdir -p /var/www/html")
         
+        if not reload:
+            return True
+        
         if self.distro in ['ubuntu', 'debian']:
             self._execute_command("systemctl restart apache2")
         else:
@@ -853,123 +2758,663 @@ server {{
         
         return error_found
 
-    def configure_ssl_certificate(self):
-        self._print_header("Configuração de Certificado SSL")
+    def _read_renewal_conf(self, path):
+        info = {}
+        with open(path, 'r') as f:
+            for line in f:
+                line = line.strip()
+                if line.startswith('['):
+                    if line != '[renewalparams]':
+                        break
+                    continue
+                if '=' in line and not line.startswith('#'):
+                    key, value = line.split('=', 1)
+                    info[key.strip()] = value.strip()
+        return info
+
+    def _load_certificate_index_cache(self):
+        if self._cert_index_cache is not None:
+            return self._cert_index_cache
         
-        if self._ask("🔐 Deseja configurar um certificado SSL gratuito?"):
-            web_server = self._detect_web_server()
-            
-            if not web_server:
-                self._print_info("Nenhum servidor web detectado. É necessário um servidor web para configurar SSL.")
-                server_options = ["apache", "nginx", "nenhum"]
-                selected_server = self._select_option("Qual servidor web você deseja instalar?", server_options)
-                
-                if selected_server == "nenhum":
-                    self._print_info("Configuração SSL cancelada. É necessário um servidor web para continuar.")
-                    return
-                
-                self._print_info(f"Instalando servidor web {selected_server}...")
-                if RICH_AVAILABLE:
-                    with Progress(SpinnerColumn(), TextColumn(f"[bold blue]Instalando {selected_server}...")) as progress:
-                        task = progress.add_task("instalando", total=None)
-                        
-                        if selected_server == "apache":
-                            if self.distro in ['ubuntu', 'debian', 'linuxmint', 'pop', 'elementary', 'zorin']:
-                                self._execute_command("apt-get install -y apache2")
-                            elif self.distro in ['fedora', 'centos', 'rhel', 'rocky', 'almalinux']:
-                                self._execute_command("dnf install -y httpd mod_ssl")
-                            elif self.distro in ['arch', 'manjaro', 'endeavouros']:
-                                self._execute_command("pacman -S --noconfirm apache")
-                            else:
-                                self._execute_command("apt-get install -y apache2 || dnf install -y httpd || pacman -S --noconfirm apache")
-                        else:  
-                            if self.distro in ['ubuntu', 'debian', 'linuxmint', 'pop', 'elementary', 'zorin']:
-                                self._execute_command("apt-get install -y nginx")
-                            elif self.distro in ['fedora', 'centos', 'rhel', 'rocky', 'almalinux']:
-                                self._execute_command("dnf install -y nginx")
-                            elif self.distro in ['arch', 'manjaro', 'endeavouros']:
-                                self._execute_command("pacman -S --noconfirm nginx")
-                            else:
-                                self._execute_command("apt-get install -y nginx || dnf install -y nginx || pacman -S --noconfirm nginx")
-                else:
-                    print(f"Instalando servidor web {selected_server}...")
-                    if selected_server == "apache":
-                        if self.distro in ['ubuntu', 'debian', 'linuxmint', 'pop', 'elementary', 'zorin']:
-                            self._execute_command("apt-get install -y apache2")
-                        elif self.distro in ['fedora', 'centos', 'rhel', 'rocky', 'almalinux']:
-                            self._execute_command("dnf install -y httpd mod_ssl")
-                        elif self.distro in ['arch', 'manjaro', 'endeavouros']:
-                            self._execute_command("pacman -S --noconfirm apache")
-                        else:
-                            self._execute_command("apt-get install -y apache2 || dnf install -y httpd || pacman -S --noconfirm apache")
-                    else:  
-                        if self.distro in ['ubuntu', 'debian', 'linuxmint', 'pop', 'elementary', 'zorin']:
-                            self._execute_command("apt-get install -y nginx")
-                        elif self.distro in ['fedora', 'centos', 'rhel', 'rocky', 'almalinux']:
-                            self._execute_command("dnf install -y nginx")
-                        elif self.distro in ['arch', 'manjaro', 'endeavouros']:
-                            self._execute_command("pacman -S --noconfirm nginx")
-                        else:
-                            self._execute_command("apt-get install -y nginx || dnf install -y nginx || pacman -S --noconfirm nginx")
-                
-                if selected_server == "apache":
-                    if self.distro in ['ubuntu', 'debian']:
-                        self._execute_command("systemctl enable apache2 && systemctl start apache2")
-                    else:
-                        self._execute_command("systemctl enable httpd && systemctl start httpd")
-                else:  
-                    self._execute_command("systemctl enable nginx && systemctl start nginx")
-                
-                web_server = selected_server
-                self._print_success(f"Servidor web {selected_server} instalado e iniciado com sucesso!")
+        self._cert_index_cache = {}
+        cache_file = os.path.join(CACHE_DIR, "cert-index.json")
+        if os.path.exists(cache_file):
+            try:
+                with open(cache_file, 'r') as f:
+                    self._cert_index_cache = json.load(f)
+            except (OSError, ValueError):
+                self._cert_index_cache = {}
+        return self._cert_index_cache
 
-            if not shutil.which('certbot'):
-                self._print_info("Instalando Certbot...")
-                
-                if RICH_AVAILABLE:
-                    with Progress(SpinnerColumn(), TextColumn("[bold blue]Instalando Certbot...")) as progress:
-                        task = progress.add_task("instalando", total=None)
-                        
-                        if web_server == "apache":
-                            if self.distro in ['ubuntu', 'debian', 'linuxmint', 'pop', 'elementary', 'zorin']:
-                                self._execute_command("apt-get install -y certbot python3-certbot-apache")
-                            elif self.distro in ['fedora', 'centos', 'rhel', 'rocky', 'almalinux']:
-                                self._execute_command("dnf install -y certbot python3-certbot-apache")
-                            else:
-                                self._execute_command("apt-get install -y certbot python3-certbot-apache || dnf install -y certbot python3-certbot-apache || echo 'Não foi possível instalar o plugin Apache para o Certbot'")
-                        else:  
-                            if self.distro in ['ubuntu', 'debian', 'linuxmint', 'pop', 'elementary', 'zorin']:
-                                self._execute_command("apt-get install -y certbot python3-certbot-nginx")
-                            elif self.distro in ['fedora', 'centos', 'rhel', 'rocky', 'almalinux']:
-                                self._execute_command("dnf install -y certbot python3-certbot-nginx")
-                            else:
-                                self._execute_command("apt-get install -y certbot python3-certbot-nginx || dnf install -y certbot python3-certbot-nginx || echo 'Não foi possível instalar o plugin Nginx para o Certbot'")
+    def _save_certificate_index_cache(self, cache):
+        cache_file = os.path.join(CACHE_DIR, "cert-index.json")
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            tmp_file = f"{cache_file}.tmp"
+            with open(tmp_file, 'w') as f:
+                json.dump(cache, f)
+            os.replace(tmp_file, cache_file)
+        except OSError:
+            pass
+
+    def get_certificate_index(self):
+        renewal_dir = os.path.join(LETSENCRYPT_DIR, "renewal")
+        cache = self._load_certificate_index_cache()
+        
+        if not os.path.isdir(renewal_dir):
+            return []
+        
+        index = []
+        seen = set()
+        changed = False
+        for conf_name in sorted(os.listdir(renewal_dir)):
+            if not conf_name.endswith('.conf'):
+                continue
+            
+            name = conf_name[:-len('.conf')]
+            conf_path = os.path.join(renewal_dir, conf_name)
+            try:
+                conf_mtime = os.stat(conf_path).st_mtime
+                cached = cache.get(name)
+                if cached and cached.get('conf_mtime') == conf_mtime:
+                    cert_path = cached['cert']
                 else:
-                    print("Instalando Certbot...")
-                    if web_server == "apache":
-                        if self.distro in ['ubuntu', 'debian', 'linuxmint', 'pop', 'elementary', 'zorin']:
-                            self._execute_command("apt-get install -y certbot python3-certbot-apache")
-                        elif self.distro in ['fedora', 'centos', 'rhel', 'rocky', 'almalinux']:
-                            self._execute_command("dnf install -y certbot python3-certbot-apache")
-                        else:
-                            self._execute_command("apt-get install -y certbot python3-certbot-apache || dnf install -y certbot python3-certbot-apache || echo 'Não foi possível instalar o plugin Apache para o Certbot'")
-                    else:  
-                        if self.distro in ['ubuntu', 'debian', 'linuxmint', 'pop', 'elementary', 'zorin']:
-                            self._execute_command("apt-get install -y certbot python3-certbot-nginx")
-                        elif self.distro in ['fedora', 'centos', 'rhel', 'rocky', 'almalinux']:
-                            self._execute_command("dnf install -y certbot python3-certbot-nginx")
-                        else:
-                            self._execute_command("apt-get install -y certbot python3-certbot-nginx || dnf install -y certbot python3-certbot-nginx || echo 'Não foi possível instalar o plugin Nginx para o Certbot'")
+                    conf = self._read_renewal_conf(conf_path)
+                    cert_path = conf.get('cert', os.path.join(LETSENCRYPT_DIR, "live", name, "cert.pem"))
+                    cached = None
+                cert_mtime = os.stat(cert_path).st_mtime
+            except OSError:
+                continue
             
-            self._print_info("Somente certificados baseados em domínio estão disponíveis.")
-            self._print_info("Para configurar um certificado SSL, você precisará de:")
-            self._print_info("1. Um domínio apontando para o IP deste servidor")
-            self._print_info("2. As portas 80 e 443 abertas no firewall")
+            seen.add(name)
+            if cached and cached.get('cert_mtime') == cert_mtime:
+                index.append(cached)
+                continue
             
-            self._print_info("Para continuar, forneça as seguintes informações:")
+            if cached is None:
+                cached = {
+                    'name': name,
+                    'cert': cert_path,
+                    'fullchain': conf.get('fullchain', os.path.join(os.path.dirname(cert_path), "fullchain.pem")),
+                    'privkey': conf.get('privkey', os.path.join(os.path.dirname(cert_path), "privkey.pem")),
+                    'authenticator': conf.get('authenticator', ''),
+                }
+            try:
+                cached.update(parse_certificate_file(cert_path))
+            except (OSError, ValueError, IndexError):
+                continue
+            cached['conf_mtime'] = conf_mtime
+            cached['cert_mtime'] = cert_mtime
+            cache[name] = cached
+            index.append(cached)
+            changed = True
+        
+        for name in list(cache):
+            if name not in seen:
+                del cache[name]
+                changed = True
+        
+        if changed:
+            self._save_certificate_index_cache(cache)
+        return index
+
+    def _show_certificate_index(self, index):
+        now = time.time()
+        rows = []
+        for cert in index:
+            days = int((cert['not_after'] - now) // 86400)
+            expiry = datetime.fromtimestamp(cert['not_after']).strftime('%Y-%m-%d')
+            rows.append((cert['name'], " ".join(cert['domains']), f"{expiry} ({days} dias)", cert['key_type']))
+        self.reporter.table("Certificados SSL Encontrados", ["Certificado", "Domínios", "Expira em", "Chave"], rows)
+
+    def _web_service_name(self, web_server):
+        if web_server == "apache":
+            return "apache2" if os.path.exists("/etc/apache2") else "httpd"
+        return "nginx"
+
+    def _certbot_server_args(self):
+        args = ""
+        if self.acme_server:
+            args += f" --server {self.acme_server}"
+            if os.environ.get("DOCESETUP_ACME_INSECURE"):
+                args += " --no-verify-ssl"
+        return args
+
+    def _issue_certificate(self, domains, email, web_server, reload=True):
+        service = self._web_service_name(web_server)
+        self._execute_command(f"systemctl stop {service}")
+        
+        domains_str = " ".join([f"-d {d}" for d in domains])
+        primary_domain = domains[0]
+        command = (f"certbot certonly --standalone --cert-name {primary_domain} {domains_str} --email {email} "
+                   f"--agree-tos --non-interactive{self._certbot_server_args()}")
+        
+        result = None
+        with self._progress(f"Obtendo certificado para {len(domains)} domínio(s)..."):
+            result = self._execute_command(command, silent=False, check_output=True)
+        
+        if result is None or result.returncode != 0 or not os.path.exists(f"/etc/letsencrypt/live/{primary_domain}/fullchain.pem"):
+            error_output = result.stderr if result is not None else "Erro desconhecido."
+            error_info = self._parse_certbot_error(error_output)
+            
+            self._print_error(f"{error_info['message']}")
+            self._print_info(f"Solução: {error_info['solution']}")
+            
+            if reload:
+                self._execute_command(f"systemctl start {service}")
+            return False
+        
+        self._record_issuance(domains)
+        self._cert_index_cache = None
+        for domain in domains if not reload else [primary_domain]:
+            if web_server == "apache":
+                self._update_apache_site(domain, 
+                                        f"/etc/letsencrypt/live/{primary_domain}/fullchain.pem", 
+                                        f"/etc/letsencrypt/live/{primary_domain}/privkey.pem",
+                                        reload=reload)
+            else:  
+                self._update_nginx_site(domain, 
+                                      f"/etc/letsencrypt/live/{primary_domain}/fullchain.pem", 
+                                      f"/etc/letsencrypt/live/{primary_domain}/privkey.pem",
+                                      reload=reload)
+        return True
+
+    def _read_domain_file(self, path):
+        domains = []
+        invalid = []
+        with open(path, 'r') as f:
+            for line in f:
+                for domain in line.split('#', 1)[0].replace(',', ' ').split():
+                    domain = domain.strip().lower().rstrip('.')
+                    if not DOMAIN_PATTERN.match(domain):
+                        invalid.append(domain)
+                    elif domain not in domains:
+                        domains.append(domain)
+        return domains, invalid
+
+    def _get_host_addresses(self):
+        import ipaddress
+        addresses = set()
+        output = self._get_command_output("ip -o addr show")
+        for address in re.findall(r'inet6?\s+([0-9a-fA-F:.]+)/', output):
+            ip = ipaddress.ip_address(address)
+            if not (ip.is_loopback or ip.is_link_local):
+                addresses.add(str(ip))
+        for address in os.environ.get("DOCESETUP_PUBLIC_IPS", "").replace(',', ' ').split():
+            addresses.add(str(ipaddress.ip_address(address)))
+        return addresses
+
+    async def _system_resolver(self, name):
+        import asyncio
+        loop = asyncio.get_running_loop()
+        infos = await loop.getaddrinfo(name, None, type=socket.SOCK_STREAM)
+        return sorted({info[4][0] for info in infos})
+
+    async def _resolve_all(self, domains, resolver, concurrency, timeout):
+        import asyncio
+        semaphore = asyncio.Semaphore(concurrency)
+        
+        async def resolve(domain):
+            async with semaphore:
+                try:
+                    addresses = await asyncio.wait_for(resolver(domain), timeout)
+                    return domain, addresses, None
+                except asyncio.TimeoutError:
+                    return domain, [], "tempo limite excedido"
+                except (OSError, socket.gaierror) as e:
+                    return domain, [], str(e)
+        
+        return await asyncio.gather(*(resolve(domain) for domain in domains))
+
+    def _preflight_domains(self, domains, resolver=None, concurrency=64, timeout=5):
+        import asyncio
+        resolver = resolver or self._system_resolver
+        host_addresses = self._get_host_addresses()
+        results = asyncio.run(self._resolve_all(domains, resolver, concurrency, timeout))
+        
+        valid, mismatched, failed = [], [], []
+        for domain, addresses, error in results:
+            if error or not addresses:
+                failed.append((domain, error or "sem registros A/AAAA"))
+            elif host_addresses.intersection(addresses):
+                valid.append(domain)
+            else:
+                mismatched.append((domain, addresses))
+        return valid, mismatched, failed
+
+    def _registered_domain(self, domain):
+        return _load_public_suffix_lookup()(domain) or domain
+
+    def _group_san_certificates(self, domains, max_names=MAX_SAN_NAMES):
+        by_registered = {}
+        for domain in domains:
+            by_registered.setdefault(self._registered_domain(domain), []).append(domain)
+        
+        groups = []
+        current = []
+        for registered in sorted(by_registered, key=lambda r: -len(by_registered[r])):
+            names = sorted(by_registered[registered], key=lambda d: (d.count('.'), d))
+            while len(names) > max_names:
+                groups.append(names[:max_names])
+                names = names[max_names:]
+            if len(current) + len(names) > max_names:
+                groups.append(current)
+                current = []
+            current.extend(names)
+        if current:
+            groups.append(current)
+        return groups
+
+    def _load_state_list(self, path):
+        if not os.path.exists(path):
+            return []
+        try:
+            with open(path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return []
+
+    def _save_state_list(self, path, entries):
+        try:
+            os.makedirs(STATE_DIR, exist_ok=True)
+            with open(f"{path}.tmp", 'w') as f:
+                json.dump(entries, f)
+            os.replace(f"{path}.tmp", path)
+        except OSError:
+            pass
+
+    def _load_issuance_history(self):
+        return self._load_state_list(ISSUANCE_FILE)
+
+    def _record_issuance(self, domains):
+        week_ago = time.time() - 7 * 86400
+        history = [entry for entry in self._load_issuance_history() if entry['time'] > week_ago]
+        history.append({
+            'time': time.time(),
+            'server': self.acme_server,
+            'registered': sorted({self._registered_domain(d) for d in domains}),
+        })
+        self._save_state_list(ISSUANCE_FILE, history)
+
+    def _defer_certificates(self, deferred, email, web_server):
+        pending = self._load_state_list(DEFERRED_CERTS_FILE)
+        queued = {tuple(entry['domains']) for entry in pending}
+        for group, wait in deferred:
+            if tuple(group) not in queued:
+                pending.append({'domains': group, 'email': email, 'web_server': web_server,
+                                'server': self.acme_server, 'not_before': time.time() + wait})
+        self._save_state_list(DEFERRED_CERTS_FILE, pending)
+
+    def issue_deferred_certificates(self):
+        pending = self._load_state_list(DEFERRED_CERTS_FILE)
+        if not pending:
+            return 0
+        
+        remaining, issued, failed, attempted = [], 0, 0, set()
+        for entry in pending:
+            if entry.get('server') != self.acme_server:
+                remaining.append(entry)
+                continue
+            wait = max(entry['not_before'] - time.time(), self._rate_limit_wait(entry['domains'], self._load_issuance_history()))
+            if wait > 0:
+                entry['not_before'] = time.time() + wait
+                remaining.append(entry)
+            else:
+                attempted.add(entry['web_server'])
+                if self._issue_certificate(entry['domains'], entry['email'], entry['web_server'], reload=False):
+                    issued += 1
+                else:
+                    failed += 1
+                    remaining.append(entry)
+        self._save_state_list(DEFERRED_CERTS_FILE, remaining)
+        
+        if not all([self._start_web_server_after_batch(web_server) for web_server in sorted(attempted)]):
+            if issued:
+                self._print_error(f"{issued} certificado(s) adiado(s) foram emitidos, mas os sites não foram ativados.")
+            failed += 1
+        elif issued:
+            self._print_success(f"{issued} certificado(s) adiado(s) por limite de taxa emitido(s).")
+        if remaining:
+            self._print_info(f"{len(remaining)} certificado(s) continuam aguardando o limite de taxa da CA.")
+        return 1 if failed else 0
+
+    def _rate_limit_wait(self, domains, history, now=None):
+        now = now or time.time()
+        history = [entry for entry in history if entry.get('server', '') == self.acme_server]
+        wait = 0
+        
+        recent_orders = sorted(entry['time'] for entry in history if entry['time'] > now - 3 * 3600)
+        if len(recent_orders) >= ORDERS_PER_THREE_HOURS:
+            wait = recent_orders[len(recent_orders) - ORDERS_PER_THREE_HOURS] + 3 * 3600 - now
+        
+        for registered in {self._registered_domain(d) for d in domains}:
+            issued = sorted(entry['time'] for entry in history
+                            if registered in entry['registered'] and entry['time'] > now - 7 * 86400)
+            if len(issued) >= CERTS_PER_DOMAIN_PER_WEEK:
+                wait = max(wait, issued[len(issued) - CERTS_PER_DOMAIN_PER_WEEK] + 7 * 86400 - now)
+        return wait
+
+    def onboard_domains_from_file(self, path, email, web_server, resolver=None):
+        try:
+            domains, invalid = self._read_domain_file(path)
+        except OSError as e:
+            self._print_error(f"Não foi possível ler o arquivo de domínios: {str(e)}")
+            return False
+        
+        for domain in invalid:
+            self._print_warning(f"Domínio inválido ignorado: {domain}")
+        
+        if not domains:
+            self._print_error("Nenhum domínio válido encontrado no arquivo.")
+            return False
+        
+        with self._progress(f"Verificando DNS de {len(domains)} domínio(s)..."):
+            valid, mismatched, failed = self._preflight_domains(domains, resolver)
+        
+        for domain, error in failed:
+            self._print_error(f"{domain}: não resolve ({error})")
+        for domain, addresses in mismatched:
+            self._print_warning(f"{domain}: aponta para {', '.join(addresses)}, não para este servidor")
+        self._print_info(f"{len(valid)} domínio(s) apontam para este servidor.")
+        
+        if mismatched and self._ask("Deseja incluir mesmo assim os domínios que apontam para outros endereços (ex.: servidor atrás de NAT)?"):
+            valid.extend(domain for domain, _ in mismatched)
+        
+        if not valid:
+            self._print_error("Nenhum domínio passou na verificação de DNS. Nenhum certificado foi solicitado.")
+            return False
+        
+        groups = self._group_san_certificates(valid)
+        self._print_info(f"Os domínios serão agrupados em {len(groups)} certificado(s) com até {MAX_SAN_NAMES} nomes cada.")
+        
+        issued, deferred, errors = [], [], []
+        for group in groups:
+            wait = self._rate_limit_wait(group, self._load_issuance_history())
+            if wait > 0:
+                deferred.append((group, wait))
+                continue
+            if self._issue_certificate(group, email, web_server, reload=False):
+                issued.append(group)
+            else:
+                errors.append(group)
+        
+        if deferred:
+            self._defer_certificates(deferred, email, web_server)
+        if issued or deferred:
+            self._install_renewal_scheduler()
+        
+        started = not (issued or errors) or self._start_web_server_after_batch(web_server)
+        if issued and not started:
+            self._print_error(f"{len(issued)} certificado(s) foram emitidos, mas os sites não foram ativados.")
+        elif issued:
+            self._print_success(f"{len(issued)} certificado(s) emitido(s) cobrindo {sum(len(g) for g in issued)} domínio(s).")
+        for group in errors:
+            self._print_error(f"Falha ao emitir o certificado para {group[0]} e mais {len(group) - 1} domínio(s).")
+        for group, wait in deferred:
+            available = datetime.fromtimestamp(time.time() + wait).strftime('%Y-%m-%d %H:%M')
+            self._print_warning(f"Certificado para {group[0]} (+{len(group) - 1}) adiado por limite de taxa da CA; "
+                                f"será emitido pela renovação agendada a partir de {available}.")
+        
+        return started and not errors
+
+    def _ensure_local_ca(self):
+        ca_key = os.path.join(LOCAL_CA_DIR, "ca.key")
+        ca_cert = os.path.join(LOCAL_CA_DIR, "ca.crt")
+        
+        if os.path.exists(ca_key) and os.path.exists(ca_cert):
+            return ca_key, ca_cert
+        
+        os.makedirs(LOCAL_CA_DIR, mode=0o700, exist_ok=True)
+        result = self._execute_command(
+            f"openssl req -x509 -new -newkey ec -pkeyopt ec_paramgen_curve:prime256v1 -nodes "
+            f"-keyout {ca_key} -out {ca_cert} -days 3650 -subj '/CN=Doce Setup Local CA/O={platform.node()}' "
+            f"-addext 'basicConstraints=critical,CA:TRUE' -addext 'keyUsage=critical,keyCertSign,cRLSign'")
+        if result != 0:
+            return None
+        os.chmod(ca_key, 0o600)
+        
+        if os.path.isdir("/usr/local/share/ca-certificates"):
+            shutil.copy2(ca_cert, "/usr/local/share/ca-certificates/docesetup-ca.crt")
+            self._execute_command("update-ca-certificates")
+        elif os.path.isdir("/etc/pki/ca-trust/source/anchors"):
+            shutil.copy2(ca_cert, "/etc/pki/ca-trust/source/anchors/docesetup-ca.crt")
+            self._execute_command("update-ca-trust")
+        return ca_key, ca_cert
+
+    def _self_signed_is_current(self, cert_path, hostname, ca):
+        if not os.path.exists(cert_path):
+            return False
+        try:
+            info = parse_certificate_file(cert_path)
+        except (OSError, ValueError, IndexError):
+            return False
+        return (sorted(info['domains']) == [hostname]
+                and info['key_type'] == "ecdsa-p256"
+                and info['self_signed'] == (ca is None)
+                and info['not_after'] - time.time() > RENEWAL_WINDOW_DAYS * 86400)
+
+    def _generate_leaf_certificate(self, hostname, ca=None):
+        import secrets
+        cert_dir = os.path.join(SELF_SIGNED_DIR, hostname)
+        key_path = os.path.join(cert_dir, "privkey.pem")
+        cert_path = os.path.join(cert_dir, "cert.pem")
+        fullchain_path = os.path.join(cert_dir, "fullchain.pem")
+        
+        if self._self_signed_is_current(cert_path, hostname, ca):
+            return hostname, "atual"
+        
+        os.makedirs(cert_dir, mode=0o755, exist_ok=True)
+        san = f"IP:{hostname}" if re.match(r'^[0-9.]+$', hostname) else f"DNS:{hostname}"
+        extensions = [
+            f"subjectAltName={san}",
+            "basicConstraints=critical,CA:FALSE",
+            "keyUsage=critical,digitalSignature",
+            "extendedKeyUsage=serverAuth",
+        ]
+        
+        if self._execute_command(f"openssl genpkey -algorithm EC -pkeyopt ec_paramgen_curve:P-256 -out {shlex.quote(key_path)}") != 0:
+            return hostname, "erro"
+        os.chmod(key_path, 0o600)
+        
+        subject = shlex.quote(f"/CN={hostname}")
+        if ca is None:
+            addext = " ".join(f"-addext {shlex.quote(ext)}" for ext in extensions)
+            result = self._execute_command(
+                f"openssl req -x509 -new -key {shlex.quote(key_path)} -out {shlex.quote(cert_path)} "
+                f"-days {SELF_SIGNED_DAYS} -subj {subject} {addext}")
+            chain = ""
+        else:
+            ca_key, ca_cert = ca
+            with tempfile.TemporaryDirectory() as tmp:
+                csr_path = os.path.join(tmp, "leaf.csr")
+                ext_path = os.path.join(tmp, "leaf.ext")
+                with open(ext_path, 'w') as f:
+                    f.write("\n".join(extensions) + "\n")
+                result = self._execute_command(
+                    f"openssl req -new -key {shlex.quote(key_path)} -out {csr_path} -subj {subject}")
+                if result == 0:
+                    result = self._execute_command(
+                        f"openssl x509 -req -in {csr_path} -CA {ca_cert} -CAkey {ca_key} "
+                        f"-set_serial {secrets.randbits(127)} -days {SELF_SIGNED_DAYS} -sha256 "
+                        f"-extfile {ext_path} -out {shlex.quote(cert_path)}")
+            with open(ca_cert, 'r') as f:
+                chain = f.read()
+        
+        if result != 0:
+            return hostname, "erro"
+        
+        with open(cert_path, 'r') as f:
+            leaf = f.read()
+        with open(fullchain_path, 'w') as f:
+            f.write(leaf + chain)
+        return hostname, "gerado"
+
+    def generate_self_signed_certificates(self, hostnames, use_ca=False, workers=None):
+        ca = None
+        if use_ca:
+            ca = self._ensure_local_ca()
+            if ca is None:
+                self._print_error("Não foi possível criar a autoridade certificadora local.")
+                return {}
+        
+        from concurrent.futures import ThreadPoolExecutor
+        workers = workers or min(len(hostnames), (os.cpu_count() or 1) * 2)
+        results = {}
+        with self._progress(f"Gerando {len(hostnames)} certificado(s)...", total=len(hostnames)) as progress:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                for hostname, status in executor.map(lambda h: self._generate_leaf_certificate(h, ca), hostnames):
+                    results[hostname] = status
+                    progress.update(advance=1)
+        return results
+
+    def configure_self_signed_certificates(self, web_server, hostnames=None, use_ca=None):
+        if hostnames is None:
+            self._print_info("Informe os nomes separados por espaço ou vírgula, ou o caminho de um arquivo com um nome por linha.")
+            answer = input("Nomes de host para os certificados: ").strip()
+            if os.path.isfile(answer):
+                with open(answer, 'r') as f:
+                    answer = " ".join(line.split('#', 1)[0] for line in f)
+            hostnames = []
+            for hostname in answer.replace(',', ' ').lower().split():
+                if not HOSTNAME_PATTERN.match(hostname):
+                    self._print_warning(f"Nome de host inválido ignorado: {hostname}")
+                elif hostname not in hostnames:
+                    hostnames.append(hostname)
+        
+        if not hostnames:
+            self._print_error("Nenhum nome de host foi especificado. A configuração SSL foi cancelada.")
+            return False
+        
+        if use_ca is None:
+            use_ca = self._ask("Deseja assinar os certificados com uma autoridade certificadora local (criada uma única vez)?")
+        
+        results = self.generate_self_signed_certificates(hostnames, use_ca)
+        ready = [hostname for hostname, status in results.items() if status != "erro"]
+        
+        for hostname in ready:
+            fullchain = os.path.join(SELF_SIGNED_DIR, hostname, "fullchain.pem")
+            privkey = os.path.join(SELF_SIGNED_DIR, hostname, "privkey.pem")
+            if web_server == "apache":
+                self._update_apache_site(hostname, fullchain, privkey, reload=False)
+            else:
+                self._update_nginx_site(hostname, fullchain, privkey, reload=False)
+        
+        if ready:
+            if not self._web_config_ok(web_server):
+                return False
+            self._reload_web_server(web_server)
+        
+        generated = sum(1 for status in results.values() if status == "gerado")
+        current = sum(1 for status in results.values() if status == "atual")
+        self._print_success(f"{generated} certificado(s) gerado(s), {current} já válido(s) e reaproveitado(s).")
+        for hostname, status in results.items():
+            if status == "erro":
+                self._print_error(f"Falha ao gerar o certificado para {hostname}.")
+        self._print_info(f"Certificados armazenados em: {SELF_SIGNED_DIR}/")
+        if use_ca:
+            self._print_info(f"Distribua a CA local para os clientes: {os.path.join(LOCAL_CA_DIR, 'ca.crt')}")
+        return len(ready) == len(hostnames)
+
+    def _install_web_server(self, web_server):
+        self._print_info(f"Instalando servidor web {web_server}...")
+        if self.install_packages(self._package_set(web_server), web_server) != 0:
+            self._print_error(f"Não foi possível instalar o servidor web {web_server}.")
+            return False
+        
+        if web_server == "apache":
+            if self.distro in ['ubuntu', 'debian']:
+                self._execute_command("systemctl enable apache2 && systemctl start apache2")
+            else:
+                self._execute_command("systemctl enable httpd && systemctl start httpd")
+        else:  
+            self._execute_command("systemctl enable nginx && systemctl start nginx")
+        return True
+
+    def _ensure_certbot(self, web_server):
+        if shutil.which('certbot'):
+            return True
+        self._print_info("Instalando Certbot...")
+        if self.install_packages(self._package_set(f"certbot-{web_server}"), "Certbot") != 0:
+            self._print_error("Não foi possível instalar o Certbot.")
+            return False
+        return True
+
+    def _certificate_covers(self, domains, window_days=RENEWAL_WINDOW_DAYS):
+        deadline = time.time() + window_days * 86400
+        covered = set()
+        for cert in self.get_certificate_index():
+            if cert['not_after'] > deadline:
+                covered.update(cert['domains'])
+        return all(domain in covered for domain in domains)
+
+    def apply_certificate(self, domains, email=None, web_server=None, self_signed=False):
+        web_server = web_server or self._detect_web_server()
+        if not domains:
+            return self.apply_ssl()
+        
+        if not self._detect_web_server():
+            web_server = web_server or "nginx"
+            if not self._install_web_server(web_server):
+                return None
+        
+        if self_signed:
+            if all(self._self_signed_is_current(os.path.join(SELF_SIGNED_DIR, domain, "fullchain.pem"), domain, None)
+                   for domain in domains):
+                return False
+            return True if self.configure_self_signed_certificates(web_server, domains, use_ca=False) else None
+        
+        if self._certificate_covers(domains):
+            return False
+        if not email or not self._ensure_certbot(web_server):
+            return None
+        if not self._issue_certificate(domains, email, web_server):
+            return None
+        self._install_renewal_scheduler()
+        return True
+
+    def configure_ssl_certificate(self):
+        self._print_header("Configuração de Certificado SSL")
+        
+        if self._ask("🔐 Deseja configurar um certificado SSL gratuito?"):
+            web_server = self._detect_web_server()
+            
+            if not web_server:
+                self._print_info("Nenhum servidor web detectado. É necessário um servidor web para configurar SSL.")
+                server_options = ["apache", "nginx", "nenhum"]
+                selected_server = self._select_option("Qual servidor web você deseja instalar?", server_options)
+                
+                if selected_server == "nenhum":
+                    self._print_info("Configuração SSL cancelada. É necessário um servidor web para continuar.")
+                    return
+                
+                if not self._install_web_server(selected_server):
+                    return
+                
+                web_server = selected_server
+                self._print_success(f"Servidor web {selected_server} instalado e iniciado com sucesso!")
+
+            cert_types = ["letsencrypt", "autoassinado"]
+            cert_type = self._select_option("Qual tipo de certificado deseja configurar?", cert_types)
+            if cert_type == "autoassinado":
+                self.configure_self_signed_certificates(web_server)
+                return
+            
+            if not self._ensure_certbot(web_server):
+                return
+            
+            self._print_info("Para configurar um certificado SSL, você precisará de:")
+            self._print_info("1. Um domínio apontando para o IP deste servidor")
+            self._print_info("2. As portas 80 e 443 abertas no firewall")
+            
+            self._print_info("Para continuar, forneça as seguintes informações:")
             
             email = input("Digite seu email para notificações de segurança e renovação: ")
             
+            if self._ask("Deseja importar uma lista de domínios de um arquivo (modo em massa)?"):
+                domain_file = input("Caminho do arquivo com os domínios (um por linha): ").strip()
+                self.onboard_domains_from_file(domain_file, email, web_server)
+                return
+            
             self._print_info("\nVocê deverá adicionar domínios um por vez.")
             self._print_info("Por exemplo: seudominio.com, depois www.seudominio.com, depois app.seudominio.com")
             self._print_info("Todos estes domínios devem apontar para o IP deste servidor.")
@@ -995,145 +3440,217 @@ server {{
             
             self._print_info(f"Configurando certificado SSL para: {', '.join(domains)}...")
             
-            if web_server == "apache":
-                if self.distro in ['ubuntu', 'debian']:
-                    self._execute_command("systemctl stop apache2")
-                else:
-                    self._execute_command("systemctl stop httpd")
-            else:  
-                self._execute_command("systemctl stop nginx")
-            
-            domains_str = " ".join([f"-d {d}" for d in domains])
-            primary_domain = domains[0]
-            
-            result = None
-            if RICH_AVAILABLE:
-                with Progress(SpinnerColumn(), TextColumn(f"[bold blue]Obtendo certificado para {len(domains)} domínio(s)...")) as progress:
-                    task = progress.add_task("obtendo", total=None)
-                    result = self._execute_command(f"certbot certonly --standalone {domains_str} --email {email} --agree-tos --non-interactive", silent=False, check_output=True)
-            else:
-                print(f"Obtendo certificado para {len(domains)} domínio(s)...")
-                result = self._execute_command(f"certbot certonly --standalone {domains_str} --email {email} --agree-tos --non-interactive", silent=False, check_output=True)
-            
-            if result and not os.path.exists(f"/etc/letsencrypt/live/{primary_domain}/fullchain.pem"):
-                error_output = result.stderr if hasattr(result, 'stderr') else "Erro desconhecido."
-                error_info = self._parse_certbot_error(error_output)
-                
-                self._print_error(f"{error_info['message']}")
-                self._print_info(f"Solução: {error_info['solution']}")
-                
-                if web_server == "apache":
-                    if self.distro in ['ubuntu', 'debian']:
-                        self._execute_command("systemctl start apache2")
-                    else:
-                        self._execute_command("systemctl start httpd")
-                else:  
-                    self._execute_command("systemctl start nginx")
-                    
+            if not self._issue_certificate(domains, email, web_server):
                 return
             
-            if web_server == "apache":
-                self._update_apache_site(primary_domain, 
-                                        f"/etc/letsencrypt/live/{primary_domain}/fullchain.pem", 
-                                        f"/etc/letsencrypt/live/{primary_domain}/privkey.pem")
-            else:  
-                self._update_nginx_site(primary_domain, 
-                                      f"/etc/letsencrypt/live/{primary_domain}/fullchain.pem", 
-                                      f"/etc/letsencrypt/live/{primary_domain}/privkey.pem")
-            
-            cron_job = "0 3 * * * root certbot renew --quiet"
-            with open('/etc/cron.d/certbot', 'w') as f:
-                f.write(f"SHELL=/bin/sh\n")
-                f.write(f"PATH=/usr/local/sbin:/usr/local/bin:/sbin:/bin:/usr/sbin:/usr/bin\n")
-                f.write(f"{cron_job}\n")
+            primary_domain = domains[0]
+            self._install_renewal_scheduler()
             
             self._print_success(f"Certificado SSL para {len(domains)} domínio(s) instalado e configurado com sucesso!")
             self._print_info(f"Seu site está disponível em: https://{primary_domain}")
             self._print_info(f"Certificados armazenados em: /etc/letsencrypt/live/{primary_domain}/")
-            self._print_info("A renovação automática foi configurada para ocorrer diariamente às 3h da manhã.")
-            
-            if RICH_AVAILABLE:
-                cert_info = Table(title="Informações do Certificado SSL")
-                cert_info.add_column("Arquivo", style="cyan")
-                cert_info.add_column("Caminho", style="green")
-                cert_info.add_row("Certificado", f"/etc/letsencrypt/live/{primary_domain}/fullchain.pem")
-                cert_info.add_row("Chave Privada", f"/etc/letsencrypt/live/{primary_domain}/privkey.pem")
-                cert_info.add_row("Cadeia", f"/etc/letsencrypt/live/{primary_domain}/chain.pem")
-                self.console.print(cert_info)
-            else:
-                print("\nInformações do Certificado SSL:")
-                print(f"Certificado: /etc/letsencrypt/live/{primary_domain}/fullchain.pem")
-                print(f"Chave Privada: /etc/letsencrypt/live/{primary_domain}/privkey.pem")
-                print(f"Cadeia: /etc/letsencrypt/live/{primary_domain}/chain.pem")
+            self._print_info("A renovação automática foi configurada com horário aleatório por servidor e recarga do servidor web após renovar.")
+            
+            self.reporter.table("Informações do Certificado SSL", ["Arquivo", "Caminho"], [
+                ("Certificado", f"/etc/letsencrypt/live/{primary_domain}/fullchain.pem"),
+                ("Chave Privada", f"/etc/letsencrypt/live/{primary_domain}/privkey.pem"),
+                ("Cadeia", f"/etc/letsencrypt/live/{primary_domain}/chain.pem"),
+            ])
             
             if self._ask("Deseja adicionar outro certificado para diferentes domínios?"):
                 self.configure_ssl_certificate()
         else:
             self._print_info("Configuração do certificado SSL ignorada.")
 
+    def _install_script_copy(self):
+        target = os.path.join(INSTALL_DIR, "docesetup.py")
+        source = os.path.abspath(__file__)
+        os.makedirs(self._path(INSTALL_DIR), exist_ok=True)
+        if source != self._path(target):
+            import py_compile
+            shutil.copy2(source, self._path(target))
+            os.chmod(self._path(target), 0o755)
+            py_compile.compile(self._path(target), dfile=target)
+        
+        launcher = self._path(LAUNCHER_FILE)
+        os.makedirs(os.path.dirname(launcher), exist_ok=True)
+        with open(f"{launcher}.tmp", 'w') as f:
+            f.write(f"#!{'/usr/bin/python3' if self.fs_root else sys.executable} -sE\n")
+            f.write(f"import sys\nsys.path.insert(0, {INSTALL_DIR!r})\nfrom docesetup import main\nmain()\n")
+        os.chmod(f"{launcher}.tmp", 0o755)
+        os.replace(f"{launcher}.tmp", launcher)
+        return target
+
+    def _install_renewal_scheduler(self):
+        self._install_script_copy()
+        renew_command = f"{sys.executable} -m docesetup renew-certs"
+        
+        if shutil.which('systemctl') and os.path.isdir("/run/systemd/system"):
+            with open(os.path.join(SYSTEMD_DIR, "docesetup-renew.service"), 'w') as f:
+                f.write("[Unit]\n")
+                f.write("Description=Doce Setup - renovação de certificados SSL\n")
+                f.write("Wants=network-online.target\n")
+                f.write("After=network-online.target\n\n")
+                f.write("[Service]\n")
+                f.write("Type=oneshot\n")
+                f.write(f"WorkingDirectory={INSTALL_DIR}\n")
+                f.write(f"ExecStart={renew_command}\n")
+            
+            with open(os.path.join(SYSTEMD_DIR, "docesetup-renew.timer"), 'w') as f:
+                f.write("[Unit]\n")
+                f.write("Description=Doce Setup - agendamento da renovação de certificados SSL\n\n")
+                f.write("[Timer]\n")
+                f.write("OnCalendar=*-*-* 00,12:00:00\n")
+                f.write("RandomizedDelaySec=12h\n")
+                f.write("Persistent=true\n\n")
+                f.write("[Install]\n")
+                f.write("WantedBy=timers.target\n")
+            
+            self._execute_command("systemctl daemon-reload")
+            self._execute_command("systemctl disable --now certbot.timer")
+            self._execute_command("systemctl enable --now docesetup-renew.timer")
+            
+            if os.path.exists('/etc/cron.d/certbot'):
+                with open('/etc/cron.d/certbot', 'r') as f:
+                    if 'certbot renew --quiet' in f.read():
+                        os.remove('/etc/cron.d/certbot')
+        else:
+            seed = int(hashlib.sha256(platform.node().encode()).hexdigest(), 16)
+            minute, hour = seed % 60, seed // 60 % 12
+            with open('/etc/cron.d/certbot', 'w') as f:
+                f.write("SHELL=/bin/sh\n")
+                f.write("PATH=/usr/local/sbin:/usr/local/bin:/sbin:/bin:/usr/sbin:/usr/bin\n")
+                f.write(f"{minute} {hour},{hour + 12} * * * root cd {INSTALL_DIR} && {renew_command}\n")
+
+    def _web_config_ok(self, web_server):
+        if web_server == "apache":
+            command, name = "apachectl configtest", "Apache"
+        else:
+            command, name = "nginx -t", "Nginx"
+        if self._execute_command(command) == 0:
+            return True
+        self._print_error(f"Erro na configuração do {name}. Verifique a sintaxe.")
+        return False
+
+    def _start_web_server_after_batch(self, web_server):
+        if not self._web_config_ok(web_server):
+            self._print_error(f"O servidor web {web_server} continua parado. Corrija a configuração e inicie-o manualmente.")
+            return False
+        if self._reload_web_server(web_server) != 0:
+            self._print_error(f"Não foi possível iniciar o servidor web {web_server}.")
+            return False
+        return True
+
+    def _reload_web_server(self, web_server):
+        if not web_server:
+            return 0
+        service = self._web_service_name(web_server)
+        return self._execute_command(f"systemctl reload {service} || systemctl restart {service}")
+
+    def renew_due_certificates(self, window_days=RENEWAL_WINDOW_DAYS):
+        deferred_status = self.issue_deferred_certificates()
+        deadline = time.time() + window_days * 86400
+        due = [cert for cert in self.get_certificate_index() if cert['not_after'] <= deadline]
+        
+        if not due:
+            return deferred_status
+        
+        self._print_info(f"Certificados dentro da janela de renovação: {', '.join(cert['name'] for cert in due)}")
+        web_server = self._detect_web_server()
+        command = f"certbot renew --quiet --deploy-hook 'touch {RENEWAL_MARKER}'{self._certbot_server_args()}"
+        
+        if web_server and any(cert.get('authenticator') == 'standalone' for cert in due):
+            service = self._web_service_name(web_server)
+            command += f" --pre-hook 'systemctl stop {service}' --post-hook 'systemctl start {service}'"
+        
+        returncode = self._execute_command(command)
+        
+        if os.path.exists(RENEWAL_MARKER):
+            os.remove(RENEWAL_MARKER)
+            self._cert_index_cache = None
+            if self._reload_web_server(web_server) != 0:
+                self._print_error(f"Não foi possível recarregar o servidor web {web_server}.")
+                return 1
+            self._print_success("Certificados renovados e servidor web recarregado.")
+        
+        return 0 if returncode == 0 and deferred_status == 0 else 1
+
+    def _renewal_scheduler_installed(self):
+        if os.path.lexists(os.path.join(SYSTEMD_DIR, "timers.target.wants", "docesetup-renew.timer")):
+            return True
+        try:
+            with open('/etc/cron.d/certbot', 'r') as f:
+                return "renew-certs" in f.read()
+        except OSError:
+            return False
+
+    def check_ssl(self, window_days=RENEWAL_WINDOW_DAYS):
+        if self.root:
+            return []
+        index = self.get_certificate_index()
+        now = time.time()
+        drift = []
+        for cert in index:
+            days = int((cert['not_after'] - now) // 86400)
+            if days <= window_days:
+                drift.append(f"certificado {cert['name']} expira em {days} dias")
+        if index and not self._renewal_scheduler_installed():
+            drift.append("renovação automática não agendada")
+        return drift
+
+    def apply_ssl(self, window_days=RENEWAL_WINDOW_DAYS):
+        if not self.check_ssl(window_days):
+            return False
+        if not self._renewal_scheduler_installed():
+            self._install_renewal_scheduler()
+        if self.renew_due_certificates(window_days) != 0:
+            return None
+        return True
+
     def remove_ssl_certificates(self):
         self._print_header("Remoção de Certificados SSL")
         
-        cert_list = self._get_command_output("certbot certificates")
+        index = self.get_certificate_index()
         
-        if "No certificates found" in cert_list or not cert_list:
+        if not index:
             self._print_info("Nenhum certificado SSL encontrado para remover.")
             return
         
         self._print_info("Certificados SSL encontrados:")
-        print(cert_list)
-        
-        domains = []
-        for line in cert_list.splitlines():
-            if "Domains:" in line:
-                domains_str = line.split("Domains:")[1].strip()
-                domains.extend(domains_str.split())
+        self._show_certificate_index(index)
         
-        if not domains:
-            self._print_info("Não foi possível identificar os domínios dos certificados.")
-            return
+        certs_by_name = {cert['name']: cert for cert in index}
+        selected = []
         
-        if len(domains) > 1:
+        if len(index) > 1:
             remove_all = self._ask("Deseja remover todos os certificados SSL?")
             
             if remove_all:
-                if RICH_AVAILABLE:
-                    with Progress(SpinnerColumn(), TextColumn("[bold blue]Removendo todos os certificados...")) as progress:
-                        task = progress.add_task("removendo", total=None)
-                        self._execute_command("certbot delete --non-interactive", silent=False)
-                else:
-                    print("Removendo todos os certificados...")
-                    self._execute_command("certbot delete --non-interactive", silent=False)
-                
-                self._print_success("Todos os certificados SSL foram removidos com sucesso!")
+                selected = list(certs_by_name)
             else:
-                self._print_info("Escolha um domínio para remover o certificado:")
-                domain = self._select_option("Selecione o domínio:", domains)
-                
-                if RICH_AVAILABLE:
-                    with Progress(SpinnerColumn(), TextColumn(f"[bold blue]Removendo certificado para {domain}...")) as progress:
-                        task = progress.add_task("removendo", total=None)
-                        self._execute_command(f"certbot delete --cert-name {domain} --non-interactive", silent=False)
-                else:
-                    print(f"Removendo certificado para {domain}...")
-                    self._execute_command(f"certbot delete --cert-name {domain} --non-interactive", silent=False)
-                
-                self._print_success(f"Certificado SSL para {domain} removido com sucesso!")
+                self._print_info("Escolha um certificado para remover:")
+                selected = [self._select_option("Selecione o certificado:", list(certs_by_name))]
         else:
-            domain = domains[0]
+            name = index[0]['name']
             
-            if self._ask(f"Deseja remover o certificado SSL para {domain}?"):
-                if RICH_AVAILABLE:
-                    with Progress(SpinnerColumn(), TextColumn(f"[bold blue]Removendo certificado para {domain}...")) as progress:
-                        task = progress.add_task("removendo", total=None)
-                        self._execute_command(f"certbot delete --cert-name {domain} --non-interactive", silent=False)
-                else:
-                    print(f"Removendo certificado para {domain}...")
-                    self._execute_command(f"certbot delete --cert-name {domain} --non-interactive", silent=False)
-                
-                self._print_success(f"Certificado SSL para {domain} removido com sucesso!")
+            if self._ask(f"Deseja remover o certificado SSL para {name}?"):
+                selected = [name]
             else:
                 self._print_info("Remoção de certificado SSL cancelada.")
+                return
+        
+        for name in selected:
+            with self._progress(f"Removendo certificado para {name}..."):
+                self._execute_command(f"certbot delete --cert-name {name} --non-interactive", silent=False)
+        
+        if len(selected) > 1:
+            self._print_success("Todos os certificados SSL foram removidos com sucesso!")
+        else:
+            self._print_success(f"Certificado SSL para {selected[0]} removido com sucesso!")
+        
+        domains = []
+        for name in selected:
+            domains.extend(certs_by_name[name]['domains'])
         
         if self._ask("Deseja também remover as configurações do servidor web?"):
             web_server = self._detect_web_server()
@@ -1170,41 +3687,71 @@ server {{
             
             self._print_success("Configurações do servidor web removidas com sucesso!")
 
+    def _unit_exists(self, service):
+        return any(os.path.lexists(self._path(os.path.join(unit_dir, f"{service}.service"))) for unit_dir in SYSTEMD_UNIT_DIRS)
+
+    def _unit_masked(self, service):
+        return os.path.realpath(self._path(os.path.join(SYSTEMD_DIR, f"{service}.service"))) == "/dev/null"
+
+    def _mask_unit_in_root(self, service):
+        unit = f"{service}.service"
+        for link in glob.glob(self._path(os.path.join(SYSTEMD_DIR, "*.wants", unit))):
+            os.remove(link)
+        target = self._path(os.path.join(SYSTEMD_DIR, unit))
+        if os.path.lexists(target):
+            os.remove(target)
+        os.symlink("/dev/null", target)
+
+    def check_services(self, services=None):
+        if services is None:
+            services = [name for name, _ in UNNEEDED_SERVICES]
+        return [f"{service} não está mascarado" for service in services
+                if self._unit_exists(service) and not self._unit_masked(service)]
+
+    def apply_services(self, services):
+        pending = [service for service in services if self._unit_exists(service) and not self._unit_masked(service)]
+        if not pending:
+            return False
+        
+        if self.root:
+            for service in pending:
+                self._mask_unit_in_root(service)
+                self._checkpoint(f"mask {service}")
+            return True
+        
+        failed = []
+        with self._progress("Desativando serviços...", total=len(pending)) as progress:
+            for service in pending:
+                progress.update(f"Desativando {service}...")
+                self._execute_command(f"systemctl disable {service}")
+                self._execute_command(f"systemctl stop {service}")
+                if self._execute_command(f"systemctl mask {service}") != 0:
+                    failed.append(service)
+                else:
+                    self._checkpoint(f"mask {service}")
+                progress.update(advance=1)
+        
+        for service in failed:
+            self._print_error(f"Não foi possível desativar o serviço {service}.")
+        return None if failed else True
+
     def disable_services(self):
         self._print_header("Desativação de Serviços Desnecessários")
         
         if self._ask("🔌 Deseja desativar serviços não necessários para liberar recursos?"):
-            services_to_disable = [
-                'cups-browsed',  
-                'avahi-daemon', 
-                'bluetooth',    
-                'ModemManager', 
-                'wpa_supplicant' 
-            ]
+            rows = []
+            for service, description in UNNEEDED_SERVICES:
+                status = "desativado" if self._unit_masked(service) else ("ativo" if self._unit_exists(service) else "não instalado")
+                rows.append((service, description, status))
+            self.reporter.table("Serviços Disponíveis para Desativação", ["Serviço", "Descrição", "Situação"], rows)
             
-            if RICH_AVAILABLE:
-                services_table = Table(title="Serviços Disponíveis para Desativação")
-                services_table.add_column("Serviço", style="cyan")
-                services_table.add_column("Descrição", style="green")
-                
-                services_table.add_row("cups-browsed", "Descoberta de impressoras na rede")
-                services_table.add_row("avahi-daemon", "Descoberta de serviços na rede local")
-                services_table.add_row("bluetooth", "Suporte a dispositivos Bluetooth")
-                services_table.add_row("ModemManager", "Gerenciamento de modems e conexões móveis")
-                services_table.add_row("wpa_supplicant", "Cliente para redes Wi-Fi")
-                
-                self.console.print(services_table)
-            else:
-                print("\nServiços Disponíveis para Desativação:")
-                print("cups-browsed - Descoberta de impressoras na rede")
-                print("avahi-daemon - Descoberta de serviços na rede local")
-                print("bluetooth - Suporte a dispositivos Bluetooth")
-                print("ModemManager - Gerenciamento de modems e conexões móveis")
-                print("wpa_supplicant - Cliente para redes Wi-Fi")
-                print("")
+            pending = [service for service, _ in UNNEEDED_SERVICES if self.check_services([service])]
+            if not pending:
+                self._print_info("Todos os serviços instalados já estão desativados.")
+                return
             
             selected_services = []
-            for service in services_to_disable:
+            for service in pending:
                 if self._ask(f"Deseja desativar o serviço {service}?"):
                     selected_services.append(service)
             
@@ -1213,202 +3760,314 @@ server {{
                 return
             
             self._print_info(f"Desativando {len(selected_services)} serviços selecionados...")
-            
-            if RICH_AVAILABLE:
-                with Progress(
-                    SpinnerColumn(),
-                    TextColumn("[bold blue]Desativando serviços..."),
-                    BarColumn(),
-                    TextColumn("[bold]{task.percentage:.0f}%"),
-                ) as progress:
-                    task = progress.add_task("[green]Processando...", total=len(selected_services)*3)
-                    
-                    for service in selected_services:
-                        self._execute_command(f"systemctl disable {service}")
-                        progress.update(task, advance=1)
-                        self._execute_command(f"systemctl stop {service}")
-                        progress.update(task, advance=1)
-                        self._execute_command(f"systemctl mask {service}")
-                        progress.update(task, advance=1)
-            else:
-                for service in selected_services:
-                    print(f"Desativando {service}...")
-                    self._execute_command(f"systemctl disable {service}")
-                    self._execute_command(f"systemctl stop {service}")
-                    self._execute_command(f"systemctl mask {service}")
+            if self.apply_services(selected_services) is None:
+                return
         
             self._print_success(f"{len(selected_services)} serviços desativados com sucesso!")
             self._print_info("Os serviços não iniciarão mais na inicialização do sistema.")
         else:
             self._print_info("Desativação de serviços ignorada.")
 
-    def translate_to_portuguese(self):
-        self._print_header("Tradução Completa para Português do Brasil")
-        
-        if self._ask("🌎 Deseja traduzir completamente o sistema para Português do Brasil?"):
-            self._print_info("Configurando localização para pt_BR.UTF-8...")
-            
-            if RICH_AVAILABLE:
-                with Progress(
-                    SpinnerColumn(),
-                    TextColumn("[bold blue]Configurando localização..."),
-                    BarColumn(),
-                    TextColumn("[bold]{task.description}"),
-                ) as progress:
-                    task = progress.add_task("[green]Instalando pacotes de idioma...", total=None)
-                    
-                    if self.distro in ['ubuntu', 'debian', 'linuxmint', 'pop', 'elementary', 'zorin']:
-                        self._execute_command("apt-get install -y locales language-pack-pt language-pack-pt-base language-pack-gnome-pt")
-                    elif self.distro in ['fedora', 'centos', 'rhel', 'rocky', 'almalinux']:
-                        self._execute_command("dnf install -y glibc-langpack-pt langpacks-pt_BR")
-                    elif self.distro in ['arch', 'manjaro', 'endeavouros']:
-                        self._execute_command("pacman -S --noconfirm glibc lib32-glibc")
-                    else:
-                        progress.update(task, description="Tentando método genérico...")
-                        self._execute_command("apt-get install -y locales language-pack-pt language-pack-pt-base || dnf install -y glibc-langpack-pt || echo 'Não foi possível instalar pacotes de idioma'")
-                    
-                    progress.update(task, description="Gerando locales...")
-                    self._execute_command("locale-gen pt_BR.UTF-8 || echo 'Não foi possível gerar locales'")
-                    
-                    progress.update(task, description="Configurando variáveis de ambiente...")
-                    
-                    locale_file = ""
-                    if os.path.exists("/etc/locale.conf"):
-                        locale_file = "/etc/locale.conf"
-                    elif os.path.exists("/etc/default/locale"):
-                        locale_file = "/etc/default/locale"
-                    
-                    if locale_file:
-                        with open(locale_file, 'w') as f:
-                            f.write("LANG=pt_BR.UTF-8\n")
-                            f.write("LANGUAGE=pt_BR:pt:en\n")
-                            f.write("LC_ALL=pt_BR.UTF-8\n")
-                    else:
-                        with open("/etc/locale.conf", 'w') as f:
-                            f.write("LANG=pt_BR.UTF-8\n")
-                            f.write("LANGUAGE=pt_BR:pt:en\n")
-                            f.write("LC_ALL=pt_BR.UTF-8\n")
-                    
-                    self._execute_command("update-locale LANG=pt_BR.UTF-8 LANGUAGE=pt_BR:pt:en LC_ALL=pt_BR.UTF-8 || echo 'Não foi possível atualizar locale'")
-                    
-                    progress.update(task, description="Configurando para todos os usuários...")
-                    
-                    for user in pwd.getpwall():
-                        if user.pw_uid >= 1000 and user.pw_uid < 65534:
-                            home = user.pw_dir
-                            if os.path.exists(home):
-                                bashrc = os.path.join(home, ".bashrc")
-                                if os.path.exists(bashrc):
-                                    with open(bashrc, 'a') as f:
-                                        f.write("\n# Configuração de idioma\n")
-                                        f.write("export LANG=pt_BR.UTF-8\n")
-                                        f.write("export LANGUAGE=pt_BR:pt:en\n")
-                                        f.write("export LC_ALL=pt_BR.UTF-8\n")
-                                
-                                zshrc = os.path.join(home, ".zshrc")
-                                if os.path.exists(zshrc):
-                                    with open(zshrc, 'a') as f:
-                                        f.write("\n# Configuração de idioma\n")
-                                        f.write("export LANG=pt_BR.UTF-8\n")
-                                        f.write("export LANGUAGE=pt_BR:pt:en\n")
-                                        f.write("export LC_ALL=pt_BR.UTF-8\n")
-                                
-                                self._execute_command(f"chown -R {user.pw_name}:{user.pw_name} {home}/.bashrc {home}/.zshrc 2>/dev/null || true")
-                    
-                    progress.update(task, description="Configurando interface gráfica...")
-                    if self.distro in ['ubuntu', 'debian', 'linuxmint', 'pop', 'elementary', 'zorin']:
-                        self._execute_command("apt-get install -y task-brazilian-portuguese")
-                    
-                    if os.path.exists("/usr/bin/localectl"):
-                        self._execute_command("localectl set-locale LANG=pt_BR.UTF-8")
-                        self._execute_command("localectl set-keymap br-abnt2")
-                    
-                    if os.path.exists("/etc/X11/xorg.conf.d"):
-                        if not os.path.exists("/etc/X11/xorg.conf.d/00-keyboard.conf"):
-                            with open("/etc/X11/xorg.conf.d/00-keyboard.conf", 'w') as f:
-                                f.write('Section "InputClass"\n')
-                                f.write('    Identifier "system-keyboard"\n')
-                                f.write('    MatchIsKeyboard "on"\n')
-                                f.write('    Option "XkbLayout" "br"\n')
-                                f.write('    Option "XkbVariant" "abnt2"\n')
-                                f.write('EndSection\n')
-            else:
-                print("Instalando pacotes de idioma...")
-                if self.distro in ['ubuntu', 'debian', 'linuxmint', 'pop', 'elementary', 'zorin']:
-                    self._execute_command("apt-get install -y locales language-pack-pt language-pack-pt-base language-pack-gnome-pt")
-                elif self.distro in ['fedora', 'centos', 'rhel', 'rocky', 'almalinux']:
-                    self._execute_command("dnf install -y glibc-langpack-pt langpacks-pt_BR")
-                elif self.distro in ['arch', 'manjaro', 'endeavouros']:
-                    self._execute_command("pacman -S --noconfirm glibc lib32-glibc")
-                else:
-                    print("Tentando método genérico...")
-                    self._execute_command("apt-get install -y locales language-pack-pt language-pack-pt-base || dnf install -y glibc-langpack-pt || echo 'Não foi possível instalar pacotes de idioma'")
-                
-                print("Gerando locales...")
-                self._execute_command("locale-gen pt_BR.UTF-8 || echo 'Não foi possível gerar locales'")
-                
-                print("Configurando variáveis de ambiente...")
-                
-                locale_file = ""
-                if os.path.exists("/etc/locale.conf"):
-                    locale_file = "/etc/locale.conf"
-                elif os.path.exists("/etc/default/locale"):
-                    locale_file = "/etc/default/locale"
-                
-                if locale_file:
-                    with open(locale_file, 'w') as f:
-                        f.write("LANG=pt_BR.UTF-8\n")
-                        f.write("LANGUAGE=pt_BR:pt:en\n")
-                        f.write("LC_ALL=pt_BR.UTF-8\n")
-                else:
-                    with open("/etc/locale.conf", 'w') as f:
-                        f.write("LANG=pt_BR.UTF-8\n")
-                        f.write("LANGUAGE=pt_BR:pt:en\n")
-                        f.write("LC_ALL=pt_BR.UTF-8\n")
-                
-                self._execute_command("update-locale LANG=pt_BR.UTF-8 LANGUAGE=pt_BR:pt:en LC_ALL=pt_BR.UTF-8 || echo 'Não foi possível atualizar locale'")
-                
-                print("Configurando para todos os usuários...")
-                
-                for user in pwd.getpwall():
-                    if user.pw_uid >= 1000 and user.pw_uid < 65534:
-                        home = user.pw_dir
-                        if os.path.exists(home):
-                            bashrc = os.path.join(home, ".bashrc")
-                            if os.path.exists(bashrc):
-                                with open(bashrc, 'a') as f:
-                                    f.write("\n# Configuração de idioma\n")
-                                    f.write("export LANG=pt_BR.UTF-8\n")
-                                    f.write("export LANGUAGE=pt_BR:pt:en\n")
-                                    f.write("export LC_ALL=pt_BR.UTF-8\n")
-                            
-                            zshrc = os.path.join(home, ".zshrc")
-                            if os.path.exists(zshrc):
-                                with open(zshrc, 'a') as f:
-                                    f.write("\n# Configuração de idioma\n")
-                                    f.write("export LANG=pt_BR.UTF-8\n")
-                                    f.write("export LANGUAGE=pt_BR:pt:en\n")
-                                    f.write("export LC_ALL=pt_BR.UTF-8\n")
-                            
-                            self._execute_command(f"chown -R {user.pw_name}:{user.pw_name} {home}/.bashrc {home}/.zshrc 2>/dev/null || true")
-                
-                print("Configurando interface gráfica...")
-                if self.distro in ['ubuntu', 'debian', 'linuxmint', 'pop', 'elementary', 'zorin']:
-                    self._execute_command("apt-get install -y task-brazilian-portuguese")
-                
-                if os.path.exists("/usr/bin/localectl"):
-                    self._execute_command("localectl set-locale LANG=pt_BR.UTF-8")
-                    self._execute_command("localectl set-keymap br-abnt2")
-                
-                if os.path.exists("/etc/X11/xorg.conf.d"):
-                    if not os.path.exists("/etc/X11/xorg.conf.d/00-keyboard.conf"):
-                        with open("/etc/X11/xorg.conf.d/00-keyboard.conf", 'w') as f:
-                            f.write('Section "InputClass"\n')
-                            f.write('    Identifier "system-keyboard"\n')
-                            f.write('    MatchIsKeyboard "on"\n')
-                            f.write('    Option "XkbLayout" "br"\n')
-                            f.write('    Option "XkbVariant" "abnt2"\n')
-                            f.write('EndSection\n')
+    def _locale_file(self):
+        if os.path.exists(self._path("/etc/locale.conf")):
+            return self._path("/etc/locale.conf")
+        elif os.path.exists(self._path("/etc/default/locale")):
+            return self._path("/etc/default/locale")
+        return self._path("/etc/locale.conf")
+
+    def _read_assignments(self, path):
+        values = {}
+        try:
+            with open(path, 'r') as f:
+                for line in f:
+                    line = line.strip()
+                    if line.startswith('export '):
+                        line = line[len('export '):]
+                    if '=' in line and not line.startswith('#'):
+                        key, value = line.split('=', 1)
+                        values[key.strip()] = value.strip().strip('"\'')
+        except OSError:
+            pass
+        return values
+
+    def _locale_generated(self):
+        output = self._run_command(self._in_root("locale -a"), capture=True, tail=False).stdout
+        return "pt_br.utf8" in output.lower().split()
+
+    def _keymap_configured(self):
+        if self._read_assignments(self._path("/etc/vconsole.conf")).get("KEYMAP") == "br-abnt2":
+            return True
+        keyboard = self._read_assignments(self._path("/etc/default/keyboard"))
+        return keyboard.get("XKBLAYOUT") == "br" and keyboard.get("XKBVARIANT") == "abnt2"
+
+    def _user_shell_files(self):
+        files = []
+        for user in self._regular_users():
+            if os.path.exists(self._path(user.pw_dir)):
+                for name in (".bashrc", ".zshrc"):
+                    path = self._path(os.path.join(user.pw_dir, name))
+                    if os.path.exists(path):
+                        files.append((user, path))
+        return files
+
+    def _legacy_locale_pattern(self):
+        exports = "|".join(re.escape(key) for key, _ in LOCALE_SETTINGS)
+        return re.compile(rf'\n*^{re.escape(LOCALE_SHELL_MARKER)}\n(?:export (?:{exports})=.*\n?)*', re.MULTILINE)
+
+    def _read_user_file(self, user, path):
+        fd = os.open(path, os.O_RDONLY | os.O_NOFOLLOW | os.O_NONBLOCK)
+        with os.fdopen(fd, 'r', errors='replace') as f:
+            st = os.fstat(fd)
+            if not stat.S_ISREG(st.st_mode) or st.st_nlink != 1 or st.st_uid != user.pw_uid:
+                raise PermissionError(f"{path} não é um arquivo comum do usuário {user.pw_name}")
+            return f.read()
+
+    def _shell_file_has_legacy_locale(self, user, path):
+        try:
+            return LOCALE_SHELL_MARKER in self._read_user_file(user, path)
+        except OSError:
+            return False
+
+    def _managed_block(self, content, name, lines):
+        begin, end = MANAGED_BLOCK_BEGIN.format(name), MANAGED_BLOCK_END.format(name)
+        pattern = re.compile(rf'^{re.escape(begin)}\n.*?^{re.escape(end)}\n?', re.MULTILINE | re.DOTALL)
+        block = "".join(f"{line}\n" for line in [begin] + list(lines) + [end]) if lines is not None else ""
+        if pattern.search(content):
+            return pattern.sub(lambda _: block, content, count=1)
+        if block and content and not content.endswith("\n"):
+            content += "\n"
+        return content + block
+
+    def _real_path(self, path):
+        if not self.fs_root:
+            return os.path.realpath(path)
+        for _ in range(40):
+            if not os.path.islink(path):
+                return path
+            target = os.readlink(path)
+            path = self._path(target) if os.path.isabs(target) else os.path.join(os.path.dirname(path), target)
+        raise OSError(f"{path}: links simbólicos em excesso")
+
+    def _rewrite_file(self, path, content, mode=0o644, follow_symlinks=True):
+        if follow_symlinks:
+            path = self._real_path(path)
+        try:
+            st = os.lstat(path)
+        except FileNotFoundError:
+            st = None
+        if st and not stat.S_ISREG(st.st_mode):
+            raise PermissionError(f"{path} não é um arquivo comum")
+        fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(content)
+                if st:
+                    os.fchown(f.fileno(), st.st_uid, st.st_gid)
+                    with contextlib.suppress(OSError, AttributeError):
+                        os.setxattr(f.fileno(), "security.selinux", os.getxattr(path, "security.selinux", follow_symlinks=False))
+                os.fchmod(f.fileno(), st.st_mode & 0o7777 if st else mode)
+            os.replace(tmp_path, path)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.unlink(tmp_path)
+            raise
+
+    def _update_managed_block(self, path, name, lines, mode=0o644):
+        try:
+            with open(path, 'r', errors='replace') as f:
+                content = f.read()
+        except FileNotFoundError:
+            if lines is None:
+                return False
+            content = ""
+        updated = self._managed_block(content, name, lines)
+        if updated == content:
+            return False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._rewrite_file(path, updated, mode)
+        return True
+
+    def _locale_profile_lines(self):
+        return [f"export {key}={value}" for key, value in LOCALE_SETTINGS]
+
+    def _locale_profile_configured(self):
+        try:
+            with open(self._path(LOCALE_PROFILE), 'r') as f:
+                content = f.read()
+        except OSError:
+            return False
+        return self._managed_block(content, "locale", self._locale_profile_lines()) == content
+
+    def _write_locale_profile(self):
+        self._update_managed_block(self._path(LOCALE_PROFILE), "locale", self._locale_profile_lines())
+
+    def _clean_user_file(self, user, path):
+        content = self._read_user_file(user, path)
+        updated = self._managed_block(self._legacy_locale_pattern().sub("\n", content), "locale", None)
+        if updated != content:
+            self._rewrite_file(path, updated, follow_symlinks=False)
+
+    def _clean_user_locale(self, files):
+        def clean(item):
+            try:
+                self._clean_user_file(*item)
+            except OSError as e:
+                return str(e)
+            return None
+        
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=max(1, min(USER_FILE_WORKERS, len(files)))) as pool:
+            errors = list(pool.map(clean, files))
+        for (_, path), error in zip(files, errors):
+            if error:
+                self._print_warning(f"Não foi possível limpar {path}: {error}")
+
+    def _display_stack(self):
+        return self._cached_fact('display', lambda: any(os.path.lexists(self._path(path)) for path in DISPLAY_STACK_PATHS))
+
+    def _locale_package_set(self, minimal):
+        return self._package_set("locale-minimal" if minimal else "locale")
+
+    def _generate_locale(self):
+        locale_gen = self._path(LOCALE_GEN_FILE)
+        if not os.path.exists(locale_gen):
+            self._execute_command(self._in_root("locale-gen pt_BR.UTF-8") + " || echo 'Não foi possível gerar locales'")
+            return
+        with open(locale_gen, 'r') as f:
+            content = f.read()
+        pattern = rf'^[#\s]*{re.escape(LOCALE_GEN_ENTRY)}\s*$'
+        if re.search(pattern, content, re.MULTILINE):
+            updated = re.sub(pattern, LOCALE_GEN_ENTRY, content, count=1, flags=re.MULTILINE)
+        else:
+            updated = content + ("" if content.endswith("\n") or not content else "\n") + f"{LOCALE_GEN_ENTRY}\n"
+        if updated != content:
+            self._rewrite_file(locale_gen, updated)
+        self._execute_command(self._in_root("localedef -i pt_BR -c -f UTF-8 pt_BR.UTF-8"))
+
+    def _report_skipped_locale_packages(self, packages):
+        missing = self._missing_packages(packages)
+        if not missing:
+            return
+        size = self._download_size(missing)
+        message = f"Pacotes de idioma ignorados: {', '.join(missing)}"
+        if size:
+            message += f" (economia de {self._format_bytes(size)}"
+            if self.last_download_rate:
+                message += f", cerca de {size / self.last_download_rate:.0f}s de download"
+            message += ")"
+        self._print_info(message)
+
+    def check_locale(self, minimal=False):
+        drift = []
+        missing = self._missing_packages(self._locale_package_set(minimal))
+        if missing:
+            drift.append(f"pacotes ausentes: {', '.join(missing)}")
+        if not self._locale_generated():
+            drift.append("locale pt_BR.UTF-8 não gerado")
+        
+        locale_file = self._locale_file()
+        current = self._read_assignments(locale_file)
+        for key, value in LOCALE_SETTINGS:
+            if current.get(key) != value:
+                drift.append(f"{key} = {current.get(key, 'não definido')} em {locale_file} (esperado {value})")
+        
+        if not self._locale_profile_configured():
+            drift.append(f"{LOCALE_PROFILE} desatualizado")
+        for user, path in self._user_shell_files():
+            if self._shell_file_has_legacy_locale(user, path):
+                drift.append(f"{path} com bloco de idioma antigo")
+        return drift
+
+    def _write_locale_file(self):
+        with open(self._locale_file(), 'w') as f:
+            for key, value in LOCALE_SETTINGS:
+                f.write(f"{key}={value}\n")
+        self._execute_command(self._in_root("update-locale LANG=pt_BR.UTF-8 LANGUAGE=pt_BR:pt:en LC_ALL=pt_BR.UTF-8") + " || echo 'Não foi possível atualizar locale'")
+        if os.path.exists(self._path("/usr/bin/localectl")) and not self.root:
+            self._execute_command("localectl set-locale LANG=pt_BR.UTF-8")
+
+    def _write_vconsole_keymap(self):
+        vconsole = self._path("/etc/vconsole.conf")
+        if os.path.exists(vconsole):
+            self._update_config_assignment(vconsole, "KEYMAP", "br-abnt2")
+        else:
+            with open(vconsole, 'w') as f:
+                f.write("KEYMAP=br-abnt2\n")
+
+    def _write_x11_keyboard(self):
+        os.makedirs(os.path.dirname(self._path(X11_KEYBOARD_CONF)), exist_ok=True)
+        with open(self._path(X11_KEYBOARD_CONF), 'w') as f:
+            f.write('Section "InputClass"\n')
+            f.write('    Identifier "system-keyboard"\n')
+            f.write('    MatchIsKeyboard "on"\n')
+            f.write('    Option "XkbLayout" "br"\n')
+            f.write('    Option "XkbVariant" "abnt2"\n')
+            f.write('EndSection\n')
+
+    def apply_locale(self, minimal=False):
+        changed = False
+        failed = False
+        missing = self._missing_packages(self._locale_package_set(minimal))
+        if missing:
+            failed = self.install_packages(missing, "pacotes de idioma") != 0
+            changed = True
+        
+        steps = []
+        if not self._locale_generated():
+            steps.append(("Gerando locales...", self._generate_locale))
+        
+        current = self._read_assignments(self._locale_file())
+        if any(current.get(key) != value for key, value in LOCALE_SETTINGS):
+            steps.append(("Configurando variáveis de ambiente...", self._write_locale_file))
+        
+        if not self._locale_profile_configured():
+            steps.append(("Configurando para todos os usuários...", self._write_locale_profile))
+        
+        legacy_files = [(user, path) for user, path in self._user_shell_files() if self._shell_file_has_legacy_locale(user, path)]
+        if legacy_files:
+            steps.append(("Removendo configurações antigas dos usuários...", lambda: self._clean_user_locale(legacy_files)))
+        
+        if self.root and not self._keymap_configured():
+            steps.append(("Configurando teclado...", self._write_vconsole_keymap))
+        elif os.path.exists(self._path("/usr/bin/localectl")) and not self._keymap_configured():
+            steps.append(("Configurando teclado...", lambda: self._execute_command("localectl set-keymap br-abnt2")))
+        
+        if self._display_stack() and not os.path.exists(self._path(X11_KEYBOARD_CONF)):
+            steps.append(("Configurando interface gráfica...", self._write_x11_keyboard))
+        
+        if steps:
+            with self._progress("Configurando localização...") as progress:
+                for description, action in steps:
+                    progress.update(description)
+                    action()
+                    self._checkpoint(description)
+            changed = True
+        
+        skipped = [pkg for pkg in self._package_set("locale") if minimal and pkg not in self._locale_package_set(True)]
+        if minimal or not self._display_stack():
+            skipped += self._package_set("locale-desktop")
+        else:
+            missing = self._missing_packages(self._package_set("locale-desktop"))
+            if missing:
+                self.install_packages(missing, "tradução da interface gráfica")
+                changed = True
+        if skipped:
+            self._report_skipped_locale_packages(skipped)
+        return None if failed else changed
+
+    def translate_to_portuguese(self):
+        self._print_header("Tradução Completa para Português do Brasil")
+        
+        if self._ask("🌎 Deseja traduzir completamente o sistema para Português do Brasil?"):
+            minimal = not self._display_stack() and self._ask("🖥️ Nenhuma interface gráfica detectada. Instalar somente o mínimo para servidor?")
+            self._print_info("Configurando localização para pt_BR.UTF-8...")
+            
+            changed = self.apply_locale(minimal)
+            if changed is None:
+                self._print_warning("Os pacotes de idioma não foram instalados; a tradução pode ficar incompleta.")
+            elif not changed:
+                self._print_info("O sistema já estava configurado para Português do Brasil.")
+                return
             
             self._print_success("Sistema configurado para Português do Brasil!")
             self._print_info("As alterações completas serão visíveis após reiniciar o sistema.")
@@ -1416,38 +4075,552 @@ server {{
         else:
             self._print_info("Tradução do sistema ignorada.")
 
-    def install_rich_if_needed(self):
+    def convergence_steps(self):
+        return [
+            ("ssh-root", "Acesso SSH para root", self.check_root_ssh),
+            ("ssh-timeout", "Timeout do SSH", self.check_ssh_timeout),
+            ("swap", "Memória swap", self.check_swap),
+            ("arch32", "Arquitetura 32 bits", self.check_arch32),
+            ("ssl", "Certificados SSL", self.check_ssl),
+            ("services", "Serviços desnecessários", self.check_services),
+            ("locale", "Idioma Português do Brasil", self.check_locale),
+            ("downloads", "Downloads de pacotes", self.check_package_downloads),
+        ]
+
+    def check_all(self, keys=None):
+        def run_check(check):
+            try:
+                return check()
+            except (OSError, ValueError) as e:
+                return [f"não foi possível verificar: {str(e)}"]
+        
+        steps = [step for step in self.convergence_steps()
+                 if (keys is None or step[0] in keys) and not self.step_unavailable(step[0])]
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=max(1, len(steps))) as pool:
+            results = list(pool.map(run_check, [check for _, _, check in steps]))
+        return [(key, title, drift) for (key, title, _), drift in zip(steps, results)]
+
+    def print_check_report(self, report):
+        for key, title, drift in report:
+            self.reporter.result("drift" if drift else "ok", "divergente" if drift else "ok", f"{key} - {title}", drift)
+
+    def _refresh_repositories(self):
+        with self._package_job():
+            if not self._repositories_refreshed:
+                with self._span("atualizar repositórios", "subetapa"):
+                    returncode = self._execute_command(self.pkg_update)
+                if returncode == 0 and self.journal is not None:
+                    self.journal['repositories_refreshed'] = time.time()
+                    self._save_journal()
+                self._repositories_refreshed = True
+
+    def load_journal(self):
         try:
-            import rich
-            return True
-        except ImportError:
-            print("Instalando a biblioteca 'rich' para melhorar a interface...")
+            with open(JOURNAL_FILE, 'r') as f:
+                journal = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return journal if isinstance(journal, dict) and journal.get('version') == 1 else None
+
+    def _save_journal(self):
+        with self._journal_lock:
+            if self.journal is None:
+                return
+            self.journal['updated'] = time.time()
             try:
-                subprocess.check_call([sys.executable, "-m", "pip", "install", "rich", "tqdm"])
-                print("Biblioteca 'rich' instalada! Reiniciando o script...")
-                os.execv(sys.executable, ['python3'] + sys.argv)
-                return True
-            except Exception as e:
-                print(f"Não foi possível instalar a biblioteca 'rich'. Continuando com a interface básica.")
-                print(f"Erro: {str(e)}")
-                return False
+                os.makedirs(STATE_DIR, exist_ok=True)
+                with open(os.open(f"{JOURNAL_FILE}.tmp", os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w') as f:
+                    json.dump(self.journal, f, indent=2)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(f"{JOURNAL_FILE}.tmp", JOURNAL_FILE)
+            except OSError:
+                pass
+
+    def _input_hash(self, options):
+        return hashlib.sha256(json.dumps(options, sort_keys=True).encode()).hexdigest()[:16]
+
+    def interrupted_journal(self, source=None):
+        journal = self.load_journal()
+        if journal is None or journal.get('finished'):
+            return None
+        if source is not None and journal.get('source') != source:
+            return None
+        return journal
+
+    def begin_journal(self, plan, source, resume=False):
+        previous = self.interrupted_journal(source) if resume else None
+        self.journal = {
+            'version': 1,
+            'source': source,
+            'started': time.time(),
+            'finished': None,
+            'repositories_refreshed': None,
+            'plan': [[key, options] for key, options in plan],
+            'steps': {},
+        }
+        
+        completed = set()
+        if previous:
+            refreshed = previous.get('repositories_refreshed')
+            if refreshed and time.time() - refreshed < REPOSITORY_REFRESH_MAX_AGE:
+                self.journal['repositories_refreshed'] = refreshed
+                self._repositories_refreshed = True
+            
+            for key, options in plan:
+                entry = previous.get('steps', {}).get(key)
+                if not entry or entry.get('input') != self._input_hash(options):
+                    continue
+                if entry.get('status') == "done":
+                    self.journal['steps'][key] = entry
+                    completed.add(key)
+                else:
+                    self._cleanup_partial_step(key, entry)
+        
+        self._save_journal()
+        return completed
+
+    def _cleanup_partial_step(self, key, entry):
+        key = MENU_STEPS.get(key, key)
+        for path in STEP_PARTIAL_FILES.get(key, []):
+            path = self._path(path)
+            for tmp_path in glob.glob(os.path.join(glob.escape(os.path.dirname(path)), f".{glob.escape(os.path.basename(path))}.????????")):
+                self._print_warning(f"Removendo arquivo temporário da execução interrompida: {tmp_path}")
+                os.remove(tmp_path)
+        
+        if key == "swap" and os.path.exists(self._path(SWAP_FILE)) and SWAP_FILE not in self._active_swaps():
+            self._print_warning(f"Removendo {SWAP_FILE} incompleto da execução interrompida...")
+            os.remove(self._path(SWAP_FILE))
+        elif key == "ssl":
+            for cert_dir in glob.glob(os.path.join(self._path(SELF_SIGNED_DIR), "*")):
+                if os.path.isdir(cert_dir) and not os.path.exists(os.path.join(cert_dir, "fullchain.pem")):
+                    self._print_warning(f"Removendo certificado incompleto da execução interrompida: {cert_dir}")
+                    shutil.rmtree(cert_dir)
+        if key in PACKAGE_STEPS:
+            self._recover_package_manager()
+
+    def _recover_package_manager(self):
+        if self.pkg_manager == "apt-get":
+            updates = self._path("/var/lib/dpkg/updates")
+            if os.path.isdir(updates) and os.listdir(updates):
+                self._print_warning("Concluindo a configuração de pacotes interrompida...")
+                with self._package_job():
+                    self._execute_command(self._in_root("dpkg --configure -a"))
+        elif self.pkg_manager == "pacman":
+            lock = self._path("/var/lib/pacman/db.lck")
+            if os.path.exists(lock) and not self._get_command_output("pgrep -x pacman"):
+                self._print_warning(f"Removendo trava abandonada: {lock}")
+                os.remove(lock)
+
+    def journal_step(self, key, status, options=None):
+        if self.journal is None:
+            return
+        with self._journal_lock:
+            entry = self.journal['steps'].setdefault(key, {'substeps': []})
+            entry['status'] = status
+            if options is not None:
+                entry['input'] = self._input_hash(options)
+        self._save_journal()
+
+    def _checkpoint(self, substep):
+        self._end_span(self._begin_span(substep, "checkpoint"), time.monotonic())
+        key = getattr(self._step_state, 'step', None)
+        if self.journal is None or key is None:
+            return
+        with self._journal_lock:
+            entry = self.journal['steps'].setdefault(key, {'substeps': []})
+            entry['substeps'].append(substep)
+        self._save_journal()
+
+    def finish_journal(self):
+        if self.journal is None:
+            return
+        self.journal['finished'] = time.time()
+        self._save_journal()
+
+    def _load_first_boot_plan(self):
+        try:
+            with open(self._path(FIRST_BOOT_PLAN), 'r') as f:
+                return [(key, options) for key, options in json.load(f)]
+        except (OSError, ValueError):
+            return []
+
+    def _install_first_boot(self):
+        deferred = {key for key, _ in self._first_boot_plan}
+        plan = [(key, options) for key, options in self._load_first_boot_plan() if key not in deferred] + self._first_boot_plan
+        plan_file = self._path(FIRST_BOOT_PLAN)
+        os.makedirs(os.path.dirname(plan_file), exist_ok=True)
+        with open(f"{plan_file}.tmp", 'w') as f:
+            json.dump(plan, f, indent=2)
+        os.replace(f"{plan_file}.tmp", plan_file)
+        
+        self._install_script_copy()
+        unit_dir = self._path(SYSTEMD_DIR)
+        os.makedirs(os.path.join(unit_dir, "multi-user.target.wants"), exist_ok=True)
+        with open(os.path.join(unit_dir, FIRST_BOOT_UNIT), 'w') as f:
+            f.write("[Unit]\n")
+            f.write("Description=Doce Setup - configuração do primeiro boot\n")
+            f.write("Wants=network-online.target\n")
+            f.write("After=network-online.target\n")
+            f.write(f"ConditionPathExists={FIRST_BOOT_PLAN}\n\n")
+            f.write("[Service]\n")
+            f.write("Type=oneshot\n")
+            f.write(f"WorkingDirectory={INSTALL_DIR}\n")
+            f.write("ExecStart=/usr/bin/env python3 -m docesetup --first-boot\n")
+            f.write("RemainAfterExit=yes\n\n")
+            f.write("[Install]\n")
+            f.write("WantedBy=multi-user.target\n")
+        
+        link = os.path.join(unit_dir, "multi-user.target.wants", FIRST_BOOT_UNIT)
+        if not os.path.lexists(link):
+            os.symlink(os.path.join(SYSTEMD_DIR, FIRST_BOOT_UNIT), link)
+
+    def run_first_boot(self):
+        plan = self._load_first_boot_plan()
+        results = self.run_plan(plan)
+        if not any(result['status'] == "failed" for result in results):
+            os.replace(FIRST_BOOT_PLAN, f"{FIRST_BOOT_PLAN}.done")
+        return results
+
+    def run_step(self, key, options=None):
+        options = options or {}
+        if key == "ssh-root":
+            return self.apply_root_ssh()
+        elif key == "ssh-timeout":
+            return self.apply_ssh_timeout()
+        elif key == "swap":
+            return self.apply_swap(options.get("size", self._default_swap_size()))
+        elif key == "arch32":
+            if self.check_arch32():
+                self._refresh_repositories()
+            return self.apply_arch32()
+        elif key == "ssl":
+            domains = options.get("domains", [])
+            if domains and not self._certificate_covers(domains):
+                self._refresh_repositories()
+            return self.apply_certificate(domains, options.get("email"), options.get("web_server"),
+                                          options.get("self_signed", False))
+        elif key == "services":
+            return self.apply_services(options.get("disable", [name for name, _ in UNNEEDED_SERVICES]))
+        elif key == "locale":
+            minimal = options.get("minimal", False)
+            if self.check_locale(minimal):
+                self._refresh_repositories()
+            return self.apply_locale(minimal)
+        elif key == "downloads":
+            return self.apply_package_downloads(options.get("proxy"))
+        raise ValueError(f"Etapa desconhecida: {key}")
+
+    def _run_planned_step(self, key, options, parent=None):
+        self._step_state.span = parent
+        started = time.monotonic()
+        if self.root and key in FIRST_BOOT_STEPS:
+            self._first_boot_plan.append((key, options))
+            self.journal_step(key, "done", options)
+            return {'step': key, 'status': "deferred", 'duration': 0.0}
+        
+        reason = self.step_unavailable(key)
+        if reason:
+            self.journal_step(key, "done", options)
+            return {'step': key, 'status': "skipped", 'duration': 0.0, 'reason': reason}
+        
+        self._step_state.errors = []
+        self._step_state.step = key
+        self.journal_step(key, "running", options)
+        locks = [self._step_locks[name] for name in sorted(STEP_RESOURCES.get(key, []))]
+        try:
+            with contextlib.ExitStack() as stack:
+                for lock in locks:
+                    stack.enter_context(lock)
+                stack.enter_context(self._span(key, "etapa"))
+                changed = self.run_step(key, options)
+        except Exception as e:
+            self._step_state.errors.append(str(e) or type(e).__name__)
+            changed = None
+        
+        result = {
+            'step': key,
+            'status': "failed" if changed is None else ("changed" if changed else "unchanged"),
+            'duration': round(time.monotonic() - started, 3),
+        }
+        if self._step_state.errors:
+            result['errors'] = self._step_state.errors
+        self._step_state.errors = None
+        self._step_state.step = None
+        self.journal_step(key, "failed" if changed is None else "done")
+        return result
+
+    def run_plan(self, plan, workers=None, source=None, resume=False):
+        from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+        keys = [key for key, _ in plan]
+        completed = self.begin_journal(plan, source, resume) if source else set()
+        pending = [(key, options) for key, options in plan if key not in completed]
+        running = {}
+        results = {key: {'step': key, 'status': "resumed", 'duration': 0.0} for key in completed}
+        
+        with self._span("plano", "plano", steps=keys) as plan_span, ThreadPoolExecutor(max_workers=workers or max(1, len(plan))) as pool:
+            while pending or running:
+                for key, options in list(pending):
+                    dependencies = [dep for dep in STEP_DEPENDENCIES.get(key, []) if dep in keys]
+                    if not all(dep in results for dep in dependencies):
+                        continue
+                    pending.remove((key, options))
+                    blocked = [dep for dep in dependencies if results[dep]['status'] == "failed" or results[dep].get('blocked')]
+                    if blocked:
+                        reasons = [f"{dep}, que {'falhou' if results[dep]['status'] == 'failed' else 'foi ignorada'}" for dep in blocked]
+                        results[key] = {'step': key, 'status': "skipped", 'duration': 0.0, 'blocked': True,
+                                        'reason': f"depende de {'; '.join(reasons)}"}
+                        continue
+                    running[pool.submit(self._run_planned_step, key, options, plan_span['id'])] = key
+                if not running:
+                    continue
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    results[running.pop(future)] = future.result()
+        
+        if self.root and self._first_boot_plan:
+            self._install_first_boot()
+        if source and not any(result['status'] == "failed" for result in results.values()):
+            self.finish_journal()
+        return [results[key] for key in keys]
+
+    def print_plan_results(self, results):
+        labels = {'changed': "alterado", 'unchanged': "sem alterações", 'failed': "falhou", 'resumed': "concluído anteriormente",
+                  'deferred': "adiado para o primeiro boot", 'skipped': "ignorado"}
+        for result in results:
+            details = ([result['reason']] if result.get('reason') else []) + result.get('errors', [])
+            self.reporter.result(result['status'], labels[result['status']], f"{result['step']} ({result['duration']:.1f}s)", details)
+
+    def save_last_run(self):
+        spans = [span for span in self.trace_spans if span['duration'] is not None]
+        if not any(span['cat'] == "etapa" for span in spans):
+            return
+        
+        data = {
+            'started': min(span['start'] for span in spans),
+            'hostname': platform.node(),
+            'distro': self.distro,
+            'version': self.version,
+            'pkg_manager': self.pkg_manager,
+            'spans': spans,
+        }
+        try:
+            os.makedirs(STATE_DIR, exist_ok=True)
+            with open(f"{LAST_RUN_FILE}.tmp", 'w') as f:
+                json.dump(data, f)
+            os.replace(f"{LAST_RUN_FILE}.tmp", LAST_RUN_FILE)
+        except OSError:
+            pass
+
+    def export_chrome_trace(self, path):
+        pid = os.getpid()
+        events = [{'name': "process_name", 'ph': "M", 'pid': pid,
+                   'args': {'name': f"docesetup {self.distro} {self.version} ({platform.node()})"}}]
+        for span in self.trace_spans:
+            if span['duration'] is None:
+                continue
+            event = {
+                'name': span['name'],
+                'cat': span['cat'],
+                'pid': pid,
+                'tid': span['tid'],
+                'ts': int(span['start'] * 1e6),
+                'args': dict(span['args'], cpu=round(span['cpu'], 4), child_cpu=round(span['child_cpu'], 4)),
+            }
+            if span['cat'] == "checkpoint":
+                event.update(ph="i", s="t")
+            else:
+                event.update(ph="X", dur=int(span['duration'] * 1e6))
+            events.append(event)
+        
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': "ms"}, f)
+
+    def print_trace_summary(self, rows=TRACE_SUMMARY_ROWS):
+        spans = sorted((span for span in self.trace_spans if span['duration'] and span['cat'] not in ("checkpoint", "plano")),
+                       key=lambda span: span['duration'], reverse=True)[:rows]
+        if not spans:
+            return
+        
+        self.reporter.table("Operações Mais Lentas", ["Operação", "Tipo", "Tempo", "CPU", "Código"],
+                            [(span['name'], span['cat'], f"{span['duration']:.2f}s", f"{span['cpu'] + span['child_cpu']:.2f}s",
+                              span['args'].get('returncode', "")) for span in spans])
+
+    def finish_trace(self, summary=True):
+        self.save_last_run()
+        if self.trace_path:
+            try:
+                self.export_chrome_trace(self.trace_path)
+            except OSError as e:
+                self._print_error(f"Não foi possível gravar o trace em {self.trace_path}: {str(e)}")
+        if summary:
+            self.print_trace_summary()
+
+    def _read_sysctl(self, name):
+        try:
+            with open(os.path.join("/proc/sys", name.replace('.', '/')), 'r') as f:
+                return f.read().split()
+        except OSError:
+            return []
+
+    def _nofile_limits(self):
+        limits = []
+        try:
+            with open("/proc/1/limits", 'r') as f:
+                for line in f:
+                    if line.startswith("Max open files"):
+                        soft, hard = line.split()[3:5]
+                        limits += [({'scope': "pid1", 'domain': "", 'kind': "soft"}, soft),
+                                   ({'scope': "pid1", 'domain': "", 'kind': "hard"}, hard)]
+        except (OSError, ValueError):
+            pass
+        
+        for pattern in LIMITS_FILES:
+            for path in sorted(glob.glob(self._path(pattern))):
+                try:
+                    with open(path, 'r') as f:
+                        for line in f:
+                            parts = line.split('#', 1)[0].split()
+                            if len(parts) == 4 and parts[2] == "nofile":
+                                kinds = ["soft", "hard"] if parts[1] == "-" else [parts[1]]
+                                limits += [({'scope': "limits", 'domain': parts[0], 'kind': kind}, parts[3]) for kind in kinds]
+                except OSError:
+                    continue
+        return [(labels, -1 if value == "unlimited" else value) for labels, value in limits
+                if value == "unlimited" or value.isdigit()]
+
+    def _web_tuning_values(self):
+        values = []
+        for server, (patterns, directives) in WEB_TUNING_FILES.items():
+            found = {}
+            for pattern in patterns:
+                for path in sorted(glob.glob(self._path(pattern))):
+                    try:
+                        with open(path, 'r') as f:
+                            for line in f:
+                                for statement in re.split(r'[;{}]', line.split('#', 1)[0]):
+                                    parts = statement.split()
+                                    if len(parts) >= 2 and parts[0] in directives and parts[0] not in found:
+                                        found[parts[0]] = parts[1]
+                    except OSError:
+                        continue
+            for directive, value in found.items():
+                if value == "auto" and directive == "worker_processes":
+                    value = str(os.cpu_count() or 1)
+                match = re.match(r'^(\d+)([kKmMgG]?)$', value)
+                if match:
+                    values.append(({'server': server, 'directive': directive},
+                                   int(match.group(1)) * SIZE_UNITS.get(match.group(2).lower(), 1)))
+        return values
+
+    def _swap_devices(self):
+        devices = []
+        try:
+            with open(self._path("/proc/swaps"), 'r') as f:
+                for line in f.readlines()[1:]:
+                    parts = line.split()
+                    if len(parts) >= 4:
+                        devices.append(({'device': parts[0], 'type': parts[1]}, int(parts[2]) * 1024))
+        except (OSError, ValueError):
+            pass
+        return devices
+
+    def _last_run_steps(self):
+        try:
+            with open(LAST_RUN_FILE, 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None, []
+        steps = {}
+        for span in data.get('spans', []):
+            if span.get('cat') == "etapa":
+                steps[span['name']] = steps.get(span['name'], 0.0) + span['duration']
+        return data.get('started'), [({'step': name}, round(duration, 3)) for name, duration in sorted(steps.items())]
+
+    def collect_metrics(self):
+        started = time.monotonic()
+        last_run, step_durations = self._last_run_steps()
+        metrics = [
+            ("docesetup_info", "Distribuição e versão do script", [({'distro': self.distro, 'version': self.version,
+                                                                      'script_version': self.script_version}, 1)]),
+            ("docesetup_swap_size_bytes", "Tamanho de cada área de swap ativa", self._swap_devices()),
+            ("docesetup_swapfile_in_fstab", f"1 se {SWAP_FILE} está no fstab", [({}, int(self._fstab_has_swapfile()))]),
+            ("docesetup_sysctl", "Valor efetivo dos sysctls de ajuste",
+             [({'name': name, 'index': str(i)}, value) for name in METRICS_SYSCTLS
+              for i, value in enumerate(self._read_sysctl(name)) if value.lstrip('-').isdigit()]),
+            ("docesetup_nofile_limit", "Limites de arquivos abertos (-1 = ilimitado)", self._nofile_limits()),
+            ("docesetup_unit_masked", "1 se o serviço está mascarado", [({'unit': f"{name}.service"}, int(self._unit_masked(name)))
+                                                                        for name, _ in UNNEEDED_SERVICES]),
+            ("docesetup_web_tuning", "Diretivas de ajuste do servidor web", self._web_tuning_values()),
+            ("docesetup_certificate_expiry_timestamp_seconds", "Expiração de cada certificado do Let's Encrypt",
+             [({'name': cert['name'], 'domain': cert['domains'][0] if cert['domains'] else "", 'key_type': cert.get('key_type', "")},
+               int(cert['not_after'])) for cert in self.get_certificate_index()]),
+            ("docesetup_last_run_timestamp_seconds", "Início da última execução", [({}, round(last_run, 3))] if last_run else []),
+            ("docesetup_step_duration_seconds", "Duração de cada etapa na última execução", step_durations),
+        ]
+        metrics.append(("docesetup_metrics_collection_seconds", "Tempo gasto coletando estas métricas",
+                        [({}, round(time.monotonic() - started, 6))]))
+        return metrics
+
+    def write_metrics(self, path=METRICS_FILE):
+        def escape(value):
+            return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        
+        lines = []
+        for name, help_text, samples in self.collect_metrics():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            for labels, value in samples:
+                label_text = ",".join(f'{key}="{escape(label)}"' for key, label in labels.items())
+                lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+        
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(f"{path}.tmp", 'w') as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(f"{path}.tmp", path)
+
+    def install_metrics_timer(self, path=METRICS_FILE):
+        self._install_script_copy()
+        export_command = f"{sys.executable} -m docesetup export-metrics --output {shlex.quote(path)}"
+        
+        if shutil.which('systemctl') and os.path.isdir("/run/systemd/system"):
+            with open(os.path.join(SYSTEMD_DIR, "docesetup-metrics.service"), 'w') as f:
+                f.write("[Unit]\n")
+                f.write("Description=Doce Setup - exportação de métricas para o node_exporter\n\n")
+                f.write("[Service]\n")
+                f.write("Type=oneshot\n")
+                f.write("Nice=10\n")
+                f.write(f"WorkingDirectory={INSTALL_DIR}\n")
+                f.write(f"ExecStart={export_command}\n")
+            
+            with open(os.path.join(SYSTEMD_DIR, "docesetup-metrics.timer"), 'w') as f:
+                f.write("[Unit]\n")
+                f.write("Description=Doce Setup - agendamento da exportação de métricas\n\n")
+                f.write("[Timer]\n")
+                f.write(f"OnBootSec={METRICS_INTERVAL}\n")
+                f.write(f"OnUnitActiveSec={METRICS_INTERVAL}\n")
+                f.write("AccuracySec=10s\n\n")
+                f.write("[Install]\n")
+                f.write("WantedBy=timers.target\n")
+            
+            self._execute_command("systemctl daemon-reload")
+            return self._execute_command("systemctl enable --now docesetup-metrics.timer") == 0
+        
+        with open('/etc/cron.d/docesetup-metrics', 'w') as f:
+            f.write("SHELL=/bin/sh\n")
+            f.write("PATH=/usr/local/sbin:/usr/local/bin:/sbin:/bin:/usr/sbin:/usr/bin\n")
+            f.write(f"* * * * * root cd {INSTALL_DIR} && {export_command}\n")
+        return True
 
     def run(self):
         try:
             self._check_root()
             
-            if not RICH_AVAILABLE:
-                self.install_rich_if_needed()
-            
             self.show_banner()
             
             self._print_header("Preparando o Sistema")
-            if RICH_AVAILABLE:
-                with Progress(SpinnerColumn(), TextColumn("[bold blue]Atualizando repositórios...")) as progress:
-                    task = progress.add_task("atualizando", total=None)
-                    self._execute_command(self.pkg_update)
-            else:
-                print("Atualizando repositórios...")
+            with self._package_job(), self._progress("Atualizando repositórios..."):
                 self._execute_command(self.pkg_update)
             
             basic_deps = ['wget', 'curl', 'ca-certificates', 'openssl']
@@ -1462,38 +4635,60 @@ server {{
                 ("6", "🗑️ Remover Certificados SSL", self.remove_ssl_certificates),
                 ("7", "🔌 Desativar Serviços Desnecessários", self.disable_services),
                 ("8", "🌎 Traduzir Sistema para Português", self.translate_to_portuguese),
+                ("10", "📦 Otimizar Downloads de Pacotes", self.optimize_package_downloads),
+                ("11", "🗃️ Exportar/Importar Pacotes Offline", self.manage_offline_bundle),
             ]
             
+            hidden = [(name, self.step_unavailable(MENU_STEPS.get(func.__name__))) for _, name, func in options]
+            hidden = [(name, reason) for name, reason in hidden if reason]
+            if hidden:
+                environment = self.environment()
+                self._print_info(f"Ambiente detectado: {environment['virt']}{' (contêiner)' if environment['container'] else ''}")
+                for name, reason in hidden:
+                    self._print_warning(f"Opção indisponível: {name.split(' ', 1)[1]} ({reason})")
+                options = [option for option in options if not self.step_unavailable(MENU_STEPS.get(option[2].__name__))]
+            
             all_option = "9"
             exit_option = "0"
             
             while True:
                 self._print_header("Menu Principal")
                 
-                if RICH_AVAILABLE:
-                    menu_panel = Panel(
-                        "\n".join([f"[cyan]{opt[0]}[/] - {opt[1]}" for opt in options]) + 
-                        f"\n\n[yellow]{all_option}[/] - 🔄 Executar Todas as Configurações" +
-                        f"\n[red]{exit_option}[/] - ❌ Sair",
-                        title="Opções Disponíveis",
-                        border_style="blue",
-                        padding=(1, 2)
-                    )
-                    self.console.print(menu_panel)
-                    
-                    choice = Prompt.ask("\nEscolha uma opção", choices=[opt[0] for opt in options] + [all_option, exit_option])
-                else:
-                    for opt_num, opt_name, _ in options:
-                        print(f"{opt_num} - {opt_name}")
-                    print(f"{all_option} - 🔄 Executar Todas as Configurações")
-                    print(f"{exit_option} - ❌ Sair")
-                    
-                    choice = input("\nEscolha uma opção: ")
+                self.reporter.menu("Opções Disponíveis", [(opt_num, opt_name) for opt_num, opt_name, _ in options] +
+                                   [(all_option, "🔄 Executar Todas as Configurações"), (exit_option, "❌ Sair")])
+                
+                self.start_package_prefetch()
+                choice = self.reporter.prompt("Escolha uma opção", [opt[0] for opt in options] + [all_option, exit_option])
                 
                 if choice == all_option:  
-                    for _, _, func in options:
-                        if func != self.remove_ssl_certificates:  
-                            func()
+                    if self._ask(f"Deseja aplicar um perfil ({', '.join(sorted(PROFILES))} ou arquivo JSON/TOML) em vez de responder etapa por etapa?"):
+                        source = input("Perfil ou caminho do arquivo: ").strip()
+                        try:
+                            profile = load_profile(source)
+                        except (ValueError, OSError, argparse.ArgumentTypeError) as e:
+                            self._print_error(str(e))
+                            continue
+                        plan = [(key, profile[key]) for key in STEP_ORDER if key in profile]
+                        source = _profile_source(source)
+                        resume = (self.interrupted_journal(source) is not None
+                                  and self._ask("Este perfil foi interrompido antes de terminar. Deseja retomar de onde parou?"))
+                        self.print_plan_results(self.run_plan(plan, 1 if self.reporter.serial else None, source, resume))
+                    else:
+                        steps = [func for _, _, func in options if func not in (self.remove_ssl_certificates, self.manage_offline_bundle)]
+                        resume = (self.interrupted_journal("menu") is not None
+                                  and self._ask("A última execução de todas as configurações foi interrompida. Deseja retomar de onde parou?"))
+                        completed = self.begin_journal([(func.__name__, {}) for func in steps], "menu", resume)
+                        for func in steps:
+                            if func.__name__ in completed:
+                                self._print_info(f"Etapa já concluída anteriormente: {func.__name__}")
+                                continue
+                            self.journal_step(func.__name__, "running", {})
+                            self._step_state.step = func.__name__
+                            with self._span(func.__name__, "etapa"):
+                                func()
+                            self._step_state.step = None
+                            self.journal_step(func.__name__, "done")
+                        self.finish_journal()
                     
                     if self._ask("\n🔄 Deseja reiniciar o sistema para aplicar todas as alterações?"):
                         self._print_info("Reiniciando o sistema em 5 segundos...")
@@ -1510,22 +4705,786 @@ server {{
                 else:
                     for opt_num, _, func in options:
                         if choice == opt_num:
-                            func()
+                            with self._span(func.__name__, "etapa"):
+                                func()
                             break
                     
                     input("\nPressione Enter para continuar...")
-                    os.system('clear')
                     self.show_banner()
         except KeyboardInterrupt:
             print("\n\nOperação cancelada pelo usuário.")
             print("Finalizando o script Doce Setup.")
             sys.exit(0)
+        finally:
+            self.finish_trace()
+
+
+class SetupDaemon:
+    def __init__(self, socket_path=DAEMON_SOCKET):
+        self.socket_path = socket_path
+        self.setup = LinuxSetup(interactive=False)
+        self.setup._fact_cache = {}
+        self.started = time.time()
+        self.lock = threading.Lock()
+        self.changes = deque(maxlen=DAEMON_CHANGES_KEPT)
+        self.watch_mode = None
+        self.last_apply = None
+        self._certificates = None
+
+    def _facts(self):
+        setup = self.setup
+        return {
+            'distro': setup.distro,
+            'version': setup.version,
+            'pkg_manager': setup.pkg_manager,
+            'ssh_port': setup.ssh_port,
+            'web_server': setup._detect_web_server(),
+        }
+
+    def _certificate_summary(self):
+        if self._certificates is None:
+            self._certificates = [{'name': cert['name'], 'domains': cert['domains'], 'not_after': cert['not_after']}
+                                  for cert in self.setup.get_certificate_index()]
+        return self._certificates
+
+    def invalidate(self, group, path=None):
+        if group == "ssh":
+            self.setup.ssh_port = self.setup._detect_ssh_port()
+        elif group in ("web", "packages"):
+            self.setup.forget_facts(lambda key: key == 'web_server' or (group == "packages" and isinstance(key, tuple)))
+        elif group == "certs":
+            self._certificates = None
+        self.changes.append({'time': round(time.time(), 3), 'group': group, 'path': path})
+
+    def _watch_targets(self):
+        targets = []
+        for group, root, name in DAEMON_WATCHES:
+            if not os.path.isdir(root):
+                continue
+            if name:
+                targets.append((group, root, name))
+                continue
+            base_depth = root.rstrip('/').count('/')
+            for directory, subdirs, _ in os.walk(root):
+                targets.append((group, directory, None))
+                if directory.count('/') - base_depth >= DAEMON_WATCH_DEPTH:
+                    subdirs[:] = []
+        return targets
+
+    def _watch_inotify(self):
+        import ctypes
+        libc = ctypes.CDLL(None, use_errno=True)
+        if not hasattr(libc, "inotify_init1"):
+            return False
+        fd = libc.inotify_init1(os.O_CLOEXEC)
+        if fd < 0:
+            return False
+        
+        mask = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF
+        watches = {}
+        
+        def add(group, directory, name):
+            wd = libc.inotify_add_watch(fd, directory.encode(), mask)
+            if wd >= 0:
+                watches[wd] = (group, directory, name)
+        
+        for target in self._watch_targets():
+            add(*target)
+        if not watches:
+            os.close(fd)
+            return False
+        
+        self.watch_mode = "inotify"
+        header = struct.calcsize("iIII")
+        try:
+            while True:
+                data = os.read(fd, 65536)
+                pos = 0
+                touched = {}
+                while pos + header <= len(data):
+                    wd, event_mask, _, length = struct.unpack_from("iIII", data, pos)
+                    name = data[pos + header:pos + header + length].split(b'\0', 1)[0].decode(errors='replace')
+                    pos += header + length
+                    if wd not in watches:
+                        continue
+                    group, directory, only = watches[wd]
+                    if only and name != only:
+                        continue
+                    path = os.path.join(directory, name) if name else directory
+                    if event_mask & IN_ISDIR and event_mask & (IN_CREATE | IN_MOVED_TO) and not only:
+                        add(group, path, None)
+                    touched.setdefault(group, path)
+                for group, path in touched.items():
+                    self.invalidate(group, path)
+        finally:
+            os.close(fd)
+
+    def _snapshot(self):
+        snapshot = {}
+        for group, directory, name in self._watch_targets():
+            names = [name] if name else os.listdir(directory)
+            for entry in names:
+                path = os.path.join(directory, entry)
+                try:
+                    info = os.lstat(path)
+                except OSError:
+                    continue
+                snapshot[path] = (group, info.st_mtime_ns, info.st_size)
+        return snapshot
+
+    def _watch_polling(self):
+        self.watch_mode = "polling"
+        previous = self._snapshot()
+        while True:
+            time.sleep(DAEMON_POLL_SECONDS)
+            current = self._snapshot()
+            touched = {}
+            for path in set(previous) | set(current):
+                if previous.get(path) != current.get(path):
+                    touched.setdefault((previous.get(path) or current.get(path))[0], path)
+            for group, path in touched.items():
+                self.invalidate(group, path)
+            previous = current
+
+    def _watch(self):
+        use_inotify = True
+        while True:
+            try:
+                if not use_inotify or self._watch_inotify() is False:
+                    use_inotify = False
+                    self._watch_polling()
+            except Exception as e:
+                use_inotify = False
+                self.setup._print_warning(f"Falha ao observar alterações ({str(e) or type(e).__name__}); reiniciando o monitoramento")
+                for group in ("ssh", "web", "packages", "certs"):
+                    self.invalidate(group)
+                time.sleep(DAEMON_POLL_SECONDS)
+
+    def _begin_request(self, keep_log):
+        setup = self.setup
+        setup.command_history.clear()
+        with setup._trace_lock:
+            del setup.trace_spans[:]
+        with setup._log_lock:
+            if setup._log_handle:
+                setup._log_handle.close()
+            setup._log_handle = None if keep_log else False
+
+    def handle(self, request):
+        op = request.get('op')
+        if op == "ping":
+            return {'pid': os.getpid(), 'uptime': round(time.time() - self.started, 3)}
+        if op == "status":
+            return {
+                'pid': os.getpid(),
+                'uptime': round(time.time() - self.started, 3),
+                'watch': self.watch_mode,
+                'facts': self._facts(),
+                'certificates': self._certificate_summary(),
+                'cached_packages': sum(1 for key in list(self.setup._fact_cache) if isinstance(key, tuple)),
+                'changes': list(self.changes),
+                'last_apply': self.last_apply,
+            }
+        
+        steps = request.get('steps')
+        if op == "check":
+            if steps is not None and (not isinstance(steps, list) or any(key not in STEP_ORDER for key in steps)):
+                raise ValueError(f"etapas válidas: {', '.join(STEP_ORDER)}")
+            with self.lock:
+                self._begin_request(keep_log=False)
+                report = self.setup.check_all(steps)
+            return {'converged': not any(drift for _, _, drift in report),
+                    'steps': [{'step': key, 'title': title, 'drift': drift} for key, title, drift in report]}
+        if op == "apply":
+            if request.get('profile'):
+                profile = load_profile(request['profile'])
+                plan = [(key, profile[key]) for key in STEP_ORDER if key in profile]
+            elif isinstance(steps, list) and steps:
+                plan = validate_plan([(key, {}) if isinstance(key, str) else (key[0], key[1]) for key in steps])
+            else:
+                raise ValueError("informe 'profile' ou 'steps'")
+            with self.lock:
+                self._begin_request(keep_log=True)
+                self.setup._repositories_refreshed = False
+                try:
+                    results = self.setup.run_plan(plan, request.get('workers'))
+                finally:
+                    for group in ("ssh", "packages", "certs"):
+                        self.invalidate(group)
+            self.last_apply = {'time': round(time.time(), 3), 'steps': results}
+            return {'changed': any(result['status'] == "changed" for result in results), 'steps': results}
+        raise ValueError(f"operação desconhecida: {op}")
+
+    def serve(self):
+        daemon = self
+        
+        class RequestHandler(socketserver.StreamRequestHandler):
+            def handle(self):
+                credentials = self.request.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i"))
+                _, uid, _ = struct.unpack("3i", credentials)
+                try:
+                    if uid != 0:
+                        raise PermissionError("somente root pode usar o daemon")
+                    request = json.loads(self.rfile.readline(DAEMON_MAX_REQUEST) or b"{}")
+                    if not isinstance(request, dict):
+                        raise ValueError("a requisição deve ser um objeto JSON")
+                    response = {'ok': True, 'result': daemon.handle(request)}
+                except Exception as e:
+                    response = {'ok': False, 'error': str(e) or type(e).__name__}
+                self.wfile.write((json.dumps(response, ensure_ascii=False) + "\n").encode())
+        
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        server = socketserver.ThreadingUnixStreamServer(self.socket_path, RequestHandler)
+        server.daemon_threads = True
+        try:
+            os.chmod(self.socket_path, 0o600)
+            self._facts()
+            self._certificate_summary()
+            threading.Thread(target=self._watch, name="docesetup-watch", daemon=True).start()
+            self.setup._print_info(f"Daemon ouvindo em {self.socket_path}")
+            server.serve_forever()
+        finally:
+            server.server_close()
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+
+
+def daemon_request(request, socket_path=DAEMON_SOCKET, timeout=None):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.settimeout(timeout)
+        client.connect(socket_path)
+        client.sendall((json.dumps(request) + "\n").encode())
+        with client.makefile('rb') as stream:
+            response = stream.readline()
+    if not response:
+        raise OSError("o daemon encerrou a conexão sem responder")
+    return json.loads(response)
+
+
+def _swap_size(value):
+    value = value.upper()
+    if not re.match(r'^[1-9]\d*[MG]$', value):
+        raise argparse.ArgumentTypeError("use um tamanho como 512M ou 4G")
+    return value
+
+
+def _name_list(value):
+    names = [name.strip() for name in value.split(',') if name.strip()]
+    for name in names:
+        if not re.match(r'^[\w@.-]+$', name):
+            raise argparse.ArgumentTypeError(f"nome inválido: {name}")
+    return names
+
+
+def load_profile(source, validate=True):
+    if source in PROFILES:
+        return {key: dict(options) for key, options in PROFILES[source].items()}
+    if not os.path.isfile(source):
+        raise ValueError(f"perfil não encontrado: {source} (use {', '.join(sorted(PROFILES))} ou um arquivo JSON/TOML)")
+    
+    if source.endswith(".toml"):
+        try:
+            import tomllib
+        except ImportError:
+            raise ValueError("perfis TOML exigem Python 3.11 ou superior; use JSON")
+        with open(source, 'rb') as f:
+            try:
+                profile = tomllib.load(f)
+            except tomllib.TOMLDecodeError as e:
+                raise ValueError(f"{source}: {str(e)}")
+    else:
+        with open(source, 'r') as f:
+            try:
+                profile = json.load(f)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"{source}: {str(e)}")
+    
+    if not isinstance(profile, dict):
+        raise ValueError(f"{source}: o perfil deve ser um objeto com uma entrada por etapa")
+    for key, options in profile.items():
+        if key not in STEP_ORDER:
+            raise ValueError(f"{source}: etapa desconhecida '{key}' (válidas: {', '.join(STEP_ORDER)})")
+        if options is True:
+            profile[key] = {}
+        elif not isinstance(options, dict):
+            raise ValueError(f"{source}: as opções de '{key}' devem ser um objeto")
+    if validate:
+        try:
+            validate_plan(list(profile.items()))
+        except ValueError as e:
+            raise ValueError(f"{source}: {str(e)}")
+    return profile
+
+
+def validate_plan(plan):
+    for key, options in plan:
+        if key not in STEP_ORDER:
+            raise ValueError(f"etapa desconhecida '{key}' (válidas: {', '.join(STEP_ORDER)})")
+        if not isinstance(options, dict):
+            raise ValueError(f"as opções de '{key}' devem ser um objeto")
+        if key == "swap" and "size" in options:
+            try:
+                options['size'] = _swap_size(str(options['size']))
+            except argparse.ArgumentTypeError as e:
+                raise ValueError(f"tamanho de swap inválido: {str(e)}")
+        elif key == "ssl":
+            domains = options.get('domains', [])
+            if not isinstance(domains, list) or not all(isinstance(domain, str) for domain in domains):
+                raise ValueError("'domains' deve ser uma lista de nomes")
+            options['domains'] = [domain.lower() for domain in domains]
+            pattern = HOSTNAME_PATTERN if options.get('self_signed') else DOMAIN_PATTERN
+            for domain in options['domains']:
+                if not pattern.match(domain):
+                    raise ValueError(f"domínio inválido: {domain}")
+            email = options.get('email')
+            if email is not None and not (isinstance(email, str) and EMAIL_PATTERN.match(email)):
+                raise ValueError(f"email inválido: {email}")
+            if options['domains'] and not options.get('self_signed') and not email:
+                raise ValueError("--email é obrigatório para certificados Let's Encrypt")
+            if options.get('web_server') not in (None, "nginx", "apache"):
+                raise ValueError(f"servidor web inválido: {options['web_server']}")
+        elif key == "services" and "disable" in options:
+            if not isinstance(options['disable'], list):
+                raise ValueError("'disable' deve ser uma lista de serviços")
+            try:
+                options['disable'] = _name_list(",".join(str(name) for name in options['disable']))
+            except argparse.ArgumentTypeError as e:
+                raise ValueError(str(e))
+        elif key == "downloads" and options.get('proxy') is not None:
+            if not (isinstance(options['proxy'], str) and PROXY_PATTERN.match(options['proxy'])):
+                raise ValueError(f"proxy inválido: {options['proxy']}")
+    return plan
+
+
+def _profile_source(source):
+    return source if source in PROFILES else os.path.abspath(source)
+
+
+def _headless_plan(args, parser):
+    if args.command == "all":
+        try:
+            profile = load_profile(args.profile, validate=False)
+        except (ValueError, OSError) as e:
+            parser.error(str(e))
+        plan = [(key, profile[key]) for key in STEP_ORDER if key in profile]
+    elif args.command in STEP_ORDER:
+        plan = [(args.command, {})]
+    else:
+        return None
+    
+    for key, options in plan:
+        if key == "swap" and getattr(args, "size", None):
+            options['size'] = args.size
+        elif key == "ssl":
+            if args.domain:
+                options['domains'] = args.domain
+            if args.email:
+                options['email'] = args.email
+            if getattr(args, "self_signed", False):
+                options['self_signed'] = True
+            if getattr(args, "web_server", None):
+                options['web_server'] = args.web_server
+        elif key == "services" and getattr(args, "disable", None):
+            options['disable'] = args.disable
+        elif key == "locale" and getattr(args, "minimal", False):
+            options['minimal'] = True
+        elif key == "downloads" and getattr(args, "proxy", None):
+            options['proxy'] = args.proxy
+    try:
+        return validate_plan(plan)
+    except ValueError as e:
+        parser.error(str(e))
+
+
+def _build_fake_root(root, distro):
+    files = {
+        "etc/os-release": BENCH_DISTROS[distro],
+        "etc/ssh/sshd_config": "Include /etc/ssh/sshd_config.d/*.conf\nPermitRootLogin prohibit-password\nPasswordAuthentication no\n",
+        "etc/ssh/sshd_config.d/50-cloud-init.conf": "PasswordAuthentication no\n",
+        "etc/fstab": "UUID=00000000-0000-0000-0000-000000000000 / ext4 defaults 0 1\n",
+        "proc/swaps": "Filename\t\t\t\tType\t\tSize\t\tUsed\t\tPriority\n",
+        "etc/passwd": ("root:x:0:0:root:/root:/bin/bash\n"
+                       "daemon:x:1:1:daemon:/usr/sbin:/usr/sbin/nologin\n"
+                       "ana:x:1000:1000:Ana:/home/ana:/bin/bash\n"
+                       "bruno:x:1001:1001:Bruno:/home/bruno:/bin/bash\n"),
+        "root/.bashrc": "",
+        "home/ana/.bashrc": "",
+        "home/bruno/.bashrc": "",
+        "etc/locale.gen": "# pt_BR.UTF-8 UTF-8\n# en_US.UTF-8 UTF-8\n",
+    }
+    if distro in ("debian", "ubuntu"):
+        files["var/lib/dpkg/arch"] = "amd64\n"
+        files["etc/apt/apt.conf.d/70debconf"] = ""
+    elif distro == "fedora":
+        files["etc/dnf/dnf.conf"] = "[main]\ngpgcheck=1\n"
+    elif distro == "arch":
+        files["etc/pacman.conf"] = "[options]\nHoldPkg = pacman glibc\n\n[core]\nInclude = /etc/pacman.d/mirrorlist\n"
+    elif distro == "opensuse":
+        files["etc/zypp/zypp.conf"] = "[main]\n"
+    for name, _ in UNNEEDED_SERVICES:
+        files[f"usr/lib/systemd/system/{name}.service"] = f"[Unit]\nDescription={name}\n"
+    
+    for name, content in files.items():
+        path = os.path.join(root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(content)
+
+
+def _bench_case(workdir, distro, plan):
+    root = tempfile.mkdtemp(prefix=f"{distro}-", dir=workdir)
+    _build_fake_root(root, distro)
+    recorder = CommandRecorder(root, responses=[(r"^locale -a$", 0, "C\nC.utf8\nPOSIX")])
+    
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull), confine_writes(root):
+        started = time.monotonic()
+        setup = LinuxSetup(interactive=False, run_log=False, backend=recorder)
+        if plan is None:
+            return {'wall': time.monotonic() - started, 'processes': len(recorder.commands), 'failed': []}
+        
+        del recorder.commands[:]
+        started = time.monotonic()
+        results = setup.run_plan(plan)
+    return {
+        'wall': time.monotonic() - started,
+        'processes': len(recorder.commands),
+        'failed': [result['step'] for result in results if result['status'] == "failed"],
+    }
+
+
+def _bench_preflight(workdir):
+    import asyncio
+    root = tempfile.mkdtemp(prefix="preflight-", dir=workdir)
+    _build_fake_root(root, "debian")
+    recorder = CommandRecorder(root, responses=[(r"^ip -o addr show$", 0, f"2: eth0    inet {BENCH_HOST_ADDRESS}/24 brd 203.0.113.255 scope global eth0")])
+    domains = [f"site{i}.example{i % 7}.com.br" for i in range(BENCH_PREFLIGHT_DOMAINS)]
+    
+    async def resolver(name):
+        await asyncio.sleep(BENCH_RESOLVER_LATENCY)
+        number = int(name[4:name.index('.')])
+        if number % 10 == 0:
+            raise OSError("NXDOMAIN")
+        return ["198.51.100.20"] if number % 10 == 1 else [BENCH_HOST_ADDRESS]
+    
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull), confine_writes(root):
+        setup = LinuxSetup(interactive=False, run_log=False, backend=recorder)
+        del recorder.commands[:]
+        started = time.monotonic()
+        valid, mismatched, failed = setup._preflight_domains(domains, resolver)
+        wall = time.monotonic() - started
+    
+    expected = (BENCH_PREFLIGHT_DOMAINS * 8 // 10, BENCH_PREFLIGHT_DOMAINS // 10, BENCH_PREFLIGHT_DOMAINS // 10)
+    return {
+        'wall': wall,
+        'processes': len(recorder.commands),
+        'failed': ["preflight"] if (len(valid), len(mismatched), len(failed)) != expected else [],
+    }
+
+
+def run_bench(distros=None, rounds=BENCH_ROUNDS, profile="completo"):
+    steps = [key for key in STEP_ORDER if key != "ssl"]
+    options = load_profile(profile)
+    plan = [(key, options[key]) for key in steps if key in options]
+    cases = {}
+    
+    durations = []
+    for _ in range(rounds):
+        started = time.monotonic()
+        subprocess.run([sys.executable, os.path.abspath(__file__), "--help"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        durations.append(time.monotonic() - started)
+    cases["startup"] = {'wall': min(durations), 'processes': 1, 'failed': []}
+    
+    workdir = tempfile.mkdtemp(prefix="docesetup-bench-")
+    try:
+        launcher = os.path.join(workdir, "docesetup")
+        with open(launcher, 'w') as f:
+            f.write(f"import sys\nsys.path.insert(0, {os.path.dirname(os.path.abspath(__file__))!r})\nfrom docesetup import main\nmain()\n")
+        for name, command in (("startup:python", [sys.executable, "-sE", "-c", "pass"]),
+                              ("startup:launcher", [sys.executable, "-sE", launcher, "--help"])):
+            durations = []
+            for _ in range(rounds + 1):
+                started = time.monotonic()
+                subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                durations.append(time.monotonic() - started)
+            cases[name] = {'wall': min(durations), 'processes': 1, 'failed': []}
+        
+        for distro in distros or sorted(BENCH_DISTROS):
+            runs = [("init", None)] + [(key, [(key, dict(options.get(key, {})))]) for key in steps] + [(f"all:{profile}", plan)]
+            for name, case_plan in runs:
+                samples = [_bench_case(workdir, distro, case_plan) for _ in range(rounds)]
+                cases[f"{distro}/{name}"] = {
+                    'wall': min(sample['wall'] for sample in samples),
+                    'processes': max(sample['processes'] for sample in samples),
+                    'failed': sorted(set(step for sample in samples for step in sample['failed'])),
+                }
+        
+        samples = [_bench_preflight(workdir) for _ in range(rounds)]
+        cases["ssl:preflight"] = {
+            'wall': min(sample['wall'] for sample in samples),
+            'processes': max(sample['processes'] for sample in samples),
+            'failed': sorted(set(step for sample in samples for step in sample['failed'])),
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return cases
+
+
+def compare_bench(cases, baseline, tolerance=BENCH_WALL_TOLERANCE):
+    regressions = []
+    for name, case in cases.items():
+        if case['failed']:
+            regressions.append(f"{name}: etapas falharam ({', '.join(case['failed'])})")
+        if name == "startup:launcher":
+            own = case['wall'] - cases.get("startup:python", {'wall': 0})['wall']
+            if own > BENCH_STARTUP_BUDGET:
+                regressions.append(f"{name}: {own * 1000:.0f} ms além do interpretador (limite {BENCH_STARTUP_BUDGET * 1000:.0f} ms)")
+        reference = baseline.get(name)
+        if reference is None:
+            continue
+        if case['processes'] > reference['processes']:
+            regressions.append(f"{name}: {case['processes']} processos (referência {reference['processes']})")
+        if case['wall'] > reference['wall'] * (1 + tolerance) + BENCH_WALL_SLACK:
+            regressions.append(f"{name}: {case['wall'] * 1000:.0f} ms (referência {reference['wall'] * 1000:.0f} ms)")
+    return regressions
+
+
+def print_bench(cases, baseline=None):
+    print(f"{'caso':<28} {'tempo':>10} {'processos':>10}  referência")
+    for name, case in cases.items():
+        reference = (baseline or {}).get(name)
+        note = f"{reference['wall'] * 1000:.0f} ms / {reference['processes']}" if reference else "-"
+        print(f"{name:<28} {case['wall'] * 1000:>7.0f} ms {case['processes']:>10}  {note}")
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="docesetup.py", description="Doce Setup - configuração simplificada para servidores Linux")
+    parser.add_argument("--check", action="store_true", help=f"Informa as configurações fora do estado desejado sem alterar nada (código {EXIT_DRIFT} se houver divergência)")
+    parser.add_argument("--json", action="store_true", help="Imprime o resultado em JSON (somente nos modos não interativos)")
+    parser.add_argument("--resume", action="store_true", help="Retoma o último perfil interrompido, pulando as etapas já concluídas")
+    parser.add_argument("--root", metavar="DIR", help="Aplica a configuração em uma imagem ou chroot montado em DIR (swap e SSL ficam para o primeiro boot)")
+    parser.add_argument("--trace", metavar="ARQUIVO", help="Grava a linha do tempo da execução no formato trace_event do Chrome (chrome://tracing, Perfetto)")
+    parser.add_argument("--first-boot", action="store_true", help="Executa as etapas adiadas no primeiro boot de uma imagem preparada com --root")
+    subparsers = parser.add_subparsers(dest="command")
+    
+    renew_parser = subparsers.add_parser("renew-certs", help="Renova somente os certificados dentro da janela de renovação")
+    renew_parser.add_argument("--window-days", type=int, default=RENEWAL_WINDOW_DAYS, help="Dias antes da expiração para renovar")
+    
+    subparsers.add_parser("ssh-root", help="Permite acesso SSH para o usuário root com senha")
+    subparsers.add_parser("ssh-timeout", help="Desativa o timeout da sessão SSH")
+    swap_parser = subparsers.add_parser("swap", help=f"Cria a memória swap em {SWAP_FILE}")
+    swap_parser.add_argument("--size", type=_swap_size, help="Tamanho da swap (ex.: 4G; padrão: conforme a memória disponível)")
+    subparsers.add_parser("arch32", help="Ativa a arquitetura 32 bits")
+    ssl_parser = subparsers.add_parser("ssl", help="Emite certificados SSL e agenda a renovação")
+    ssl_parser.add_argument("--domain", action="append", default=[], help="Domínio do certificado (pode ser repetido)")
+    ssl_parser.add_argument("--email", help="Email para notificações do Let's Encrypt")
+    ssl_parser.add_argument("--web-server", choices=["nginx", "apache"], help="Servidor web a instalar se nenhum for detectado")
+    ssl_parser.add_argument("--self-signed", action="store_true", help="Gera certificados autoassinados em vez do Let's Encrypt")
+    services_parser = subparsers.add_parser("services", help="Desativa serviços desnecessários")
+    services_parser.add_argument("--disable", type=_name_list, help="Serviços separados por vírgula (padrão: todos os conhecidos)")
+    locale_parser = subparsers.add_parser("locale", help="Configura o sistema em Português do Brasil")
+    locale_parser.add_argument("--minimal", action="store_true", help="Gera somente pt_BR.UTF-8 e instala apenas os dados mínimos (servidores)")
+    downloads_parser = subparsers.add_parser("downloads", help="Ativa downloads paralelos de pacotes")
+    downloads_parser.add_argument("--proxy", help="Proxy de cache de pacotes (ex.: http://10.0.0.2:3142)")
+    all_parser = subparsers.add_parser("all", help="Aplica todas as etapas de um perfil")
+    all_parser.add_argument("--profile", default="base", help=f"Perfil a aplicar: {', '.join(sorted(PROFILES))} ou um arquivo JSON/TOML")
+    all_parser.add_argument("--workers", type=int, default=None, help="Máximo de etapas executadas em paralelo")
+    all_parser.add_argument("--domain", action="append", default=[], help="Domínio para a etapa SSL do perfil")
+    all_parser.add_argument("--email", help="Email para a etapa SSL do perfil")
+    daemon_parser = subparsers.add_parser("daemon", help="Mantém fatos e índices em memória e atende pedidos por um socket Unix")
+    daemon_parser.add_argument("--socket", default=DAEMON_SOCKET, help="Caminho do socket")
+    client_parser = subparsers.add_parser("client", help="Envia um pedido ao daemon em execução")
+    client_parser.add_argument("operation", choices=["ping", "status", "check", "apply"], help="Operação a executar")
+    client_parser.add_argument("--step", action="append", choices=STEP_ORDER, help="Etapa a verificar ou aplicar (pode ser repetido)")
+    client_parser.add_argument("--profile", help="Perfil a aplicar (apply)")
+    client_parser.add_argument("--workers", type=int, default=None, help="Máximo de etapas executadas em paralelo (apply)")
+    client_parser.add_argument("--socket", default=DAEMON_SOCKET, help="Caminho do socket")
+    client_parser.add_argument("--timeout", type=float, default=None, help="Tempo máximo de espera pela resposta, em segundos")
+    metrics_parser = subparsers.add_parser("export-metrics", help="Grava o estado do servidor para o textfile collector do node_exporter")
+    metrics_parser.add_argument("--output", default=METRICS_FILE, help="Arquivo .prom de destino")
+    metrics_parser.add_argument("--install-timer", action="store_true", help=f"Agenda a exportação a cada {METRICS_INTERVAL}")
+    subparsers.add_parser("install", help=f"Instala o comando {LAUNCHER_FILE}, que inicia mais rápido a partir do bytecode em cache")
+    bench_parser = subparsers.add_parser("bench", help="Mede o tempo e os processos de cada etapa em raízes simuladas, sem alterar o sistema")
+    bench_parser.add_argument("--distro", action="append", choices=sorted(BENCH_DISTROS), help="Distribuição simulada (pode ser repetido; padrão: todas)")
+    bench_parser.add_argument("--rounds", type=int, default=BENCH_ROUNDS, help="Repetições de cada caso (vale o menor tempo)")
+    bench_parser.add_argument("--profile", default="completo", help="Perfil usado no caso que aplica todas as etapas")
+    bench_parser.add_argument("--baseline", metavar="ARQUIVO", help="Falha se algum caso usar mais processos ou ficar mais lento que esta referência")
+    bench_parser.add_argument("--save-baseline", metavar="ARQUIVO", help="Grava os resultados como nova referência")
+    bench_parser.add_argument("--tolerance", type=float, default=BENCH_WALL_TOLERANCE, help="Folga relativa de tempo antes de acusar regressão")
+    
+    args = parser.parse_args()
+    
+    if args.command == "client":
+        request = {'op': args.operation}
+        if args.step:
+            request['steps'] = args.step
+        if args.profile:
+            request['profile'] = _profile_source(args.profile)
+        if args.workers:
+            request['workers'] = args.workers
+        if args.operation == "apply" and not (args.step or args.profile):
+            parser.error("apply requer --step ou --profile")
+        try:
+            response = daemon_request(request, args.socket, args.timeout)
+        except (OSError, ValueError) as e:
+            print(f"Não foi possível falar com o daemon em {args.socket}: {str(e)}", file=sys.stderr)
+            sys.exit(EXIT_FAILED)
+        if not response.get('ok'):
+            print(f"Erro do daemon: {response.get('error')}", file=sys.stderr)
+            sys.exit(EXIT_FAILED)
+        
+        result = response['result']
+        print(json.dumps(result, ensure_ascii=False) if args.json else json.dumps(result, ensure_ascii=False, indent=2))
+        if args.operation == "check" and not result['converged']:
+            sys.exit(EXIT_DRIFT)
+        if args.operation == "apply" and any(step['status'] == "failed" for step in result['steps']):
+            sys.exit(EXIT_FAILED)
+        sys.exit(EXIT_OK)
+    
+    if args.command == "daemon":
+        if os.geteuid() != 0:
+            print("Este script precisa ser executado como root.", file=sys.stderr)
+            sys.exit(EXIT_NOT_ROOT)
+        SetupDaemon(args.socket).serve()
+        sys.exit(EXIT_OK)
+    
+    if args.command == "export-metrics":
+        setup = LinuxSetup(interactive=False, run_log=False)
+        try:
+            setup.write_metrics(args.output)
+            if args.install_timer and not setup.install_metrics_timer(args.output):
+                print("Não foi possível ativar o agendamento da exportação de métricas.", file=sys.stderr)
+                sys.exit(EXIT_FAILED)
+        except OSError as e:
+            print(f"Não foi possível gravar as métricas em {args.output}: {str(e)}", file=sys.stderr)
+            sys.exit(EXIT_FAILED)
+        sys.exit(EXIT_OK)
+    
+    if args.command == "install":
+        if os.geteuid() != 0:
+            print("Este script precisa ser executado como root.", file=sys.stderr)
+            sys.exit(EXIT_NOT_ROOT)
+        try:
+            LinuxSetup(interactive=False, run_log=False)._install_script_copy()
+        except OSError as e:
+            print(f"Não foi possível instalar {LAUNCHER_FILE}: {str(e)}", file=sys.stderr)
+            sys.exit(EXIT_FAILED)
+        print(f"Comando instalado em {LAUNCHER_FILE}.")
+        sys.exit(EXIT_OK)
+    
+    if args.command == "bench":
+        baseline = {}
+        if args.baseline:
+            try:
+                with open(args.baseline, 'r') as f:
+                    baseline = json.load(f)['cases']
+            except (OSError, ValueError, KeyError) as e:
+                parser.error(f"--baseline: {str(e)}")
+        try:
+            cases = run_bench(args.distro, max(1, args.rounds), args.profile)
+        except ValueError as e:
+            parser.error(str(e))
+        
+        regressions = compare_bench(cases, baseline, args.tolerance)
+        exit_code = EXIT_FAILED if regressions else EXIT_OK
+        if args.save_baseline:
+            with open(args.save_baseline, 'w') as f:
+                json.dump({'created': time.time(), 'python': platform.python_version(), 'cases': cases}, f, indent=2)
+        if args.json:
+            print(json.dumps({'cases': cases, 'regressions': regressions, 'exit_code': exit_code}, ensure_ascii=False))
+        else:
+            print_bench(cases, baseline)
+            for regression in regressions:
+                print(f"Regressão: {regression}")
+        sys.exit(exit_code)
+    
+    if args.root:
+        if not os.path.isdir(args.root):
+            parser.error(f"--root: diretório não encontrado: {args.root}")
+        if not args.check and args.command in (None, "renew-certs"):
+            parser.error("--root requer --check ou um subcomando de etapa")
+    
+    if args.first_boot:
+        setup = LinuxSetup(interactive=False)
+        results = setup.run_first_boot()
+        setup.finish_trace(summary=False)
+        setup.print_plan_results(results)
+        sys.exit(EXIT_FAILED if any(result['status'] == "failed" for result in results) else EXIT_OK)
+    
+    if args.check:
+        setup = LinuxSetup(interactive=False, run_log=False, root=args.root)
+        report = setup.check_all()
+        exit_code = EXIT_DRIFT if any(drift for _, _, drift in report) else EXIT_OK
+        if args.json:
+            print(json.dumps({
+                'converged': exit_code == EXIT_OK,
+                'steps': [{'step': key, 'title': title, 'drift': drift} for key, title, drift in report],
+                'exit_code': exit_code,
+            }, ensure_ascii=False))
+        else:
+            setup.print_check_report(report)
+        sys.exit(exit_code)
+    
+    plan = None
+    if args.resume:
+        if args.command is None:
+            journal = LinuxSetup(interactive=False, run_log=False).interrupted_journal()
+            if journal is None:
+                parser.error("nenhuma execução interrompida para retomar")
+            if journal.get('source') == "menu":
+                parser.error("a execução interrompida foi iniciada pelo menu; escolha novamente a opção 9 para retomá-la")
+            args.command, args.profile, args.workers = "all", journal['source'], None
+            args.domain, args.email = [], None
+            plan = [(key, options) for key, options in journal.get('plan', [])] or None
+        elif args.command != "all":
+            parser.error("--resume só pode ser usado com o subcomando all")
+    
+    plan = plan or _headless_plan(args, parser)
+    if plan is not None:
+        if os.geteuid() != 0:
+            message = "Este script precisa ser executado como root."
+            if args.json:
+                print(json.dumps({'command': args.command, 'error': message, 'exit_code': EXIT_NOT_ROOT}, ensure_ascii=False))
+            else:
+                print(message, file=sys.stderr)
+            sys.exit(EXIT_NOT_ROOT)
+        
+        reporter = make_reporter("json", sys.stderr) if args.json else None
+        setup = LinuxSetup(interactive=False, root=args.root, reporter=reporter)
+        setup.trace_path = args.trace
+        with contextlib.redirect_stdout(sys.stderr) if args.json else contextlib.nullcontext():
+            source = _profile_source(args.profile) if args.command == "all" else None
+            results = setup.run_plan(plan, getattr(args, "workers", None), source, args.resume)
+            setup.finish_trace(summary=bool(args.trace))
+        
+        exit_code = EXIT_FAILED if any(result['status'] == "failed" for result in results) else EXIT_OK
+        if args.json:
+            print(json.dumps({
+                'command': args.command,
+                'changed': any(result['status'] == "changed" for result in results),
+                'steps': results,
+                'log': setup.run_log_path,
+                'exit_code': exit_code,
+            }, ensure_ascii=False))
+        else:
+            setup.print_plan_results(results)
+        sys.exit(exit_code)
+    
+    if args.json:
+        parser.error("--json requer --check ou um subcomando")
+    
+    setup = LinuxSetup()
+    setup.trace_path = args.trace
+    
+    if args.command == "renew-certs":
+        sys.exit(setup.renew_due_certificates(args.window_days))
+    
+    setup.run()
 
 
 if __name__ == "__main__":
     try:
-        setup = LinuxSetup()
-        setup.run()
+        main()
     except KeyboardInterrupt:
         print("\n\nOperação cancelada pelo usuário.")
         print("Finalizando o script Doce Setup.")